@@ -1,14 +1,44 @@
 import os
+import time
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, LengthFinishReasonError
 from pydantic import BaseModel
+from typing import List
 import json
 
+import diff_prompt
+
 load_dotenv()
 
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+# Bump whenever the judge prompt changes in a way that affects scores
+PROMPT_VERSION = 2
+# Same for the diff prompt mode, which sends only the differing regions
+DIFF_PROMPT_VERSION = 1
+PROMPT_MODES = ("full", "diff")
+
+# Point OPENAI_BASE_URL at any OpenAI-compatible server (e.g. a local mock) to
+# grade without the real API. Retries are left to JudgeExecutor, which honours
+# Retry-After and the configured rate limits. The client is created on first
+# use, so prompts can be built and estimated without an API key.
+client = None
+
+def get_client():
+    """The shared OpenAI client."""
+    global client
+    if client is None:
+        client = OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0
+        )
+    return client
+
+MODEL = "gpt-4o-mini-2024-07-18"
+TEMPERATURE = 0
+# Rough size of a judge response, and characters per token for estimates
+RESPONSE_TOKENS = 60
+CHARS_PER_TOKEN = 4
+# Context window of MODEL, used to size multi-pair batches
+CONTEXT_TOKENS = 128000
 
 class ResponseModel(BaseModel):
     overall_score: float
@@ -16,52 +46,135 @@ class ResponseModel(BaseModel):
     word_accuracy: float
     confidence_level: float
 
-def judgeLLm(pair):
-    """
-    pairs: List of tuples (ocr_text, ground_truth)
-    Returns: List of responses
-    """
-    ocr_text, ground_truth, index = pair
-    if not ocr_text or not ground_truth:
-        return {
-            "overall_score": 0.0,
-            "character_accuracy": 0.0,
-            "word_accuracy": 0.0,
-            "confidence_level": 100,
-            "index": index
-        }
-    prompt = f"""You are an expert evaluator assessing the accuracy of OCR (Optical Character Recognition) output against ground truth text.
-
-    Your task is to compare OCR-extracted text with the ground truth and provide a comprehensive accuracy assessment.
-    Ground truth text is in markdown format, and OCR text is in plain text.
-    Please ignore any markdown formatting in the ground truth text.
+class BatchItemModel(ResponseModel):
+    index: int
 
-    **OCR OUTPUT:**
-    {ocr_text}
+class BatchResponseModel(BaseModel):
+    items: List[BatchItemModel]
 
-    **GROUND TRUTH:**
-    {ground_truth}
+def usage_fields(response, latency, share=1):
+    """Token usage and latency of a response, split evenly over `share` graded items, and that share."""
+    usage = getattr(response, "usage", None)
+    return {
+        "prompt_tokens": (usage.prompt_tokens if usage else 0) / share,
+        "completion_tokens": (usage.completion_tokens if usage else 0) / share,
+        "latency": latency / share,
+        "batch_items": share,
+    }
 
-    Please analyze the OCR accuracy and provide your assessment in the following JSON format:
+def empty_result(index):
+    """Result for a pair where either text is empty, graded without an API call."""
+    return {
+        "overall_score": 0.0,
+        "character_accuracy": 0.0,
+        "word_accuracy": 0.0,
+        "confidence_level": 100,
+        "index": index
+    }
 
-    {{
-        "overall_score": <number between 0-100>,
-        "character_accuracy": <percentage of correctly recognized characters>,
-        "word_accuracy": <percentage of correctly recognized words>,
-        "confidence_level": <your confidence in this assessment, 0-100>,
-    }}
+def prompt_version(prompt_mode="full"):
+    """Version identifying the judge prompt of a prompt mode, for the judge cache."""
+    if prompt_mode == "diff":
+        return f"diff-{DIFF_PROMPT_VERSION}"
+    return PROMPT_VERSION
 
-    Focus on:
+def use_diff(ocr_text, ground_truth):
+    """Whether the compacted diff is actually shorter than the two texts."""
+    statistics, hunks = diff_prompt.compact_pair(ocr_text, ground_truth)
+    return len(statistics) + len(hunks) < len(ocr_text) + len(ground_truth)
+
+# Shared by every judge prompt, single or batched, full or diff. The builders
+# below only add their own task description and input section.
+JUDGE_ROLE = "You are an expert evaluator assessing the accuracy of OCR (Optical Character Recognition) output against ground truth text."
+NORMALIZED = "Both texts have been normalized to plain text: markdown formatting, Unicode variants and extra whitespace were removed."
+DIFF_MARKERS = 'Each difference is marked [OCR: "<OCR text>" | TRUTH: "<ground truth text>"]; an empty side means the words are missing from that text.'
+RUBRIC = """Focus on:
     1. Character-level accuracy
     2. Word-level accuracy  
-    3. Preservation of formatting and structure
+    3. Preservation of reading order and structure
     4. Common OCR error patterns
     5. Overall readability and usability
 
-    Be precise and objective in your assessment. Consider the practical impact of errors on text usability.
+    Be precise and objective in your assessment. Consider the practical impact of errors on text usability."""
+SINGLE_OUTPUT = """Please analyze the OCR accuracy and provide your assessment in the following JSON format:
+
+    {
+        "overall_score": <number between 0-100>,
+        "character_accuracy": <percentage of correctly recognized characters>,
+        "word_accuracy": <percentage of correctly recognized words>,
+        "confidence_level": <your confidence in this assessment, 0-100>,
+    }"""
+BATCH_OUTPUT = """Return one entry per item in "items", using the item number as "index":
+
+    {
+        "items": [
+            {
+                "index": <item number>,
+                "overall_score": <number between 0-100>,
+                "character_accuracy": <percentage of correctly recognized characters>,
+                "word_accuracy": <percentage of correctly recognized words>,
+                "confidence_level": <your confidence in this assessment, 0-100>
+            }
+        ]
+    }"""
+
+def judge_prompt(inputs, output):
+    """The shared role and rubric around a builder's own task description and input section."""
+    return f"""{JUDGE_ROLE}
+
+    {inputs}
+
+    {output}
+
+    {RUBRIC}
+    """
+
+def build_diff_prompt(ocr_text, ground_truth):
+    """Judge prompt showing only where the OCR output differs from the ground truth."""
+    statistics, hunks = diff_prompt.compact_pair(ocr_text, ground_truth)
+    return judge_prompt(f"""Your task is to assess the OCR output from an alignment of the two texts and provide a comprehensive accuracy assessment.
+    {NORMALIZED}
+    Only the regions where they differ are shown, with a few unchanged words around each; all other text matches the ground truth exactly.
+    {DIFF_MARKERS}
+
+    **MATCH STATISTICS:**
+    {statistics}
+
+    **DIFFERENCES:**
+    {hunks or "None, the texts are identical."}""", SINGLE_OUTPUT)
+
+def build_prompt(ocr_text, ground_truth, prompt_mode="full"):
+    """Judge prompt for one OCR/ground truth pair."""
+    if prompt_mode == "diff" and use_diff(ocr_text, ground_truth):
+        return build_diff_prompt(ocr_text, ground_truth)
+    return judge_prompt(f"""Your task is to compare OCR-extracted text with the ground truth and provide a comprehensive accuracy assessment.
+    {NORMALIZED}
+
+    **OCR OUTPUT:**
+    {ocr_text}
+
+    **GROUND TRUTH:**
+    {ground_truth}""", SINGLE_OUTPUT)
+
+def estimate_tokens(pair, prompt_mode="full"):
+    """Approximate prompt plus response tokens of one judge call, for rate limiting."""
+    ocr_text, ground_truth, _ = pair
+    return len(build_prompt(ocr_text, ground_truth, prompt_mode)) / CHARS_PER_TOKEN + RESPONSE_TOKENS
+
+def judgeLLm(pair, model=None, prompt_mode="full"):
     """
-    response = client.chat.completions.parse(
-        model="gpt-4o-mini-2024-07-18", 
+    pair: Tuple (ocr_text, ground_truth, index)
+    model: Judge model, defaults to MODEL
+    prompt_mode: "full" sends both texts, "diff" only the regions where they differ
+    Returns: Result dictionary with the scores, the index, token usage and latency in seconds
+    """
+    ocr_text, ground_truth, index = pair
+    if not ocr_text or not ground_truth:
+        return empty_result(index)
+    prompt = build_prompt(ocr_text, ground_truth, prompt_mode)
+    start = time.perf_counter()
+    response = get_client().chat.completions.parse(
+        model=model or MODEL, 
         messages=[
             {
                 "role": "user",
@@ -69,8 +182,135 @@ def judgeLLm(pair):
             }
         ],
         response_format=ResponseModel,
-        temperature=0
+        temperature=TEMPERATURE
     )
     result =json.loads((response.choices[0].message.content))
     result["index"] = index
+    result.update(usage_fields(response, time.perf_counter() - start))
     return result
+
+def build_batch_item(ocr_text, ground_truth, index):
+    """One item of a diff mode batch prompt: the differing regions, or both texts if that is shorter."""
+    if not use_diff(ocr_text, ground_truth):
+        return build_full_item(ocr_text, ground_truth, index)
+    statistics, hunks = diff_prompt.compact_pair(ocr_text, ground_truth)
+    return f"""### ITEM {index}
+
+    **MATCH STATISTICS:**
+    {statistics}
+
+    **DIFFERENCES:**
+    {hunks or "None, the texts are identical."}"""
+
+def build_full_item(ocr_text, ground_truth, index):
+    """One item of a full mode batch prompt: both texts."""
+    return f"""### ITEM {index}
+
+    **OCR OUTPUT:**
+    {ocr_text}
+
+    **GROUND TRUTH:**
+    {ground_truth}"""
+
+def build_diff_batch_prompt(pairs):
+    """Judge prompt grading several pairs at once from their differing regions."""
+    items = "\n\n".join(build_batch_item(*pair) for pair in pairs)
+    return judge_prompt(f"""Below are {len(pairs)} independent items, each comparing an OCR output with its ground truth.
+    Grade every item on its own; never let one item influence another.
+    {NORMALIZED}
+    Most items show only the regions where the texts differ, with a few unchanged words around each; all other text matches the ground truth exactly.
+    {DIFF_MARKERS}
+    Items that differ too much to compact show the full OCR output and ground truth instead.
+
+    {items}""", BATCH_OUTPUT)
+
+def build_batch_prompt(pairs, prompt_mode="full"):
+    """Judge prompt grading several OCR/ground truth pairs at once."""
+    if prompt_mode == "diff":
+        return build_diff_batch_prompt(pairs)
+    items = "\n\n".join(build_full_item(*pair) for pair in pairs)
+    return judge_prompt(f"""Below are {len(pairs)} independent items, each with an OCR output and its ground truth.
+    Grade every item on its own; never let one item influence another.
+    {NORMALIZED}
+
+    {items}""", BATCH_OUTPUT)
+
+def estimate_batch_tokens(pairs, prompt_mode="full"):
+    """Approximate prompt plus response tokens of one batched judge call."""
+    return len(build_batch_prompt(pairs, prompt_mode)) / CHARS_PER_TOKEN + RESPONSE_TOKENS * len(pairs)
+
+def split_batches(pairs, batch_size, context_tokens=CONTEXT_TOKENS, prompt_mode="full"):
+    """
+    Pack pairs into batches of at most batch_size that fit the context window.
+
+    Pairs with an empty text are left out, they need no API call.
+    Returns: List of lists of pairs
+    """
+    # Fixed instructions; every pair adds its own share on top
+    overhead = estimate_batch_tokens([], prompt_mode)
+    batches = []
+    current, current_tokens = [], overhead
+    for pair in pairs:
+        ocr_text, ground_truth, _ = pair
+        if not ocr_text or not ground_truth:
+            continue
+        tokens = estimate_batch_tokens([pair], prompt_mode) - overhead
+        if current and (len(current) >= batch_size or current_tokens + tokens > context_tokens):
+            batches.append(current)
+            current, current_tokens = [], overhead
+        current.append(pair)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def judgeLLmBatch(pairs, model=None, prompt_mode="full"):
+    """
+    Grade several pairs in one structured-output request.
+
+    pairs: List of tuples (ocr_text, ground_truth, index)
+    model: Judge model, defaults to MODEL
+    prompt_mode: "full" or "diff", as in judgeLLm
+    Returns: Result dictionaries for the items the model graded. Items it left
+    out are missing, so the caller can grade them one by one. A response cut
+    off by the output limit is retried as two smaller batches.
+    """
+    results = [empty_result(index) for ocr_text, ground_truth, index in pairs
+               if not ocr_text or not ground_truth]
+    pairs = [pair for pair in pairs if pair[0] and pair[1]]
+    if not pairs:
+        return results
+    try:
+        start = time.perf_counter()
+        response = get_client().chat.completions.parse(
+            model=model or MODEL,
+            messages=[
+                {
+                    "role": "user",
+                    "content": build_batch_prompt(pairs, prompt_mode)
+                }
+            ],
+            response_format=BatchResponseModel,
+            temperature=TEMPERATURE
+        )
+    except LengthFinishReasonError:
+        if len(pairs) == 1:
+            raise
+        middle = len(pairs) // 2
+        return (results + judgeLLmBatch(pairs[:middle], model, prompt_mode)
+                + judgeLLmBatch(pairs[middle:], model, prompt_mode))
+
+    parsed = response.choices[0].message.parsed
+    if parsed is None:
+        return results
+    expected = {index for _, _, index in pairs}
+    graded = []
+    for item in parsed.items:
+        if item.index in expected:
+            expected.discard(item.index)
+            graded.append(item.model_dump())
+    # The request's usage is shared by the items it graded
+    usage = usage_fields(response, time.perf_counter() - start, max(len(graded), 1))
+    for result in graded:
+        result.update(usage)
+    return results + graded
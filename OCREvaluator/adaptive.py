@@ -0,0 +1,268 @@
+"""
+Adaptive evaluation: grade items only until the engine scores are settled.
+
+Items are drawn in stratified random order, the strata being the dataset's
+document types, in rounds of `step` items. Every engine grades the same
+items, so engines are compared on paired differences. After each round the
+sampler updates a stratified mean and a normal confidence interval for every
+engine and for the difference between engines that rank next to each other,
+and stops when:
+
+    width   - every engine's interval is narrower than +/- ci_width points
+    ranking - every adjacent pair of engines is separated, i.e. the interval of
+              their paired difference excludes 0 (Bonferroni over the pairs)
+    either  - whichever comes first (default)
+
+or when the items run out. Looking at the intervals after every round makes
+them somewhat optimistic; `min_items` and a higher confidence guard against
+stopping on an early fluke.
+"""
+
+import random
+from statistics import NormalDist
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from arrow_export import document_type
+from stats import RunningStats
+
+STOP_RULES = ("either", "width", "ranking")
+CONFIDENCE = 0.95
+# Target half-width of each engine's confidence interval, in score points
+CI_WIDTH = 2.0
+# Items graded before any stopping rule is checked
+MIN_ITEMS = 30
+# Items drawn per round
+STEP = 20
+UNKNOWN_STRATUM = "unknown"
+
+
+def strata_from_metadata(indices: Iterable[int], item_metadata: Optional[Sequence[str]]) -> Dict[int, str]:
+    """Document type of each dataset index, from the per-item metadata (UNKNOWN_STRATUM if none)."""
+    strata = {}
+    for index in indices:
+        metadata = None
+        if item_metadata is not None and isinstance(index, int) and 0 <= index < len(item_metadata):
+            metadata = item_metadata[index]
+        strata[index] = document_type(metadata) or UNKNOWN_STRATUM
+    return strata
+
+
+def stratified_estimate(values: Iterable[Tuple[str, float]], stratum_sizes: Dict[str, int],
+                        z: float) -> Dict[str, Any]:
+    """
+    Stratified mean and confidence interval of a sample.
+
+    Args:
+        values: (stratum, value) of every sampled item
+        stratum_sizes: Items per stratum in the whole population
+        z: Normal quantile of the interval
+
+    Returns:
+        {mean, half_width, ci_low, ci_high, n}; strata not sampled yet are left
+        out of the weights, and strata with a single value borrow the pooled variance
+    """
+    per_stratum: Dict[str, RunningStats] = {}
+    pooled = RunningStats()
+    for stratum, value in values:
+        per_stratum.setdefault(stratum, RunningStats()).add(value)
+        pooled.add(value)
+    if pooled.count == 0:
+        return {'mean': None, 'half_width': None, 'ci_low': None, 'ci_high': None, 'n': 0}
+
+    sampled = sum(stratum_sizes[stratum] for stratum in per_stratum)
+    mean = variance = 0.0
+    for stratum, stats in per_stratum.items():
+        size = stratum_sizes[stratum]
+        weight = size / sampled
+        stratum_variance = stats.variance if stats.count > 1 else pooled.variance
+        # Finite population correction: a fully graded stratum has no sampling error
+        correction = max(0.0, 1 - stats.count / size)
+        mean += weight * stats.mean
+        variance += weight ** 2 * stratum_variance / stats.count * correction
+    half_width = z * variance ** 0.5
+    return {'mean': mean, 'half_width': half_width, 'ci_low': mean - half_width,
+            'ci_high': mean + half_width, 'n': pooled.count}
+
+
+class AdaptiveSampler:
+    """Draws items in stratified random order and decides when grading can stop."""
+
+    def __init__(self, engines: Sequence[str], strata: Dict[Any, str], metric: str = "overall_score",
+                 confidence: float = CONFIDENCE, ci_width: float = CI_WIDTH, stop_rule: str = "either",
+                 min_items: int = MIN_ITEMS, step: int = STEP, seed: int = 0):
+        """
+        Args:
+            engines: Engines being compared
+            strata: Stratum (document type) of every item that may be drawn
+            metric: Result field the intervals are computed for
+            confidence: Confidence level of the intervals
+            ci_width: Target half-width of every engine's interval (width rule)
+            stop_rule: "either", "width" or "ranking"
+            min_items: Items graded before the stopping rules are checked
+            step: Items drawn per round
+            seed: Seed of the random order
+        """
+        if stop_rule not in STOP_RULES:
+            raise ValueError(f"Unknown stop rule {stop_rule!r}, use one of {', '.join(STOP_RULES)}")
+        self.engines = list(engines)
+        self.strata = strata
+        self.metric = metric
+        self.confidence = confidence
+        self.ci_width = ci_width
+        self.stop_rule = stop_rule
+        self.min_items = min_items
+        self.step = step
+        self.z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+        # Adjacent pairs of a ranking of k engines are k - 1 simultaneous comparisons
+        comparisons = max(1, len(self.engines) - 1)
+        self.z_pairs = NormalDist().inv_cdf(1 - (1 - confidence) / (2 * comparisons))
+
+        rng = random.Random(seed)
+        self.stratum_sizes: Dict[str, int] = {}
+        self._order: Dict[str, List[Any]] = {}
+        for index in sorted(strata, key=str):
+            self._order.setdefault(strata[index], []).append(index)
+        for stratum, indices in self._order.items():
+            rng.shuffle(indices)
+            self.stratum_sizes[stratum] = len(indices)
+        self.drawn: Dict[str, int] = {stratum: 0 for stratum in self._order}
+        self.values: Dict[str, Dict[Any, float]] = {engine: {} for engine in self.engines}
+        self.rounds = 0
+        self.history: List[Dict[str, Any]] = []
+        self.stop_reason: Optional[str] = None
+
+    @property
+    def items_available(self) -> int:
+        return len(self.strata)
+
+    @property
+    def items_drawn(self) -> int:
+        return sum(self.drawn.values())
+
+    def add(self, engine: str, index: Any, result: Dict[str, Any]) -> None:
+        """Record a graded result; failures and refusals are left out."""
+        if engine not in self.values or index not in self.strata:
+            return
+        if result.get('error') or 'refusal' in result or result.get(self.metric) is None:
+            return
+        self.values[engine][index] = float(result[self.metric])
+
+    def next_round(self) -> List[Any]:
+        """
+        Draw the next `step` items, keeping every stratum's share proportional to its size.
+
+        Returns:
+            Dataset indices to grade, empty once every item was drawn
+        """
+        target = min(self.items_available, self.items_drawn + self.step)
+        drawn = []
+        while self.items_drawn < target:
+            # The stratum furthest behind its proportional share goes next
+            stratum = max((s for s in self._order if self.drawn[s] < self.stratum_sizes[s]),
+                          key=lambda s: target * self.stratum_sizes[s] / self.items_available - self.drawn[s])
+            drawn.append(self._order[stratum][self.drawn[stratum]])
+            self.drawn[stratum] += 1
+        return drawn
+
+    def _take_graded(self) -> None:
+        """Count items every engine already has a value for (a resumed run) as drawn."""
+        for stratum, order in self._order.items():
+            rest = order[self.drawn[stratum]:]
+            graded = [index for index in rest if all(index in values for values in self.values.values())]
+            if graded:
+                done = set(graded)
+                order[self.drawn[stratum]:] = graded + [index for index in rest if index not in done]
+                self.drawn[stratum] += len(graded)
+
+    def _estimate(self, values: Dict[Any, float], z: float) -> Dict[str, Any]:
+        return stratified_estimate(((self.strata[index], value) for index, value in values.items()),
+                                   self.stratum_sizes, z)
+
+    def status(self) -> Dict[str, Any]:
+        """Current estimates, ranking and paired differences of adjacent engines."""
+        estimates = {engine: self._estimate(self.values[engine], self.z) for engine in self.engines}
+        ranking = sorted((engine for engine in self.engines if estimates[engine]['n']),
+                         key=lambda engine: -estimates[engine]['mean'])
+        differences = []
+        for better, worse in zip(ranking, ranking[1:]):
+            paired = {index: value - self.values[worse][index]
+                      for index, value in self.values[better].items() if index in self.values[worse]}
+            difference = self._estimate(paired, self.z_pairs)
+            difference.update(better=better, worse=worse,
+                              decisive=difference['n'] > 1 and difference['ci_low'] > 0)
+            differences.append(difference)
+        width_met = all(e['n'] > 1 and e['half_width'] <= self.ci_width for e in estimates.values())
+        ranking_met = len(self.engines) > 1 and len(ranking) == len(self.engines) and \
+            all(difference['decisive'] for difference in differences)
+        return {'engines': estimates, 'ranking': ranking, 'differences': differences,
+                'width_met': width_met, 'ranking_met': ranking_met}
+
+    def should_stop(self, status: Dict[str, Any]) -> Optional[str]:
+        """Why grading can stop now, or None."""
+        if self.items_drawn >= self.items_available:
+            return "exhausted"
+        if self.items_drawn < self.min_items:
+            return None
+        if status['width_met'] and self.stop_rule in ("either", "width"):
+            return "ci_width"
+        if status['ranking_met'] and self.stop_rule in ("either", "ranking"):
+            return "ranking"
+        return None
+
+    def run(self, grade_round: Callable[[List[Any]], None],
+            on_round: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Grade round after round until a stopping rule is met.
+
+        Args:
+            grade_round: Grades every engine on the given dataset indices; the
+                results must reach add() before it returns
+            on_round: Called with the status after every round
+
+        Returns:
+            The final status
+        """
+        # Items graded in an earlier run may already settle the comparison
+        self._take_graded()
+        status = self.status()
+        while True:
+            self.stop_reason = self.should_stop(status) if self.items_drawn else None
+            if self.stop_reason:
+                return status
+            indices = self.next_round()
+            if not indices:
+                self.stop_reason = "exhausted"
+                return status
+            grade_round(indices)
+            self.rounds += 1
+            status = self.status()
+            self.history.append({
+                'round': self.rounds,
+                'items': self.items_drawn,
+                'half_width': {engine: e['half_width'] for engine, e in status['engines'].items()},
+                'ranking': status['ranking'],
+            })
+            if on_round:
+                on_round(status)
+
+    def report(self, status: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Summary for adaptive_report.json: items needed, judge calls saved and the final intervals."""
+        status = status or self.status()
+        return {
+            'metric': self.metric,
+            'confidence': self.confidence,
+            'ci_width_target': self.ci_width,
+            'stop_rule': self.stop_rule,
+            'stop_reason': self.stop_reason,
+            'rounds': self.rounds,
+            'items_available': self.items_available,
+            'items_needed': self.items_drawn,
+            'items_fraction': round(self.items_drawn / self.items_available, 4) if self.items_available else None,
+            'judge_calls_saved': (self.items_available - self.items_drawn) * len(self.engines),
+            'strata': {stratum: {'available': size, 'drawn': self.drawn[stratum]}
+                       for stratum, size in sorted(self.stratum_sizes.items())},
+            'engines': status['engines'],
+            'ranking': status['ranking'],
+            'differences': status['differences'],
+            'history': self.history,
+        }
@@ -0,0 +1,203 @@
+"""
+Typed Parquet export of grading results for notebooks and dashboards.
+
+Results are joined with the OCR runners' per-item timings and the dataset
+metadata, and written as a Hive-partitioned Parquet dataset:
+
+    grading_results.parquet/run=<run id>/engine=<engine>/part-0.parquet
+
+Files are zstd-compressed and written in row groups of ROW_GROUP_ROWS rows
+sorted by index, so column statistics let readers skip row groups. Read it
+with read_results (memory-mapped, with filters pushed down), or with
+pandas.read_parquet / pyarrow.dataset / DuckDB on the directory.
+
+pyarrow is optional; only this export needs it.
+"""
+
+import json
+import logging
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+ROW_GROUP_ROWS = 65536
+COMPRESSION = "zstd"
+
+# (column, Arrow type); run and engine are the partition columns
+FIELDS = [
+    ('index', 'int64'),
+    ('item', 'string'),
+    ('model', 'string'),
+    ('judge', 'string'),
+    ('graded_by', 'string'),
+    ('overall_score', 'float64'),
+    ('character_accuracy', 'float64'),
+    ('word_accuracy', 'float64'),
+    ('confidence_level', 'float64'),
+    ('cer', 'float64'),
+    ('wer', 'float64'),
+    ('chunks', 'int32'),
+    ('prompt_tokens', 'float64'),
+    ('completion_tokens', 'float64'),
+    ('judge_seconds', 'float64'),
+    ('ocr_seconds', 'float64'),
+    ('error', 'string'),
+    ('dataset', 'string'),
+    ('dataset_split', 'string'),
+    ('dataset_fingerprint', 'string'),
+    ('document_type', 'string'),
+    ('item_metadata', 'string'),
+]
+# Result fields copied as they are
+_COPIED = ('model', 'judge', 'graded_by', 'overall_score', 'character_accuracy', 'word_accuracy',
+           'confidence_level', 'cer', 'wer', 'chunks', 'prompt_tokens', 'completion_tokens')
+# Keys naming the document type in the dataset's per-item metadata
+_TYPE_KEYS = ('documentType', 'document_type', 'type')
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow")
+
+
+def schema() -> "pa.Schema":
+    """Arrow schema of the exported files (without the partition columns)."""
+    _require_pyarrow()
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in FIELDS])
+
+
+def document_type(metadata: Optional[str]) -> Optional[str]:
+    """Document type from a dataset item's JSON metadata, or None."""
+    if not metadata:
+        return None
+    try:
+        parsed = json.loads(metadata)
+    except ValueError:
+        return None
+    if not isinstance(parsed, dict):
+        return None
+    for key in _TYPE_KEYS:
+        if parsed.get(key) is not None:
+            return str(parsed[key])
+    return None
+
+
+def _row(result: Dict[str, Any], timings: Dict[int, float], item_metadata: Optional[Sequence[str]],
+         dataset: Dict[str, Any]) -> List[Any]:
+    index = result.get('index')
+    numeric = index if isinstance(index, int) else None
+    metadata = None
+    if item_metadata is not None and numeric is not None and 0 <= numeric < len(item_metadata):
+        metadata = item_metadata[numeric]
+    error = result.get('refusal') or result.get('error')
+    row = {field: result.get(field) for field in _COPIED}
+    row.update({
+        'index': numeric,
+        'item': str(index),
+        'judge_seconds': result.get('latency'),
+        'ocr_seconds': timings.get(numeric),
+        'error': str(error) if error else None,
+        'dataset': dataset.get('dataset'),
+        'dataset_split': dataset.get('split'),
+        'dataset_fingerprint': dataset.get('fingerprint'),
+        'document_type': document_type(metadata),
+        'item_metadata': metadata,
+    })
+    return [row[name] for name, _ in FIELDS]
+
+
+class _PartitionWriter:
+    """Buffers one engine's rows and writes them out a row group at a time."""
+
+    def __init__(self, path: Path, arrow_schema: "pa.Schema", row_group_rows: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.schema = arrow_schema
+        self.row_group_rows = row_group_rows
+        self.writer = pq.ParquetWriter(path, arrow_schema, compression=COMPRESSION)
+        self.rows: List[List[Any]] = []
+
+    def add(self, row: List[Any]) -> None:
+        self.rows.append(row)
+        if len(self.rows) >= self.row_group_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.rows:
+            columns = [list(column) for column in zip(*self.rows)]
+            self.writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+                schema=self.schema))
+            self.rows = []
+
+    def close(self) -> None:
+        self.flush()
+        self.writer.close()
+
+
+def export_results(records: Iterable[Dict[str, Any]], output_dir: Path, run_id: str,
+                   timings: Optional[Dict[str, Dict[int, float]]] = None,
+                   item_metadata: Optional[Sequence[str]] = None,
+                   dataset: Optional[Dict[str, Any]] = None,
+                   row_group_rows: int = ROW_GROUP_ROWS) -> int:
+    """
+    Write results as the run=<run_id> partition of a Parquet dataset.
+
+    Args:
+        records: One result per item, tagged with 'source' (the engine), in index order
+        output_dir: Root of the Parquet dataset; an existing partition of this run is replaced
+        run_id: Run identifier, the first partition level
+        timings: Engine -> index -> OCR seconds, from comparison.read_timings
+        item_metadata: Per-index dataset metadata (JSON strings), e.g. a GroundTruthStore
+        dataset: Dataset-level metadata (dataset, split, fingerprint)
+        row_group_rows: Rows per Parquet row group
+
+    Returns:
+        Number of rows written
+    """
+    arrow_schema = schema()
+    run_dir = Path(output_dir) / f"run={quote(run_id, safe='')}"
+    if run_dir.exists():
+        shutil.rmtree(run_dir)
+    timings = timings or {}
+    dataset = dataset or {}
+
+    writers: Dict[str, _PartitionWriter] = {}
+    count = 0
+    try:
+        for result in records:
+            engine = str(result.get('source') or "")
+            if engine not in writers:
+                writers[engine] = _PartitionWriter(
+                    run_dir / f"engine={quote(engine, safe='')}" / "part-0.parquet", arrow_schema, row_group_rows)
+            writers[engine].add(_row(result, timings.get(engine, {}), item_metadata, dataset))
+            count += 1
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    logging.getLogger(__name__).info(f"Exported {count} results to {run_dir}")
+    return count
+
+
+def read_results(path: Path, columns: Optional[List[str]] = None, filters: Optional[Any] = None) -> "pa.Table":
+    """
+    Read an exported dataset (or one partition of it), memory-mapped.
+
+    Args:
+        path: Dataset root, a run=... directory or a single file
+        columns: Columns to read, partition columns (run, engine) included
+        filters: pyarrow filters, e.g. [('engine', '=', 'qwen'), ('overall_score', '<', 50)];
+                 whole partitions and row groups that cannot match are skipped
+    """
+    _require_pyarrow()
+    # Partition values are always strings, even when they look like numbers
+    partitioning = ds.partitioning(pa.schema([('run', pa.string()), ('engine', pa.string())]), flavor="hive")
+    return pq.read_table(path, columns=columns, filters=filters, memory_map=True, partitioning=partitioning)
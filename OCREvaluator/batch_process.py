@@ -8,43 +8,53 @@ import sys
 from pathlib import Path
 import subprocess
 
+import cost_estimator
+from file_processor import FILE_SUFFIX
+
+PRESETS = {
+    "fast": {
+        "llm": "openai",
+        "model": "gpt-4o-mini",
+        "batch_size": 10,
+        "description": "Fast and cost-effective using GPT-4o-mini"
+    },
+    "accurate": {
+        "llm": "openai", 
+        "model": "gpt-4o",
+        "batch_size": 5,
+        "description": "Most accurate using GPT-4o"
+    },
+    "cascade": {
+        "llm": "openai",
+        "model": "gpt-4o-mini",
+        "cascade_model": "gpt-4o",
+        "batch_size": 10,
+        "description": "GPT-4o-mini, re-grading uncertain items with GPT-4o"
+    },
+    "claude": {
+        "llm": "anthropic",
+        "model": "claude-3-sonnet-20240229",
+        "batch_size": 5,
+        "description": "Using Claude Sonnet for analysis"
+    },
+    "claude-fast": {
+        "llm": "anthropic",
+        "model": "claude-3-haiku-20240307",
+        "batch_size": 10,
+        "description": "Fast Claude Haiku processing"
+    }
+}
+
 
 def run_grading(ocr_dir, ground_truth_dir, preset="fast", custom_args=None):
     """Run the OCR grading with specified preset."""
     
-    presets = {
-        "fast": {
-            "llm": "openai",
-            "model": "gpt-4o-mini",
-            "batch_size": 10,
-            "description": "Fast and cost-effective using GPT-4o-mini"
-        },
-        "accurate": {
-            "llm": "openai", 
-            "model": "gpt-4o",
-            "batch_size": 5,
-            "description": "Most accurate using GPT-4o"
-        },
-        "claude": {
-            "llm": "anthropic",
-            "model": "claude-3-sonnet-20240229",
-            "batch_size": 5,
-            "description": "Using Claude Sonnet for analysis"
-        },
-        "claude-fast": {
-            "llm": "anthropic",
-            "model": "claude-3-haiku-20240307",
-            "batch_size": 10,
-            "description": "Fast Claude Haiku processing"
-        }
-    }
-    
-    if preset not in presets:
+    if preset not in PRESETS:
         print(f"❌ Unknown preset: {preset}")
-        print(f"Available presets: {', '.join(presets.keys())}")
+        print(f"Available presets: {', '.join(PRESETS.keys())}")
         return False
     
-    config = presets[preset]
+    config = PRESETS[preset]
     print(f"🚀 Running with preset '{preset}': {config['description']}")
     
     # Build command
@@ -56,6 +66,8 @@ def run_grading(ocr_dir, ground_truth_dir, preset="fast", custom_args=None):
         "--model", config["model"],
         "--batch-size", str(config["batch_size"])
     ]
+    if "cascade_model" in config:
+        cmd.extend(["--cascade-model", config["cascade_model"]])
     
     # Add custom arguments
     if custom_args:
@@ -72,19 +84,38 @@ def run_grading(ocr_dir, ground_truth_dir, preset="fast", custom_args=None):
         return False
 
 
-def estimate_cost(num_files, preset="fast"):
-    """Estimate approximate cost for processing."""
-    
-    cost_per_1000 = {
-        "fast": 3.0,  # GPT-4o-mini
-        "accurate": 20.0,  # GPT-4o
-        "claude": 12.0,  # Claude Sonnet
-        "claude-fast": 2.0  # Claude Haiku
-    }
-    
-    cost = (num_files / 1000) * cost_per_1000.get(preset, 10.0)
-    print(f"💰 Estimated cost for {num_files} files with '{preset}' preset: ${cost:.2f}")
-    return cost
+def _format_seconds(seconds):
+    """Human readable duration."""
+    if seconds < 90:
+        return f"{seconds:.0f}s"
+    if seconds < 5400:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def estimate_cost(corpus, preset="fast", concurrency=8, rpm=None, tpm=None, results_log=None,
+                  escalation_rate=cost_estimator.ESCALATION_RATE):
+    """Estimate cost and duration of every preset from the real texts; returns the chosen preset's estimate."""
+    
+    print(f"💰 Estimates for {corpus.pairs} pairs ({corpus.chars:,} characters), "
+          f"concurrency {concurrency}" + (f", {rpm:g} RPM" if rpm else "") + (f", {tpm:g} TPM" if tpm else ""))
+    print(f"   {'preset':<12} {'requests':>9} {'prompt tok':>12} {'output tok':>11} {'cost':>10} {'time':>7}")
+    
+    chosen = None
+    for name, config in PRESETS.items():
+        estimate = cost_estimator.estimate_preset(config, corpus, concurrency, rpm, tpm,
+                                                  results_log, escalation_rate)
+        requests = sum(p['requests'] for p in estimate['passes'])
+        cost = f"${estimate['cost_usd']:.2f}" if estimate['cost_usd'] is not None else "unknown"
+        marker = "👉" if name == preset else "  "
+        print(f"{marker} {name:<12} {requests:>9} {estimate['prompt_tokens']:>12,} "
+              f"{estimate['completion_tokens']:>11,} {cost:>10} {_format_seconds(estimate['seconds']):>7}")
+        if name == preset:
+            chosen = estimate
+    
+    if PRESETS[preset].get("cascade_model"):
+        print(f"   (cascade assumes {escalation_rate:.0%} of items are escalated)")
+    return chosen
 
 
 def main():
@@ -96,6 +127,7 @@ def main():
 Presets:
   fast        - GPT-4o-mini, batch_size=10 (cost-effective)
   accurate    - GPT-4o, batch_size=5 (most accurate)  
+  cascade     - GPT-4o-mini, uncertain items re-graded by GPT-4o
   claude      - Claude Sonnet, batch_size=5 (alternative LLM)
   claude-fast - Claude Haiku, batch_size=10 (fast Claude)
 
@@ -108,12 +140,25 @@ Examples:
     
     parser.add_argument("ocr_dir", help="Directory containing OCR files")
     parser.add_argument("ground_truth_dir", help="Directory containing ground truth files") 
-    parser.add_argument("--preset", choices=["fast", "accurate", "claude", "claude-fast"], 
+    parser.add_argument("--preset", choices=["fast", "accurate", "cascade", "claude", "claude-fast"], 
                        default="fast", help="Processing preset (default: fast)")
     parser.add_argument("--estimate-only", action="store_true", 
                        help="Only estimate cost, don't run processing")
     parser.add_argument("--resume", action="store_true", help="Resume previous run")
     parser.add_argument("--output-dir", help="Custom output directory")
+    parser.add_argument("--suffix", default=FILE_SUFFIX,
+                       help="Suffix of the OCR result files, e.g. 0llamacpp.txt (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=8,
+                       help="Concurrent judge requests (default: 8)")
+    parser.add_argument("--rpm", type=float, help="Requests-per-minute limit of the API key")
+    parser.add_argument("--tpm", type=float, help="Tokens-per-minute limit of the API key")
+    parser.add_argument("--sample", type=int, default=cost_estimator.SAMPLE_PAIRS,
+                       help="Pairs tokenized exactly for the estimate (default: %(default)s)")
+    parser.add_argument("--escalation-rate", type=float, default=cost_estimator.ESCALATION_RATE,
+                       help="Share of items the cascade preset is assumed to escalate (default: %(default)s)")
+    parser.add_argument("--results-log",
+                       help="grading_results.jsonl of an earlier run to calibrate request speed "
+                            "(default: the output directory's, if present)")
     
     args = parser.parse_args()
     
@@ -129,28 +174,26 @@ Examples:
         print(f"❌ Ground truth directory not found: {gt_dir}")
         return 1
     
-    # Count files
-    ocr_files = list(ocr_dir.glob("*.txt"))
-    gt_files = list(gt_dir.glob("*.txt"))
+    # Pair and measure files
+    corpus = cost_estimator.scan_corpus(ocr_dir, gt_dir, args.suffix, args.sample)
     
-    print(f"📁 Found {len(ocr_files)} OCR files and {len(gt_files)} ground truth files")
-    
-    if not ocr_files:
-        print("❌ No OCR files found")
-        return 1
+    print(f"📁 Found {corpus.pairs} OCR/ground truth file pairs")
     
-    if not gt_files:
-        print("❌ No ground truth files found")  
+    if not corpus.pairs:
+        print("❌ No file pairs found")
         return 1
     
     # Estimate cost
-    estimate_cost(len(ocr_files), args.preset)
+    output_dir = Path(args.output_dir) if args.output_dir else Path("./results")
+    results_log = Path(args.results_log) if args.results_log else output_dir / "grading_results.jsonl"
+    estimate_cost(corpus, args.preset, args.concurrency, args.rpm, args.tpm,
+                  results_log if results_log.exists() else None, args.escalation_rate)
     
     if args.estimate_only:
         return 0
     
     # Confirm processing
-    response = input(f"\n❓ Proceed with processing {len(ocr_files)} files using '{args.preset}' preset? (y/N): ")
+    response = input(f"\n❓ Proceed with processing {corpus.pairs} files using '{args.preset}' preset? (y/N): ")
     if response.lower() not in ['y', 'yes']:
         print("❌ Processing cancelled")
         return 0
@@ -161,13 +204,17 @@ Examples:
         custom_args.append("--resume")
     if args.output_dir:
         custom_args.extend(["--output-dir", args.output_dir])
+    custom_args.extend(["--suffix", args.suffix, "--concurrency", str(args.concurrency)])
+    if args.rpm:
+        custom_args.extend(["--rpm", str(args.rpm)])
+    if args.tpm:
+        custom_args.extend(["--tpm", str(args.tpm)])
     
     # Run processing
     success = run_grading(ocr_dir, gt_dir, args.preset, custom_args)
     
     if success:
         print("\n🎉 Processing completed!")
-        output_dir = Path(args.output_dir) if args.output_dir else Path("./results")
         print(f"📊 Results available in: {output_dir}")
         print(f"📈 View summary: {output_dir}/summary_report.json")
         print(f"🌐 View report: {output_dir}/detailed_report.html")
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark of the evaluator stages on synthetic corpora.
+
+A seeded corpus of N pairs (ground truth of random words, OCR output with a
+few character errors) is generated once per size under --work-dir. Every
+stage of an evaluation then runs on it in turn, with the LLM judge stubbed
+out, and each stage's wall time, peak memory and I/O volume are recorded:
+
+    pair_files      directory scan and pairing (FileProcessor)
+    load_normalize  reading and normalizing every pair
+    local_metrics   edit-distance metrics of every pair
+    judge           grade_pairs with a stub judge (or the mock server)
+    save_results    appending every result to the result log
+    summary         summary statistics
+    compact         materializing JSON/CSV from the log
+    report          per-item HTML report and summary page
+    parquet         Parquet export (skipped without pyarrow)
+    resume_scan     latest result per index, as --resume reads it
+
+Results go to results/benchmarks/benchmark_<commit>_<time>.json; --compare
+checks them against an earlier file and exits with 1 on regressions.
+
+Usage:
+    python benchmark.py --sizes 1000,10000
+    python benchmark.py --compare results/benchmarks/benchmark_abc1234_....json
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import string
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import LLM
+import main
+import metrics
+from file_processor import FileProcessor
+from results_manager import ResultsManager
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+SIZES = (1000, 10000, 100000, 1000000)
+WORK_DIR = Path("./cache/benchmark")
+BENCHMARK_DIR = Path("./results/benchmarks")
+SUFFIX = "bench"
+# Characters per ground truth page and share of characters the OCR gets wrong
+PAGE_CHARS = 400
+ERROR_RATE = 0.03
+# A stage regresses when it gets this many times slower (or bigger)
+TOLERANCE = 1.5
+# Stages shorter than this are too noisy to compare
+MIN_SECONDS = 0.05
+STAGES = ("pair_files", "load_normalize", "local_metrics", "judge", "save_results",
+          "summary", "compact", "report", "parquet", "resume_scan")
+
+logger = logging.getLogger(__name__)
+
+
+def _words(rng: random.Random, chars: int) -> str:
+    words, length = [], 0
+    while length < chars:
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9)))
+        if rng.random() < 0.1:
+            word = word.capitalize() + rng.choice(".,")
+        words.append(word)
+        length += len(word) + 1
+    lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+    return "\n".join(lines)
+
+
+def _corrupt(rng: random.Random, text: str, error_rate: float) -> str:
+    chars = list(text)
+    for _ in range(int(len(chars) * error_rate)):
+        position = rng.randrange(len(chars))
+        edit = rng.random()
+        if edit < 0.6:
+            chars[position] = rng.choice(string.ascii_lowercase + "01l")
+        elif edit < 0.8:
+            chars[position] = ""
+        else:
+            chars[position] += rng.choice(string.ascii_lowercase)
+    return "".join(chars)
+
+
+def generate_corpus(directory: Path, size: int, seed: int = 0, page_chars: int = PAGE_CHARS,
+                    error_rate: float = ERROR_RATE) -> Tuple[Path, Path]:
+    """
+    Write a synthetic corpus of `size` pairs, or reuse one made with the same parameters.
+
+    Returns:
+        (OCR directory with {i}bench.txt files, ground truth directory with {i}.txt files)
+    """
+    ocr_dir, gt_dir = directory / "ocr", directory / "ground_truth"
+    marker = directory / "corpus.json"
+    parameters = {'size': size, 'seed': seed, 'page_chars': page_chars, 'error_rate': error_rate}
+    if marker.exists() and json.loads(marker.read_text()) == parameters:
+        return ocr_dir, gt_dir
+
+    shutil.rmtree(directory, ignore_errors=True)
+    ocr_dir.mkdir(parents=True)
+    gt_dir.mkdir(parents=True)
+    rng = random.Random(seed)
+    for i in range(size):
+        ground_truth = _words(rng, page_chars)
+        (gt_dir / f"{i}.txt").write_text(ground_truth, encoding="utf-8")
+        (ocr_dir / f"{i}{SUFFIX}.txt").write_text(_corrupt(rng, ground_truth, error_rate), encoding="utf-8")
+    marker.write_text(json.dumps(parameters))
+    return ocr_dir, gt_dir
+
+
+def stub_judge(pair, model=None, prompt_mode="full"):
+    """Stand-in for LLM.judgeLLm: builds the prompt, skips the request, scores by index."""
+    ocr_text, ground_truth, index = pair
+    prompt = LLM.build_prompt(ocr_text, ground_truth, prompt_mode)
+    score = float(hash(index) % 41 + 60)
+    return {
+        "overall_score": score,
+        "character_accuracy": score,
+        "word_accuracy": score - 5,
+        "confidence_level": 90,
+        "index": index,
+        "prompt_tokens": len(prompt) / LLM.CHARS_PER_TOKEN,
+        "completion_tokens": LLM.RESPONSE_TOKENS,
+        "latency": 0.0,
+    }
+
+
+def stub_judge_batch(pairs, model=None, prompt_mode="full"):
+    """Stand-in for LLM.judgeLLmBatch, see stub_judge."""
+    LLM.build_batch_prompt(pairs, prompt_mode)
+    return [stub_judge(pair, model, "full") for pair in pairs]
+
+
+# --- Measurements -----------------------------------------------------------
+
+def _reset_peak_memory() -> bool:
+    """Reset the process' peak RSS (Linux); False where that is not possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_memory_bytes() -> int:
+    """Peak RSS since the last reset (VmHWM), or since start-up."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _io_counters() -> Dict[str, int]:
+    """Bytes read and written by this process so far, from /proc/self/io."""
+    counters = {}
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                key, value = line.split(":")
+                counters[key] = int(value)
+    except OSError:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {'read_blocks': usage.ru_inblock, 'write_blocks': usage.ru_oublock}
+    return {
+        'read_bytes': counters.get('rchar', 0),
+        'write_bytes': counters.get('wchar', 0),
+        'disk_read_bytes': counters.get('read_bytes', 0),
+        'disk_write_bytes': counters.get('write_bytes', 0),
+    }
+
+
+def measure(stage: Callable[[], Any], items: int) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Run one stage and measure it.
+
+    Returns:
+        (the stage's return value, {seconds, items_per_second, peak_rss_bytes,
+        rss_reset, read/write byte counts})
+    """
+    gc.collect()
+    rss_reset = _reset_peak_memory()
+    io_before = _io_counters()
+    start = time.perf_counter()
+    value = stage()
+    seconds = time.perf_counter() - start
+    io_after = _io_counters()
+    measurement = {
+        'seconds': round(seconds, 4),
+        'items_per_second': round(items / seconds, 1) if seconds > 0 else None,
+        'peak_rss_bytes': _peak_memory_bytes(),
+        'rss_reset': rss_reset,
+    }
+    measurement.update({key: io_after[key] - io_before.get(key, 0) for key in io_after})
+    return value, measurement
+
+
+# --- Stages -----------------------------------------------------------------
+
+def judge_args(args: argparse.Namespace) -> argparse.Namespace:
+    """main's options for grade_pairs, with the benchmark's judge settings and no rate limits."""
+    judge = main.parse_args([])
+    judge.judge = "llm"
+    judge.batch_size = args.batch_size
+    judge.concurrency = args.concurrency
+    judge.prompt_mode = args.prompt_mode
+    return judge
+
+
+def run_size(size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Generate (or reuse) the corpus of one size and run every stage on it."""
+    directory = args.work_dir / str(size)
+    (ocr_dir, gt_dir), generate = measure(
+        lambda: generate_corpus(directory, size, args.seed, args.page_chars, args.error_rate), size)
+    stages: Dict[str, Dict[str, Any]] = {}
+    selected = set(args.stages)
+
+    def run(name: str, stage: Callable[[], Any], items: int = size) -> Any:
+        if name not in selected:
+            return None
+        value, stages[name] = measure(stage, items)
+        logger.info(f"{size:>9} {name:<15} {stages[name]['seconds']:>9.3f}s "
+                    f"{stages[name]['peak_rss_bytes'] / 2 ** 20:>8.1f} MB")
+        return value
+
+    run("pair_files", lambda: FileProcessor(ocr_dir, gt_dir, suffix=SUFFIX).find_file_pairs())
+    outputs = run("load_normalize", lambda: main.load_directory_outputs(ocr_dir, gt_dir, SUFFIX))
+    if outputs is None:
+        outputs = main.load_directory_outputs(ocr_dir, gt_dir, SUFFIX)
+    pairs = [(ocr_text, ground_truth, index) for index, ocr_text, ground_truth in outputs[ocr_dir.name]]
+    del outputs
+
+    run("local_metrics", lambda: [metrics.judgeLocal(pair) for pair in pairs])
+
+    results = run("judge", lambda: main.grade_pairs(pairs, judge_args(args))[0])
+    if results is None:
+        results = [stub_judge(pair) for pair in pairs]
+    for result in results:
+        result['source'] = ocr_dir.name
+
+    output_dir = directory / "results"
+    shutil.rmtree(output_dir, ignore_errors=True)
+    manager = ResultsManager(output_dir)
+
+    def save_results():
+        for result in results:
+            manager.save_result(result)
+        manager.close()
+    if "save_results" in selected:
+        run("save_results", save_results)
+    else:
+        save_results()
+
+    run("summary", lambda: manager._calculate_summary_stats(results, []))
+    run("compact", manager.compact)
+    texts = {(ocr_dir.name, index): (ocr_text, ground_truth) for ocr_text, ground_truth, index in pairs}
+
+    def report():
+        manager.generate_item_report(lambda source, index: texts.get((source, index)))
+        manager._generate_html_report(manager._calculate_summary_stats(results, []), results)
+    run("report", report)
+    del texts
+    if pyarrow is not None:
+        run("parquet", lambda: manager.export_parquet("benchmark"))
+    run("resume_scan", lambda: manager.latest_results(ocr_dir.name))
+
+    if not args.keep_results:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return {'items': size, 'generate': generate, 'stages': stages}
+
+
+# --- Environment and comparison --------------------------------------------
+
+def _git(*command: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *command], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """Commit, interpreter and machine the benchmark ran on."""
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        'commit': _git("rev-parse", "HEAD"),
+        'dirty': bool(status) if status is not None else None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'rapidfuzz': metrics.Levenshtein is not None,
+        'pyarrow': pyarrow.__version__ if pyarrow is not None else None,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            tolerance: float = TOLERANCE) -> Iterator[Tuple[str, str, str, float, float, bool]]:
+    """
+    Yield (size, stage, metric, baseline value, current value, regressed) for every
+    stage both runs measured; a metric regresses when it grew by more than `tolerance`x.
+    """
+    for size, run in current['sizes'].items():
+        old_stages = baseline.get('sizes', {}).get(size, {}).get('stages', {})
+        for stage, measurement in run['stages'].items():
+            old = old_stages.get(stage)
+            if old is None:
+                continue
+            for metric in ('seconds', 'peak_rss_bytes', 'write_bytes'):
+                before, after = old.get(metric), measurement.get(metric)
+                if not before or after is None:
+                    continue
+                noisy = metric == 'seconds' and max(before, after) < MIN_SECONDS
+                yield size, stage, metric, before, after, not noisy and after > before * tolerance
+
+
+def print_comparison(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> int:
+    """Print the comparison table; returns the number of regressions."""
+    print(f"Baseline {str(baseline['environment'].get('commit'))[:10]} -> "
+          f"current {str(current['environment'].get('commit'))[:10]}")
+    if baseline.get('parameters') != current.get('parameters'):
+        print(f"Note: the runs used different parameters: {baseline.get('parameters')} vs {current.get('parameters')}")
+    print(f"{'Items':>9} {'Stage':<15} {'Metric':<15} {'Baseline':>14} {'Current':>14} {'Ratio':>7}")
+    regressions = 0
+    for size, stage, metric, before, after, regressed in compare(baseline, current, tolerance):
+        regressions += regressed
+        print(f"{size:>9} {stage:<15} {metric:<15} {before:>14,.3f} {after:>14,.3f} "
+              f"{after / before:>6.2f}x{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Time the evaluator stages on synthetic corpora of growing size")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in SIZES),
+                        help="Comma-separated corpus sizes (pairs)")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    parser.add_argument("--work-dir", type=Path, default=WORK_DIR,
+                        help="Where the corpora are generated and kept between runs")
+    parser.add_argument("--output", type=Path,
+                        help=f"Result file (default: {BENCHMARK_DIR}/benchmark_<commit>_<time>.json)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpora")
+    parser.add_argument("--page-chars", type=int, default=PAGE_CHARS, help="Characters of ground truth per item")
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE, help="Share of OCR characters in error")
+    parser.add_argument("--batch-size", type=int, default=1, help="Pairs per stub judge request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent stub judge calls")
+    parser.add_argument("--prompt-mode", choices=LLM.PROMPT_MODES, default="full", help="Judge prompt mode")
+    parser.add_argument("--mock-server", action="store_true",
+                        help="Send judge requests to an in-process mock_server instead of the stub "
+                             "(adds HTTP and response parsing to the judge stage)")
+    parser.add_argument("--keep-results", action="store_true", help="Keep each size's results directory")
+    parser.add_argument("--compare", type=Path, help="Earlier benchmark file to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Ratio above which a stage counts as a regression")
+    args = parser.parse_args(argv)
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    args.stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main_benchmark(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point."""
+    # Only the benchmark's own progress; the stages' logging would clutter it
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    logger.setLevel(logging.INFO)
+    args = parse_args(argv)
+
+    server = None
+    originals = LLM.client, LLM.judgeLLm, LLM.judgeLLmBatch
+    if args.mock_server:
+        from openai import OpenAI
+        import mock_server
+        server = mock_server.start_server(seed=args.seed)
+        LLM.client = OpenAI(api_key="mock", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                            max_retries=0)
+    else:
+        LLM.judgeLLm, LLM.judgeLLmBatch = stub_judge, stub_judge_batch
+
+    report = {
+        'created': datetime.now().isoformat(timespec="seconds"),
+        'environment': environment(),
+        'parameters': {
+            'seed': args.seed, 'page_chars': args.page_chars, 'error_rate': args.error_rate,
+            'batch_size': args.batch_size, 'concurrency': args.concurrency,
+            'prompt_mode': args.prompt_mode, 'judge': "mock_server" if args.mock_server else "stub",
+        },
+        'sizes': {},
+    }
+    try:
+        for size in args.sizes:
+            report['sizes'][str(size)] = run_size(size, args)
+            gc.collect()
+    finally:
+        LLM.client, LLM.judgeLLm, LLM.judgeLLmBatch = originals
+        if server is not None:
+            server.shutdown()
+
+    commit = (report['environment']['commit'] or "nogit")[:7]
+    output = args.output or BENCHMARK_DIR / f"benchmark_{commit}_{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Benchmark written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = print_comparison(baseline, report, args.tolerance)
+        if regressions:
+            logger.info(f"{regressions} regressions above {args.tolerance}x")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark())
@@ -0,0 +1,113 @@
+"""
+Two-tier judge cascade: a cheap model grades everything, an accurate model
+re-grades only the items the cheap model is unsure about.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+import pricing
+
+# Escalate when the cheap judge's confidence is below this...
+MIN_CONFIDENCE = 70
+# ...or its character accuracy is this many points away from the local one
+MAX_DISAGREEMENT = 15
+
+
+def escalation_reason(result: Dict[str, Any], pair: Tuple[str, str, Any],
+                      min_confidence: float = MIN_CONFIDENCE,
+                      max_disagreement: float = MAX_DISAGREEMENT) -> Optional[str]:
+    """
+    Why a cheap-model result should be re-graded, or None to keep it.
+
+    Empty pairs are never escalated: their score is fixed without a judge.
+    """
+    if not pair[0] or not pair[1]:
+        return None
+    if 'refusal' in result:
+        return 'refusal'
+    if result.get('confidence_level', 100) < min_confidence:
+        return 'confidence'
+    # character_accuracy may already hold the local value (--judge hybrid), so
+    # only the judge's own value counts; results without one are not compared
+    judged = result.get('judge_character_accuracy')
+    if judged is None:
+        return None
+    local = metrics.compute_metrics(pair[0], pair[1])['character_accuracy']
+    if abs(judged - local) > max_disagreement:
+        return 'disagreement'
+    return None
+
+
+def _cost(model: str, result: Dict[str, Any]) -> Optional[float]:
+    return pricing.cost(model, result.get('prompt_tokens', 0), result.get('completion_tokens', 0))
+
+
+def _sum(values: List[Optional[float]]) -> Optional[float]:
+    return None if any(v is None for v in values) else sum(values)
+
+
+class CascadeReport:
+    """Collects both tiers' results and reports what escalation saved."""
+
+    def __init__(self, cheap_model: str, accurate_model: str):
+        self.cheap_model = cheap_model
+        self.accurate_model = accurate_model
+        self.kept: List[Dict[str, Any]] = []
+        self.escalated: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        self.reasons: Dict[str, int] = {}
+
+    def add_kept(self, cheap: Dict[str, Any]) -> None:
+        self.kept.append(cheap)
+
+    def add_escalated(self, cheap: Dict[str, Any], accurate: Dict[str, Any], reason: str) -> None:
+        self.escalated.append((cheap, accurate))
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Actual cost and judge latency against grading everything with the
+        accurate model.
+
+        Items that were not escalated are priced for the accurate model with
+        the token counts of their cheap request (same prompt), and given the
+        mean latency the accurate model showed on escalated items. Results
+        replayed from the judge cache cost nothing in either case.
+        """
+        cheap_all = self.kept + [cheap for cheap, _ in self.escalated]
+        accurate = [acc for _, acc in self.escalated]
+
+        actual_cost = _sum([_cost(self.cheap_model, r) for r in cheap_all]
+                           + [_cost(self.accurate_model, r) for r in accurate])
+        baseline_cost = _sum([_cost(self.accurate_model, r) for r in self.kept + accurate])
+
+        actual_latency = sum(r.get('latency', 0) for r in cheap_all + accurate)
+        baseline_latency = None
+        requested = [r for r in accurate if not r.get('cached')]
+        if requested:
+            mean_accurate = sum(r.get('latency', 0) for r in requested) / len(requested)
+            kept_requested = sum(1 for r in self.kept if not r.get('cached'))
+            baseline_latency = sum(r.get('latency', 0) for r in accurate) + mean_accurate * kept_requested
+
+        total = len(self.kept) + len(self.escalated)
+        summary = {
+            'cheap_model': self.cheap_model,
+            'accurate_model': self.accurate_model,
+            'items': total,
+            'escalated': len(self.escalated),
+            'escalation_rate': len(self.escalated) / total if total else 0.0,
+            'escalation_reasons': dict(self.reasons),
+            'cached': sum(1 for r in cheap_all + accurate if r.get('cached')),
+            'cost_usd': actual_cost,
+            'all_accurate_cost_usd': baseline_cost,
+            'cost_saved_usd': (baseline_cost - actual_cost
+                               if actual_cost is not None and baseline_cost is not None else None),
+            'judge_seconds': actual_latency,
+            'all_accurate_judge_seconds': baseline_latency,
+            'judge_seconds_saved': baseline_latency - actual_latency if baseline_latency is not None else None,
+        }
+        if self.escalated:
+            changes = [abs(acc['overall_score'] - cheap['overall_score']) for cheap, acc in self.escalated
+                       if 'overall_score' in acc and 'overall_score' in cheap]
+            summary['mean_score_change_on_escalation'] = sum(changes) / len(changes) if changes else None
+        return summary
@@ -0,0 +1,174 @@
+"""
+Chunked grading of long documents.
+
+Long pages make single judge calls slow and can overflow the context window.
+Such pairs are cut into chunks at ground truth paragraph boundaries, and each
+boundary is carried over to the OCR text through a word alignment, so every
+chunk compares matching parts of both texts. Chunks are graded like any other
+pair and their scores are combined, weighted by ground truth length.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from diff_prompt import align_words
+from judge_cache import USAGE
+
+# Texts (OCR + ground truth) longer than this many tokens are graded in chunks
+CHUNK_THRESHOLD = 8000
+# Target size of one chunk (OCR + ground truth), in tokens
+CHUNK_TOKENS = 2000
+CHARS_PER_TOKEN = 4
+
+SCORES = ('overall_score', 'character_accuracy', 'word_accuracy', 'confidence_level')
+# Averaged like the scores when every chunk has them (hybrid and local metrics)
+OPTIONAL_SCORES = ('judge_character_accuracy', 'cer', 'wer')
+
+_WORD = re.compile(r'\S+')
+
+
+def _chunk_starts(text: str, words: List[Tuple[int, int]], budget: int) -> List[int]:
+    """Word indices where chunks of at most ~budget characters start, preferring line starts."""
+    starts = [0]
+    line_start = 0
+    for k in range(1, len(words)):
+        if '\n' in text[words[k - 1][1]:words[k][0]]:
+            line_start = k
+        if words[k][1] - words[starts[-1]][0] > budget:
+            # Cut at the start of the current paragraph, or mid-paragraph if it is too long
+            starts.append(line_start if line_start > starts[-1] else k)
+    return starts
+
+
+def _map_word_index(opcodes: List[Tuple[str, int, int, int, int]], gt_index: int, ocr_length: int) -> int:
+    """OCR word index aligned with a ground truth word index."""
+    for tag, i1, i2, j1, j2 in opcodes:
+        if j1 <= gt_index < j2:
+            if tag == 'equal':
+                return i1 + (gt_index - j1)
+            # Replaced runs are split proportionally; insertions have no OCR words
+            return i1 + (gt_index - j1) * (i2 - i1) // (j2 - j1)
+    return ocr_length
+
+
+def split_pair(ocr_text: str, ground_truth: str, chunk_tokens: int = CHUNK_TOKENS) -> List[Tuple[str, str]]:
+    """
+    Cut a pair into aligned (ocr_chunk, ground_truth_chunk) pairs.
+
+    Ground truth chunks hold about half of chunk_tokens each, cut between
+    paragraphs where possible; the OCR text is cut at the aligned words.
+    Every character of both texts ends up in exactly one chunk.
+    """
+    gt_words = [m.span() for m in _WORD.finditer(ground_truth)]
+    ocr_words = [m.span() for m in _WORD.finditer(ocr_text)]
+    budget = chunk_tokens * CHARS_PER_TOKEN // 2
+    if not gt_words or len(ground_truth) <= budget:
+        return [(ocr_text, ground_truth)]
+
+    gt_starts = _chunk_starts(ground_truth, gt_words, budget)
+    opcodes = align_words([ocr_text[s:e] for s, e in ocr_words], [ground_truth[s:e] for s, e in gt_words])
+    ocr_starts = [_map_word_index(opcodes, start, len(ocr_words)) for start in gt_starts]
+    return list(zip(_cut(ocr_text, ocr_words, ocr_starts), _cut(ground_truth, gt_words, gt_starts)))
+
+
+def _cut(text: str, words: List[Tuple[int, int]], starts: List[int]) -> List[str]:
+    """Split text before the given word indices; the first piece starts at the beginning."""
+    positions = [0] + [words[k][0] if k < len(words) else len(text) for k in starts[1:]] + [len(text)]
+    return [text[positions[i]:positions[i + 1]].strip() for i in range(len(starts))]
+
+
+def combine_results(results: List[Dict[str, Any]], weights: List[int], index: Any) -> Dict[str, Any]:
+    """Length-weighted document result from the results of its chunks."""
+    for result in results:
+        if 'refusal' in result or result.get('error'):
+            return dict(result, index=index, chunks=len(results))
+    total = sum(weights) or 1
+    combined = {score: sum(r[score] * w for r, w in zip(results, weights)) / total
+                for score in SCORES + OPTIONAL_SCORES if all(score in r for r in results)}
+    # Usage is summed over the chunks of a document
+    for field in USAGE:
+        if any(field in r for r in results):
+            combined[field] = sum(r.get(field, 0) for r in results)
+    combined['index'] = index
+    combined['chunks'] = len(results)
+    return combined
+
+
+class ChunkPlan:
+    """
+    Replaces long pairs with their chunks and reassembles chunk results.
+
+    Chunks get fresh integer indices above every pair index, so they flow
+    through executors, batches and the judge cache like ordinary pairs.
+    """
+
+    def __init__(self, pairs: List[Tuple[str, str, int]], chunk_tokens: int = CHUNK_TOKENS,
+                 threshold: int = CHUNK_THRESHOLD):
+        """
+        Args:
+            pairs: (ocr_text, ground_truth, index) tuples
+            chunk_tokens: Target tokens per chunk
+            threshold: Pairs above this many tokens are chunked (0 = never)
+        """
+        self.pairs: List[Tuple[str, str, int]] = []
+        self.parents: Dict[int, Tuple[str, str, int]] = {}
+        self.chunk_parent: Dict[int, int] = {}
+        self.weights: Dict[int, int] = {}
+        self.chunks: Dict[int, List[int]] = {}
+        self._done: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        self._failed = set()
+        next_index = max((pair[2] for pair in pairs), default=-1) + 1
+        for pair in pairs:
+            ocr_text, ground_truth, index = pair
+            if not threshold or (len(ocr_text) + len(ground_truth)) / CHARS_PER_TOKEN <= threshold:
+                self.pairs.append(pair)
+                continue
+            parts = split_pair(ocr_text, ground_truth, chunk_tokens)
+            if len(parts) == 1:
+                self.pairs.append(pair)
+                continue
+            self.parents[index] = pair
+            self.chunks[index] = []
+            self._done[index] = {}
+            for ocr_chunk, gt_chunk in parts:
+                self.pairs.append((ocr_chunk, gt_chunk, next_index))
+                self.chunk_parent[next_index] = index
+                self.weights[next_index] = len(gt_chunk)
+                self.chunks[index].append(next_index)
+                next_index += 1
+
+    def add_result(self, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Take a result from the judge.
+
+        Returns:
+            The result itself for an unchunked pair, the combined document
+            result once its last chunk is in, otherwise None
+        """
+        parent = self.chunk_parent.get(result.get('index'))
+        if parent is None:
+            return result
+        if parent in self._failed:
+            return None
+        done = self._done[parent]
+        done[result['index']] = result
+        if len(done) < len(self.chunks[parent]):
+            return None
+        ids = self.chunks[parent]
+        return combine_results([done[i] for i in ids], [self.weights[i] for i in ids], parent)
+
+    def add_failure(self, pair: Tuple[str, str, int]) -> Optional[Tuple[str, str, int]]:
+        """
+        Take a pair that failed for good.
+
+        Returns:
+            The pair itself, the original document pair the first time one of
+            its chunks fails, otherwise None
+        """
+        parent = self.chunk_parent.get(pair[2])
+        if parent is None:
+            return pair
+        if parent in self._failed:
+            return None
+        self._failed.add(parent)
+        return self.parents[parent]
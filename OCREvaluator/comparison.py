@@ -0,0 +1,111 @@
+"""
+Cross-engine comparison of grading results.
+"""
+
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from stats import METRICS, RunningStats, SummaryAggregator
+
+# "Index 12 took 3.1416 seconds" lines written by the TestsPart1/TestsPart2 runners
+_TIMING_LINE = re.compile(r'^Index (\d+) took ([\d.]+) seconds')
+_RESULT_FILE = re.compile(r'^(\d+)(.+)\.txt$')
+
+
+def index_order(index) -> Tuple:
+    """Sort key putting numeric dataset indices first, in numeric order, then file base names."""
+    return (0, index, "") if isinstance(index, int) else (1, 0, str(index))
+
+
+def discover_engines(ocr_dir: Path) -> Dict[str, str]:
+    """
+    Find engine result folders and their file suffixes.
+
+    Every sub-folder of ocr_dir with files named like "12llamacpp.txt" is an
+    engine; the most common suffix in it is the one used.
+
+    Returns:
+        Dictionary of engine (folder name) -> file suffix
+    """
+    engines = {}
+    for entry in sorted(Path(ocr_dir).iterdir()):
+        if not entry.is_dir():
+            continue
+        suffixes: Dict[str, int] = {}
+        for file in entry.iterdir():
+            match = _RESULT_FILE.match(file.name)
+            if match:
+                suffixes[match.group(2)] = suffixes.get(match.group(2), 0) + 1
+        if suffixes:
+            engines[entry.name] = max(suffixes, key=suffixes.get)
+    return engines
+
+
+def read_timings(engine_dir: Path) -> Dict[int, float]:
+    """Per-index OCR latency in seconds from a runner's *_time.txt files."""
+    timings = {}
+    for time_file in Path(engine_dir).glob("*_time.txt"):
+        with open(time_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                match = _TIMING_LINE.match(line)
+                if match:
+                    timings[int(match.group(1))] = float(match.group(2))
+    return timings
+
+
+def build_comparison(results: Iterable[Dict[str, Any]], timings: Optional[Dict[str, Dict[int, float]]] = None
+                     ) -> Dict[str, Any]:
+    """
+    Compare engines on the dataset indices they were graded on.
+
+    Args:
+        results: Grading results tagged with 'source' (the engine)
+        timings: Engine -> index -> OCR latency in seconds
+
+    Returns:
+        Dictionary with per-engine score/latency statistics, win counts and
+        a per-item matrix of scores with the winning engine
+    """
+    timings = timings or {}
+    aggregator = SummaryAggregator()
+    items: Dict[Any, Dict[str, float]] = {}
+    for result in results:
+        aggregator.add(result)
+        if result.get('error') or 'refusal' in result or result.get('overall_score') is None:
+            continue
+        items.setdefault(result['index'], {})[result.get('source')] = result['overall_score']
+
+    engines = sorted(set(aggregator.engines) | set(timings))
+    wins = {engine: 0 for engine in engines}
+    matrix = []
+    for index in sorted(items, key=index_order):
+        scores = items[index]
+        best = max(scores.values())
+        winners = sorted(engine for engine, score in scores.items() if score == best)
+        # A tie is nobody's win
+        if len(winners) == 1:
+            wins[winners[0]] += 1
+        row = {'index': index, 'winner': winners[0] if len(winners) == 1 else 'tie'}
+        for engine in engines:
+            row[engine] = scores.get(engine)
+            row[f'{engine}_latency'] = timings.get(engine, {}).get(index)
+        matrix.append(row)
+
+    per_engine = {}
+    for engine in engines:
+        stats = aggregator.engines.get(engine, {})
+        latency = RunningStats()
+        for seconds in timings.get(engine, {}).values():
+            latency.add(seconds)
+        per_engine[engine] = {f'{metric}_stats': stats[metric].summary() for metric in METRICS if metric in stats}
+        per_engine[engine]['latency_stats'] = latency.summary()
+        per_engine[engine]['wins'] = wins[engine]
+
+    return {
+        'engines': engines,
+        'items_compared': len(matrix),
+        'per_engine': per_engine,
+        'items': matrix,
+    }
+
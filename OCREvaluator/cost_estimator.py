@@ -0,0 +1,192 @@
+"""
+Token-based cost and run time estimates for grading a set of file pairs.
+
+Every file is read once, one at a time, and normalized as the evaluator
+normalizes it before grading, to count its characters. A seeded sample of
+pairs is tokenized exactly (with tiktoken when it is installed,
+otherwise ~4 characters per token) to get the tokens per character of the
+corpus, and the judge prompt template is tokenized on its own. Prices and
+request speeds come from pricing.py; run time also respects the concurrency
+and rate limits, and can be calibrated on the latencies of an earlier run.
+"""
+
+import json
+import logging
+import math
+import random
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import LLM
+import normalization
+import pricing
+from file_processor import FileProcessor
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Pairs tokenized exactly; the tokens per character of the rest are extrapolated
+SAMPLE_PAIRS = 2000
+# Share of items a cascade is assumed to re-grade with its accurate model
+ESCALATION_RATE = 0.2
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: str) -> Callable[[str], int]:
+    """Token counter for a model: tiktoken's encoding if known, else a character heuristic."""
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+            return lambda text: len(encoding.encode_ordinary(text))
+        except KeyError:
+            pass
+    return lambda text: math.ceil(len(text) / LLM.CHARS_PER_TOKEN)
+
+
+def _read_text(path: Path) -> str:
+    """A file's text as the judge gets it."""
+    with open(path, 'rb') as f:
+        return normalization.normalize(FileProcessor.decode(f.read()))
+
+
+class Corpus:
+    """Character counts of all pairs plus an exactly tokenized sample."""
+
+    def __init__(self, pairs: List[Tuple[str, Path, Path]], sample: int = SAMPLE_PAIRS, seed: int = 0):
+        """
+        Args:
+            pairs: (name, OCR file, ground truth file) tuples from FileProcessor.find_file_pairs
+            sample: Number of pairs kept for exact tokenization
+            seed: Sampling seed
+        """
+        self.pairs = len(pairs)
+        self.chars = 0
+        sampled = set(random.Random(seed).sample(range(len(pairs)), min(sample, len(pairs))))
+        self.sample_texts: List[str] = []
+        for i, (_, ocr_file, gt_file) in enumerate(pairs):
+            ocr_text, ground_truth = _read_text(ocr_file), _read_text(gt_file)
+            self.chars += len(ocr_text) + len(ground_truth)
+            if i in sampled:
+                self.sample_texts.append(ocr_text + "\n" + ground_truth)
+        self._ratios: Dict[Callable[[str], int], float] = {}
+
+    def text_tokens(self, tokenizer: Callable[[str], int]) -> float:
+        """Estimated tokens of all OCR and ground truth texts."""
+        if tokenizer not in self._ratios:
+            chars = sum(len(text) for text in self.sample_texts)
+            tokens = sum(tokenizer(text) for text in self.sample_texts)
+            self._ratios[tokenizer] = tokens / chars if chars else 1 / LLM.CHARS_PER_TOKEN
+        return self.chars * self._ratios[tokenizer]
+
+
+def measured_speed_factor(results_log: Path, model: str) -> Optional[float]:
+    """
+    Measured over predicted latency of a model's requests in an earlier run's
+    grading_results.jsonl, or None without usable records.
+
+    Batched and chunked results carry their share of a request's latency and
+    tokens, so each is compared with the same share of the request predicted
+    for the whole batch, or with the predicted requests of its chunks.
+    """
+    family = pricing.model_family(model)
+    measured = predicted = 0.0
+    try:
+        with open(results_log, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                graded_by = result.get('graded_by') or result.get('model') or ""
+                # Cache hits made no request, so they say nothing about its speed
+                if 'latency' not in result or result.get('cached') or pricing.model_family(graded_by) != family:
+                    continue
+                batch_items = result.get('batch_items') or 1
+                chunks = result.get('chunks') or 1
+                request_tokens = [result.get(field, 0) * batch_items / chunks
+                                  for field in ('prompt_tokens', 'completion_tokens')]
+                measured += result['latency']
+                predicted += pricing.request_seconds(model, *request_tokens) * chunks / batch_items
+    except OSError:
+        return None
+    return measured / predicted if predicted else None
+
+
+def estimate_model(model: str, corpus: Corpus, batch_size: int = 1, share: float = 1.0,
+                   concurrency: int = 8, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                   speed_factor: float = 1.0) -> Dict[str, Any]:
+    """
+    Tokens, cost and wall time of grading `share` of the corpus with one model.
+
+    Wall time is the slowest of: total request time spread over the
+    concurrent workers, the requests-per-minute limit and the tokens-per-minute
+    limit.
+    """
+    count = get_tokenizer(model)
+    items = corpus.pairs * share
+    text_tokens = corpus.text_tokens(count) * share
+    if batch_size > 1:
+        requests = math.ceil(items / batch_size)
+        template = count(LLM.build_batch_prompt([]))
+        per_item = count(LLM.build_batch_prompt([("", "", 0)])) - template
+        prompt_tokens = requests * template + items * per_item + text_tokens
+    else:
+        requests = math.ceil(items)
+        prompt_tokens = items * count(LLM.build_prompt("", "")) + text_tokens
+    completion_tokens = items * LLM.RESPONSE_TOKENS
+
+    seconds = 0.0
+    if requests:
+        request_seconds = pricing.request_seconds(model, prompt_tokens / requests, completion_tokens / requests)
+        seconds = requests * request_seconds * speed_factor / concurrency
+        if rpm:
+            seconds = max(seconds, requests / rpm * 60)
+        if tpm:
+            seconds = max(seconds, (prompt_tokens + completion_tokens) / tpm * 60)
+    return {
+        'model': model,
+        'items': items,
+        'requests': requests,
+        'prompt_tokens': round(prompt_tokens),
+        'completion_tokens': round(completion_tokens),
+        'cost_usd': pricing.cost(model, prompt_tokens, completion_tokens),
+        'seconds': seconds,
+    }
+
+
+def estimate_preset(config: Dict[str, Any], corpus: Corpus, concurrency: int = 8,
+                    rpm: Optional[float] = None, tpm: Optional[float] = None,
+                    results_log: Optional[Path] = None,
+                    escalation_rate: float = ESCALATION_RATE) -> Dict[str, Any]:
+    """
+    Cost and wall time of a batch_process preset.
+
+    A cascade preset adds its accurate model on `escalation_rate` of the
+    items, run after the first pass.
+    """
+    passes = [(config['model'], 1.0)]
+    if config.get('cascade_model'):
+        passes.append((config['cascade_model'], escalation_rate))
+    estimates = []
+    for model, share in passes:
+        factor = measured_speed_factor(results_log, model) if results_log else None
+        estimates.append(estimate_model(model, corpus, config.get('batch_size', 1), share,
+                                        concurrency, rpm, tpm, factor or 1.0))
+    costs = [e['cost_usd'] for e in estimates]
+    return {
+        'passes': estimates,
+        'prompt_tokens': sum(e['prompt_tokens'] for e in estimates),
+        'completion_tokens': sum(e['completion_tokens'] for e in estimates),
+        'cost_usd': None if None in costs else sum(costs),
+        'seconds': sum(e['seconds'] for e in estimates),
+    }
+
+
+def scan_corpus(ocr_dir: Path, ground_truth_dir: Path, suffix: str = "", sample: int = SAMPLE_PAIRS) -> Corpus:
+    """Pair the files of two directories and measure them."""
+    pairs = FileProcessor(ocr_dir, ground_truth_dir, suffix).find_file_pairs()
+    logging.getLogger(__name__).info(f"Measuring {len(pairs)} file pairs")
+    return Corpus(pairs, sample)
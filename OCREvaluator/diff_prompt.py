@@ -0,0 +1,109 @@
+"""
+Compact judge input: only the regions where OCR output and ground truth differ.
+
+Good OCR output matches its ground truth almost everywhere, so sending both
+texts in full mostly pays for identical words. The texts are aligned word by
+word and only the differing regions are kept, each with a few words of
+context, together with match statistics from the local metrics.
+"""
+
+import difflib
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+import metrics
+
+try:
+    from rapidfuzz.distance import Levenshtein
+except ImportError:
+    Levenshtein = None
+
+# Unchanged words shown on each side of a differing region
+CONTEXT_WORDS = 5
+
+
+def align_words(ocr_words: Sequence[str], gt_words: Sequence[str]) -> List[Tuple[str, int, int, int, int]]:
+    """
+    Word alignment as (tag, ocr_start, ocr_end, gt_start, gt_end) opcodes.
+
+    Tags are 'equal', 'replace', 'delete' (only in the OCR output) and
+    'insert' (missing from the OCR output), as in difflib.
+    """
+    if Levenshtein is not None:
+        return [tuple(op) for op in Levenshtein.opcodes(ocr_words, gt_words)]
+    return difflib.SequenceMatcher(None, ocr_words, gt_words, autojunk=False).get_opcodes()
+
+
+def _quote(words: Sequence[str]) -> str:
+    return '"' + " ".join(words).replace('"', '\\"') + '"'
+
+
+def diff_hunks(ocr_text: str, ground_truth: str, context: int = CONTEXT_WORDS) -> List[str]:
+    """
+    Render the differing regions of two texts.
+
+    Each hunk starts with the ground truth word position and shows the
+    changes inline as [OCR: "..." | TRUTH: "..."] between context words.
+    Nearby changes whose context would overlap share one hunk.
+    """
+    ocr_words = ocr_text.split()
+    gt_words = ground_truth.split()
+    opcodes = align_words(ocr_words, gt_words)
+
+    # Group changes separated by fewer than 2 * context equal words
+    groups, current = [], []
+    for op in opcodes:
+        if op[0] == 'equal':
+            if current and op[2] - op[1] > 2 * context:
+                groups.append(current)
+                current = []
+            elif current:
+                current.append(op)
+        else:
+            current.append(op)
+    if current:
+        groups.append(current)
+
+    hunks = []
+    for group in groups:
+        first, last = group[0], group[-1]
+        parts = [f"@@ ground truth word {first[3] + 1} @@"]
+        before = ocr_words[max(0, first[1] - context):first[1]]
+        if before:
+            parts.append(" ".join(before))
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                parts.append(" ".join(ocr_words[i1:i2]))
+            else:
+                parts.append(f"[OCR: {_quote(ocr_words[i1:i2])} | TRUTH: {_quote(gt_words[j1:j2])}]")
+        after = ocr_words[last[2]:last[2] + context]
+        if after:
+            parts.append(" ".join(after))
+        hunks.append(parts[0] + "\n" + " ".join(parts[1:]))
+    return hunks
+
+
+def match_statistics(ocr_text: str, ground_truth: str) -> str:
+    """Aggregate comparison figures, one per line."""
+    local = metrics.compute_metrics(ocr_text, ground_truth)
+    return "\n".join([
+        f"Ground truth: {len(ground_truth.split())} words, {len(ground_truth)} characters",
+        f"OCR output: {len(ocr_text.split())} words, {len(ocr_text)} characters",
+        f"Character error rate (edit distance): {local['cer']:.4f}",
+        f"Word error rate (edit distance): {local['wer']:.4f}",
+    ])
+
+
+@lru_cache(maxsize=1024)
+def compact_pair(ocr_text: str, ground_truth: str, context: int = CONTEXT_WORDS) -> Tuple[str, str]:
+    """
+    Match statistics and differing regions of a pair.
+
+    Cached, as the same pair is compacted for token estimates and for the
+    request itself.
+
+    Returns:
+        (statistics, hunks joined by blank lines; "" if the texts are identical)
+    """
+    hunks = diff_hunks(ocr_text, ground_truth, context)
+    return match_statistics(ocr_text, ground_truth), "\n\n".join(hunks)
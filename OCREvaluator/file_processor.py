@@ -3,20 +3,66 @@ File processing module for handling OCR and ground truth file pairs.
 """
 
 import logging
+import mmap
+import os
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 import re
 
+# Default suffix of the OCR result files, e.g. 0llamacpp.txt
+FILE_SUFFIX = "llamacpp"
+# Files at least this large are read through mmap instead of a buffered read
+MMAP_THRESHOLD = 8 * 1024 * 1024
+
+
+class FileRecord:
+    """Content of one text file, read once, with its statistics."""
+    
+    __slots__ = ('path', 'name', 'content', 'size_bytes', 'char_count', 'line_count', 'word_count')
+    
+    def __init__(self, path: Union[Path, str], content: str, size_bytes: int):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.content = content
+        self.size_bytes = size_bytes
+        self.char_count = len(content)
+        self.line_count = len(content.splitlines())
+        self.word_count = len(content.split())
+    
+    @property
+    def is_empty(self) -> bool:
+        return self.word_count == 0
+    
+    def info(self) -> dict:
+        """Metadata in the format of FileProcessor.get_file_info."""
+        return {
+            'name': self.name,
+            'size_bytes': self.size_bytes,
+            'char_count': self.char_count,
+            'line_count': self.line_count,
+            'word_count': self.word_count
+        }
+
 
 class FileProcessor:
     """Handles finding and pairing OCR files with their ground truth counterparts."""
     
-    def __init__(self, ocr_dir: Path, ground_truth_dir: Path):
+    def __init__(self, ocr_dir: Path, ground_truth_dir: Optional[Path] = None, suffix: str = ""):
+        """
+        Args:
+            ocr_dir: Directory with OCR result files
+            ground_truth_dir: Directory with ground truth files of the same base names
+            suffix: Engine suffix of the OCR file names, e.g. "llamacpp" for 0llamacpp.txt
+        """
         self.ocr_dir = Path(ocr_dir)
-        self.ground_truth_dir = Path(ground_truth_dir)
+        self.ground_truth_dir = Path(ground_truth_dir) if ground_truth_dir else None
+        self.suffix = suffix
         self.logger = logging.getLogger(__name__)
+        # Statistics of the files already read, so stats never read a file again.
+        # Contents are not kept: the caller holds the records it still needs.
+        self._info: Dict[str, dict] = {}
     
-    def _get_base_name(self, file_path: Path) -> str:
+    def _get_base_name(self, file_path: Union[Path, str]) -> str:
         """
         Extract base name for matching files.
         
@@ -24,8 +70,11 @@ class FileProcessor:
         Examples:
         - "document_001_ocr.txt" -> "document_001"
         - "page_001.txt" -> "page_001"
+        
+        A plain string is taken as a file name, which saves building Path
+        objects when scanning large directories.
         """
-        name = file_path.stem
+        name = file_path.stem if isinstance(file_path, Path) else os.path.splitext(file_path)[0]
         
         # Remove common OCR suffixes
         suffixes_to_remove = ['_ocr', '_OCR', '_extracted', '_text']
@@ -36,30 +85,121 @@ class FileProcessor:
         
         return name
     
-    def read_file_content(self, file_path: Path) -> str:
+    def scan_directory(self, directory: Path, suffix: str = "") -> Dict[str, Tuple[str, int]]:
         """
-        Read and return the content of a text file.
+        Index the .txt files of a directory in a single scan.
         
         Args:
-            file_path: Path to the text file
+            directory: Directory to scan
+            suffix: Removed from the end of base names, so "0llamacpp.txt" is found as "0"
             
         Returns:
-            File content as string
+            Dictionary of base name -> (path, size in bytes)
         """
+        index = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.txt') or not entry.is_file():
+                    continue
+                name = self._get_base_name(entry.name)
+                if suffix and name.endswith(suffix) and name != suffix:
+                    name = name[:-len(suffix)]
+                if name in index:
+                    self.logger.warning(f"Duplicate base name {name}: {entry.name} ignored")
+                    continue
+                index[name] = (entry.path, entry.stat().st_size)
+        return index
+    
+    def _pair_index(self) -> List[Tuple[str, Tuple[str, int], Tuple[str, int]]]:
+        """Match the scanned OCR and ground truth files by base name, in natural name order."""
+        ocr_index = self.scan_directory(self.ocr_dir, self.suffix)
+        gt_index = self.scan_directory(self.ground_truth_dir)
+        
+        names = ocr_index.keys() & gt_index.keys()
+        unmatched = len(ocr_index) - len(names)
+        if unmatched:
+            self.logger.warning(f"{unmatched} OCR files have no ground truth counterpart")
+        
+        # Numeric names sort as numbers: 2 before 10
+        ordered = sorted(names, key=lambda n: (0, int(n), n) if n.isdigit() else (1, 0, n))
+        return [(name, ocr_index[name], gt_index[name]) for name in ordered]
+    
+    def find_file_pairs(self) -> List[Tuple[str, Path, Path]]:
+        """
+        Pair OCR files with ground truth files by base name.
+        
+        Returns:
+            (base name, OCR file, ground truth file) tuples in natural name order
+        """
+        return [(name, Path(ocr[0]), Path(gt[0])) for name, ocr, gt in self._pair_index()]
+    
+    def load_pairs(self) -> List[Tuple[str, FileRecord, FileRecord]]:
+        """
+        Read and validate every file pair, each file exactly once.
+        
+        Returns:
+            (base name, OCR record, ground truth record) for the valid pairs
+        """
+        pairs = []
+        for name, ocr, gt in self._pair_index():
+            ocr_record = self.load_record(*ocr)
+            gt_record = self.load_record(*gt)
+            if self.validate_records(ocr_record, gt_record):
+                pairs.append((name, ocr_record, gt_record))
+        self.logger.info(f"Loaded {len(pairs)} valid file pairs")
+        return pairs
+    
+    @staticmethod
+    def decode(data) -> str:
+        """Decode UTF-8, falling back to latin-1; accepts bytes or a memory map."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return str(data, 'utf-8')
         except UnicodeDecodeError:
             # Try with different encoding
-            try:
-                with open(file_path, 'r', encoding='latin-1') as f:
-                    return f.read()
-            except Exception as e:
-                self.logger.error(f"Failed to read {file_path}: {e}")
-                return ""
+            return str(data, 'latin-1')
+    
+    def _read_text(self, file_path: Union[Path, str], size: int) -> str:
+        """Read a whole file, decoding large ones straight from a memory map without a bytes copy."""
+        with open(file_path, 'rb') as f:
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return self.decode(mapped)
+            return self.decode(f.read())
+    
+    def load_record(self, file_path: Union[Path, str], size: Optional[int] = None) -> FileRecord:
+        """
+        Read a text file into a record with its statistics.
+        
+        Args:
+            file_path: Path to the text file
+            size: File size if already known from a directory scan
+            
+        Returns:
+            FileRecord; empty content if the file could not be read
+        """
+        key = os.fspath(file_path)
+        try:
+            if size is None:
+                size = os.stat(key).st_size
+            content = self._read_text(file_path, size)
         except Exception as e:
             self.logger.error(f"Failed to read {file_path}: {e}")
-            return ""
+            content, size = "", size or 0
+        record = FileRecord(file_path, content, size)
+        self._info[key] = record.info()
+        return record
+    
+    def read_file_content(self, file_path: Path) -> str:
+        """
+        Read and return the content of a text file.
+        
+        Args:
+            file_path: Path to the text file
+            
+        Returns:
+            File content as string
+        """
+        return self.load_record(file_path).content
     
     def get_file_info(self, file_path: Path) -> dict:
         """
@@ -72,16 +212,8 @@ class FileProcessor:
             Dictionary with file information
         """
         try:
-            stat = file_path.stat()
-            content = self.read_file_content(file_path)
-            
-            return {
-                'name': file_path.name,
-                'size_bytes': stat.st_size,
-                'char_count': len(content),
-                'line_count': len(content.splitlines()),
-                'word_count': len(content.split()) if content else 0
-            }
+            info = self._info.get(os.fspath(file_path))
+            return dict(info) if info is not None else self.load_record(file_path).info()
         except Exception as e:
             self.logger.error(f"Failed to get info for {file_path}: {e}")
             return {'name': file_path.name, 'error': str(e)}
@@ -99,19 +231,20 @@ class FileProcessor:
         """
         try:
             # Check that both files exist and are readable
-            ocr_content = self.read_file_content(ocr_file)
-            gt_content = self.read_file_content(gt_file)
-            
-            if not ocr_content.strip():
-                self.logger.warning(f"OCR file is empty: {ocr_file.name}")
-                return False
-            
-            if not gt_content.strip():
-                self.logger.warning(f"Ground truth file is empty: {gt_file.name}")
-                return False
-            
-            return True
+            return self.validate_records(self.load_record(ocr_file), self.load_record(gt_file))
             
         except Exception as e:
             self.logger.error(f"Error validating file pair {ocr_file.name}, {gt_file.name}: {e}")
             return False
+    
+    def validate_records(self, ocr_record: FileRecord, gt_record: FileRecord) -> bool:
+        """Check already-read file contents of a pair; True if both have text."""
+        if ocr_record.is_empty:
+            self.logger.warning(f"OCR file is empty: {ocr_record.name}")
+            return False
+        
+        if gt_record.is_empty:
+            self.logger.warning(f"Ground truth file is empty: {gt_record.name}")
+            return False
+        
+        return True
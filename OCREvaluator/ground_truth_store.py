@@ -0,0 +1,178 @@
+"""
+Compact, memory-mapped store of ground truth texts.
+
+The benchmark dataset ships images alongside the markdown ground truth, so
+loading it takes tens of seconds and a lot of memory. The ground truth is
+exported once into a single file:
+
+    magic | count | metadata length | offsets position | metadata (JSON) | UTF-8 blob | offsets
+
+where offsets holds count + 1 little-endian uint64 positions into the blob.
+Opening the file maps it into memory; text i is decoded on access from
+blob[offsets[i]:offsets[i + 1]], so startup is constant time and memory stays
+flat however large the dataset is.
+
+Usage:
+    python ground_truth_store.py export [--dataset CodeArte/ocr-benchmark] [--output cache/ground_truth.gts]
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+MAGIC = b"OCRGT\x00\x00\x01"
+_HEADER = struct.Struct("<8sQQQ")
+DEFAULT_DATASET = "CodeArte/ocr-benchmark"
+DEFAULT_COLUMN = "true_markdown_output"
+# Per-item metadata (document type, language, ...) of the benchmark dataset
+METADATA_COLUMN = "metadata"
+
+
+def write_store(path: Path, texts: Iterable[str], metadata: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Write texts to a store file, streaming; the file is replaced atomically.
+
+    Args:
+        path: Store file to create
+        texts: Texts in index order (None is stored as "")
+        metadata: JSON-serializable description, e.g. the dataset fingerprint
+
+    Returns:
+        Number of texts written
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    meta = json.dumps(metadata or {}, ensure_ascii=False).encode('utf-8')
+    offsets = array('Q', [0])
+    tmp_file = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_file, 'wb') as f:
+        # Placeholder header, filled in once the blob size is known
+        f.write(_HEADER.pack(MAGIC, 0, 0, 0))
+        f.write(meta)
+        position = 0
+        for text in texts:
+            data = (text or "").encode('utf-8')
+            f.write(data)
+            position += len(data)
+            offsets.append(position)
+        offsets_position = f.tell()
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        offsets.tofile(f)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, len(offsets) - 1, len(meta), offsets_position))
+    tmp_file.replace(path)
+    return len(offsets) - 1
+
+
+class GroundTruthStore:
+    """Read-only, memory-mapped sequence of texts with O(1) access by index."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self._map) < _HEADER.size:
+                raise ValueError(f"Not a ground truth store: {self.path}")
+            magic, self._count, meta_length, offsets_position = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Not a ground truth store: {self.path}")
+            if offsets_position + 8 * (self._count + 1) > len(self._map):
+                raise ValueError(f"Truncated ground truth store: {self.path}")
+            meta_start = _HEADER.size
+            self.metadata = json.loads(self._map[meta_start:meta_start + meta_length].decode('utf-8'))
+            self._blob_start = meta_start + meta_length
+            offsets = memoryview(self._map)[offsets_position:offsets_position + 8 * (self._count + 1)]
+            if sys.byteorder == 'little':
+                self._offsets = offsets.cast('Q')
+            else:
+                # Big-endian hosts get a swapped copy instead of a view
+                self._offsets = array('Q', offsets.tobytes())
+                self._offsets.byteswap()
+                offsets.release()
+        except Exception:
+            self._file.close()
+            raise
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(f"Ground truth index out of range: {index}")
+        start = self._blob_start + self._offsets[index]
+        end = self._blob_start + self._offsets[index + 1]
+        return self._map[start:end].decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self._count):
+            yield self[index]
+
+    def close(self) -> None:
+        """Unmap the file."""
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "GroundTruthStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def export_dataset(output: Path, dataset_name: str = DEFAULT_DATASET, split: str = "test",
+                   column: str = DEFAULT_COLUMN) -> GroundTruthStore:
+    """
+    Export one text column of a Hugging Face dataset split to a store file.
+
+    Only the text column is read; the store metadata records the dataset
+    fingerprint so derived caches know when the dataset changed. Values that
+    are not strings (e.g. a metadata column of dicts) are stored as JSON.
+    """
+    from datasets import load_dataset
+
+    logger = logging.getLogger(__name__)
+    data = load_dataset(dataset_name)[split]
+    metadata = {
+        'dataset': dataset_name,
+        'split': split,
+        'column': column,
+        'fingerprint': data._fingerprint,
+    }
+    values = (value if isinstance(value, str) else json.dumps(value) for value in data[column])
+    count = write_store(output, values, metadata)
+    logger.info(f"Exported {count} ground truth texts to {output}")
+    return GroundTruthStore(output)
+
+
+def main(argv: Optional[list] = None) -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Ground truth store utilities")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Export dataset ground truth to a store file")
+    export.add_argument("--dataset", default=DEFAULT_DATASET, help="Hugging Face dataset name")
+    export.add_argument("--split", default="test", help="Dataset split")
+    export.add_argument("--column", default=DEFAULT_COLUMN, help="Ground truth column")
+    export.add_argument("--output", type=Path, default=Path("./cache/ground_truth.gts"), help="Store file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "export":
+        with export_dataset(args.output, args.dataset, args.split, args.column) as store:
+            print(f"{len(store)} texts, {args.output.stat().st_size} bytes: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
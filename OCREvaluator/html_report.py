@@ -0,0 +1,464 @@
+"""
+Per-item HTML report, built by streaming the result log.
+
+The report is a small static site in results/report/:
+
+    items.html          paginated, sortable table of every graded item
+    item.html#<row>     one item: its scores and a word diff of OCR vs ground truth
+    data/meta.js        row count, chunk sizes, engines
+    data/rows_NNNNN.js  table rows, ROWS_PER_CHUNK per file
+    data/text_NNNNN.js  OCR text, ground truth and other fields, TEXTS_PER_CHUNK per file
+
+Data chunks are JSON wrapped in a function call, so pages opened straight from
+disk (file://) can load them with script tags where fetch() is blocked. Pages
+load only the chunks they show; sorting or filtering the table loads the rows,
+never the texts. Building keeps one chunk in memory; the records are streamed
+by ResultsManager.iter_latest.
+"""
+
+import json
+import logging
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+ROWS_PER_CHUNK = 2000
+TEXTS_PER_CHUNK = 100
+
+# Table columns, taken from the result fields of the same name
+COLUMNS = ['index', 'source', 'model', 'overall_score', 'character_accuracy', 'word_accuracy',
+           'confidence_level', 'latency', 'error']
+
+TextLookup = Callable[[str, Any], Optional[Tuple[str, str]]]
+
+
+def _write_chunk(path: Path, callback: str, chunk: int, data: List[Any]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        # json.dumps uses the C encoder, json.dump does not
+        f.write(f"OCRReport.{callback}({chunk},{json.dumps(data, ensure_ascii=False, separators=(',', ':'))});\n")
+
+
+def _row(result: Dict[str, Any]) -> List[Any]:
+    error = result.get('refusal') or result.get('error')
+    return [result.get(column) for column in COLUMNS[:-1]] + [str(error) if error else None]
+
+
+def write_item_report(records: Iterable[Dict[str, Any]], report_dir: Path, texts: Optional[TextLookup] = None,
+                      title: str = "OCR Grading Report") -> int:
+    """
+    Write the per-item report.
+
+    Args:
+        records: One result per item, in display order
+        report_dir: Directory of the report; its data/ is replaced
+        texts: Returns (ocr_text, ground_truth) for a (source, index), or None
+        title: Page title
+
+    Returns:
+        Number of items in the report
+    """
+    data_dir = report_dir / "data"
+    if data_dir.exists():
+        shutil.rmtree(data_dir)
+    data_dir.mkdir(parents=True)
+
+    rows, items, engines = [], [], set()
+    count = 0
+    for row_id, result in enumerate(records):
+        count = row_id + 1
+        engines.add(str(result.get('source', '')))
+        rows.append(_row(result))
+        pair = texts(result.get('source'), result.get('index')) if texts else None
+        extra = {k: v for k, v in result.items() if k not in COLUMNS and k != 'refusal'}
+        items.append([pair[0], pair[1], extra] if pair else [None, None, extra])
+        if len(rows) == ROWS_PER_CHUNK:
+            _write_chunk(data_dir / f"rows_{row_id // ROWS_PER_CHUNK:05d}.js", "rows",
+                         row_id // ROWS_PER_CHUNK, rows)
+            rows = []
+        if len(items) == TEXTS_PER_CHUNK:
+            _write_chunk(data_dir / f"text_{row_id // TEXTS_PER_CHUNK:05d}.js", "texts",
+                         row_id // TEXTS_PER_CHUNK, items)
+            items = []
+    if rows:
+        _write_chunk(data_dir / f"rows_{(count - 1) // ROWS_PER_CHUNK:05d}.js", "rows",
+                     (count - 1) // ROWS_PER_CHUNK, rows)
+    if items:
+        _write_chunk(data_dir / f"text_{(count - 1) // TEXTS_PER_CHUNK:05d}.js", "texts",
+                     (count - 1) // TEXTS_PER_CHUNK, items)
+
+    meta = {'title': title, 'count': count, 'rows_per_chunk': ROWS_PER_CHUNK,
+            'texts_per_chunk': TEXTS_PER_CHUNK, 'columns': COLUMNS, 'engines': sorted(engines)}
+    with open(data_dir / "meta.js", 'w', encoding='utf-8') as f:
+        f.write(f"OCRReport.meta({json.dumps(meta)});\n")
+    (report_dir / "report.js").write_text(REPORT_JS, encoding='utf-8')
+    (report_dir / "report.css").write_text(REPORT_CSS, encoding='utf-8')
+    (report_dir / "items.html").write_text(ITEMS_PAGE, encoding='utf-8')
+    (report_dir / "item.html").write_text(ITEM_PAGE, encoding='utf-8')
+
+    logging.getLogger(__name__).info(f"Item report with {count} items written to {report_dir}")
+    return count
+
+
+REPORT_CSS = """
+body { font-family: Arial, sans-serif; margin: 40px; }
+.header { color: #333; border-bottom: 2px solid #ccc; padding-bottom: 10px; }
+table { width: 100%; border-collapse: collapse; margin: 20px 0; }
+th, td { border: 1px solid #ddd; padding: 6px 8px; text-align: left; }
+th { background-color: #f2f2f2; cursor: pointer; user-select: none; }
+th.asc::after { content: " \\25B2"; }
+th.desc::after { content: " \\25BC"; }
+.error { color: red; }
+.controls { margin: 10px 0; display: flex; gap: 12px; align-items: center; }
+.texts { display: flex; gap: 20px; }
+.texts > div { flex: 1; min-width: 0; }
+pre { white-space: pre-wrap; word-wrap: break-word; background-color: #f9f9f9; padding: 12px; border-radius: 5px; }
+del { background-color: #fdd; color: #900; }
+ins { background-color: #dfd; color: #060; text-decoration: none; }
+"""
+
+REPORT_JS = r"""
+// Loads the report's data chunks with script tags, which also works from file://
+var OCRReport = (function () {
+  var loaded = {}, store = {meta: null, rows: {}, texts: {}};
+
+  function load(src) {
+    if (!loaded[src]) {
+      loaded[src] = new Promise(function (resolve, reject) {
+        var s = document.createElement('script');
+        s.src = src;
+        s.charset = 'utf-8';
+        s.onload = resolve;
+        s.onerror = function () { reject(new Error('Cannot load ' + src)); };
+        document.head.appendChild(s);
+      });
+    }
+    return loaded[src];
+  }
+
+  function pad(n) { return ('0000' + n).slice(-5); }
+
+  var api = {
+    meta: function (m) { store.meta = m; },
+    rows: function (chunk, data) { store.rows[chunk] = data; },
+    texts: function (chunk, data) { store.texts[chunk] = data; },
+
+    loadMeta: function () {
+      return load('data/meta.js').then(function () { return store.meta; });
+    },
+    // Row of the report by id
+    loadRow: function (id) {
+      var chunk = Math.floor(id / store.meta.rows_per_chunk);
+      return load('data/rows_' + pad(chunk) + '.js').then(function () {
+        return store.rows[chunk][id % store.meta.rows_per_chunk];
+      });
+    },
+    // Rows first..last-1, loading only the chunks they are in
+    loadRows: function (first, last) {
+      var ids = [];
+      for (var id = first; id < last; id++) ids.push(id);
+      return Promise.all(ids.map(api.loadRow));
+    },
+    // Every row, for sorting and filtering
+    loadAllRows: function (progress) {
+      var chunks = Math.ceil(store.meta.count / store.meta.rows_per_chunk), done = 0, all = [];
+      for (var c = 0; c < chunks; c++) {
+        all.push(load('data/rows_' + pad(c) + '.js').then(function () {
+          if (progress) progress(++done, chunks);
+        }));
+      }
+      return Promise.all(all).then(function () {
+        var rows = [];
+        for (var c = 0; c < chunks; c++) rows = rows.concat(store.rows[c]);
+        return rows;
+      });
+    },
+    loadText: function (id) {
+      var chunk = Math.floor(id / store.meta.texts_per_chunk);
+      return load('data/text_' + pad(chunk) + '.js').then(function () {
+        return store.texts[chunk][id % store.meta.texts_per_chunk];
+      });
+    },
+
+    format: function (value) {
+      if (value === null || value === undefined) return '';
+      if (typeof value === 'number' && !Number.isInteger(value)) return value.toFixed(2);
+      return String(value);
+    },
+
+    // Word diff of two texts (Myers' algorithm). Returns [op, text] runs with
+    // op '=' (both), '-' (only in a) or '+' (only in b), or null when the
+    // texts differ in more than maxEdits tokens.
+    diff: function (a, b, maxEdits) {
+      a = a.match(/\S+|\s+/g) || [];
+      b = b.match(/\S+|\s+/g) || [];
+      var start = 0;
+      while (start < a.length && start < b.length && a[start] === b[start]) start++;
+      var endA = a.length, endB = b.length;
+      while (endA > start && endB > start && a[endA - 1] === b[endB - 1]) { endA--; endB--; }
+      var ops = myers(a.slice(start, endA), b.slice(start, endB), maxEdits || 2000);
+      if (ops === null) return null;
+      ops = a.slice(0, start).map(function (t) { return ['=', t]; })
+        .concat(ops, a.slice(endA).map(function (t) { return ['=', t]; }));
+      var runs = [];
+      ops.forEach(function (op) {
+        var last = runs[runs.length - 1];
+        if (last && last[0] === op[0]) last[1] += op[1]; else runs.push([op[0], op[1]]);
+      });
+      return runs;
+    }
+  };
+
+  function myers(a, b, maxEdits) {
+    var n = a.length, m = b.length, max = Math.min(n + m, maxEdits), offset = max + 1;
+    var v = new Int32Array(2 * max + 3), trace = [];
+    for (var d = 0; d <= max; d++) {
+      trace.push(v.slice(offset - d, offset + d + 1));
+      for (var k = -d; k <= d; k += 2) {
+        var x = (k === -d || (k !== d && v[offset + k - 1] < v[offset + k + 1]))
+          ? v[offset + k + 1] : v[offset + k - 1] + 1;
+        var y = x - k;
+        while (x < n && y < m && a[x] === b[y]) { x++; y++; }
+        v[offset + k] = x;
+        if (x >= n && y >= m) return backtrack(trace, d, a, b);
+      }
+    }
+    return null;
+  }
+
+  function backtrack(trace, d, a, b) {
+    var x = a.length, y = b.length, ops = [];
+    for (; d > 0; d--) {
+      var prev = trace[d], k = x - y;
+      var prevK = (k === -d || (k !== d && prev[k - 1 + d] < prev[k + 1 + d])) ? k + 1 : k - 1;
+      var prevX = prev[prevK + d], prevY = prevX - prevK;
+      while (x > prevX && y > prevY) { ops.push(['=', a[--x]]); y--; }
+      if (x === prevX) ops.push(['+', b[--y]]); else ops.push(['-', a[--x]]);
+    }
+    while (x > 0 && y > 0) { ops.push(['=', a[--x]]); y--; }
+    return ops.reverse();
+  }
+
+  return api;
+})();
+"""
+
+ITEMS_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>OCR Grading Report - Items</title>
+    <link rel="stylesheet" href="report.css">
+    <script src="report.js"></script>
+</head>
+<body>
+    <div class="header">
+        <h1>Graded Items</h1>
+        <p><a href="../detailed_report.html">Summary</a> &middot; <span id="count"></span></p>
+    </div>
+    <div class="controls">
+        <label>Engine <select id="engine"><option value="">all</option></select></label>
+        <label>Rows per page <select id="size"><option>50</option><option>100</option><option>500</option></select></label>
+        <button id="prev">&larr;</button> <span id="page"></span> <button id="next">&rarr;</button>
+        <span id="status"></span>
+    </div>
+    <table>
+        <thead><tr id="head"></tr></thead>
+        <tbody id="body"></tbody>
+    </table>
+    <script>
+    var LABELS = {index: 'Index', source: 'Engine', model: 'Judge', overall_score: 'Overall',
+                  character_accuracy: 'Character', word_accuracy: 'Word', confidence_level: 'Confidence',
+                  latency: 'Latency (s)', error: 'Error'};
+    var meta, view = null;  // view: row ids in display order when sorted or filtered
+    var state = {page: 0, size: 50, sort: -1, dir: 1, engine: ''};
+
+    function readHash() {
+        location.hash.slice(1).split('&').forEach(function (part) {
+            var kv = part.split('=');
+            if (kv[0] in state) state[kv[0]] = kv[0] === 'engine' ? decodeURIComponent(kv[1] || '') : Number(kv[1]);
+        });
+    }
+    function writeHash() {
+        history.replaceState(null, '', '#' + Object.keys(state).map(function (k) {
+            return k + '=' + encodeURIComponent(state[k]);
+        }).join('&'));
+    }
+    function status(text) { document.getElementById('status').textContent = text; }
+
+    // Row ids in display order; only sorting or filtering needs every row
+    function ids() {
+        if (state.sort < 0 && !state.engine) {
+            return Promise.resolve(null);
+        }
+        return OCRReport.loadAllRows(function (done, total) {
+            status('Loading rows ' + done + '/' + total);
+        }).then(function (rows) {
+            var order = [];
+            for (var i = 0; i < rows.length; i++) {
+                if (!state.engine || rows[i][1] === state.engine) order.push(i);
+            }
+            if (state.sort >= 0) {
+                var c = state.sort, dir = state.dir;
+                order.sort(function (x, y) {
+                    var a = rows[x][c], b = rows[y][c];
+                    if (a === b) return x - y;
+                    if (a === null || a === undefined) return 1;
+                    if (b === null || b === undefined) return -1;
+                    return (a < b ? -1 : 1) * dir;
+                });
+            }
+            status('');
+            return order;
+        });
+    }
+
+    function render() {
+        var total = view ? view.length : meta.count;
+        var pages = Math.max(1, Math.ceil(total / state.size));
+        state.page = Math.min(Math.max(0, state.page), pages - 1);
+        writeHash();
+        var first = state.page * state.size, last = Math.min(total, first + state.size), page = [];
+        for (var i = first; i < last; i++) page.push(view ? view[i] : i);
+        document.getElementById('page').textContent = 'Page ' + (state.page + 1) + ' of ' + pages;
+        document.getElementById('count').textContent = total + ' items';
+        Array.prototype.forEach.call(document.querySelectorAll('th'), function (th, c) {
+            th.className = c === state.sort ? (state.dir > 0 ? 'asc' : 'desc') : '';
+        });
+        Promise.all(page.map(OCRReport.loadRow)).then(function (rows) {
+            var body = document.getElementById('body');
+            body.textContent = '';
+            rows.forEach(function (row, i) {
+                var tr = document.createElement('tr');
+                row.forEach(function (value, c) {
+                    var td = document.createElement('td');
+                    if (c === 0) {
+                        var a = document.createElement('a');
+                        a.href = 'item.html#' + page[i];
+                        a.textContent = OCRReport.format(value);
+                        td.appendChild(a);
+                    } else {
+                        td.textContent = OCRReport.format(value);
+                        if (meta.columns[c] === 'error') td.className = 'error';
+                    }
+                    tr.appendChild(td);
+                });
+                body.appendChild(tr);
+            });
+        });
+    }
+
+    function refresh() {
+        ids().then(function (order) { view = order; render(); }, function (e) { status(e.message); });
+    }
+
+    readHash();
+    OCRReport.loadMeta().then(function (m) {
+        meta = m;
+        document.title = meta.title + ' - Items';
+        var head = document.getElementById('head');
+        meta.columns.forEach(function (column, c) {
+            var th = document.createElement('th');
+            th.textContent = LABELS[column] || column;
+            th.onclick = function () {
+                state.dir = state.sort === c ? -state.dir : 1;
+                state.sort = c;
+                state.page = 0;
+                refresh();
+            };
+            head.appendChild(th);
+        });
+        var engine = document.getElementById('engine');
+        meta.engines.forEach(function (name) {
+            var option = document.createElement('option');
+            option.textContent = name;
+            engine.appendChild(option);
+        });
+        engine.value = state.engine;
+        engine.onchange = function () { state.engine = engine.value; state.page = 0; refresh(); };
+        var size = document.getElementById('size');
+        size.value = String(state.size);
+        size.onchange = function () { state.size = Number(size.value); state.page = 0; render(); };
+        document.getElementById('prev').onclick = function () { state.page--; render(); };
+        document.getElementById('next').onclick = function () { state.page++; render(); };
+        refresh();
+    }, function (e) { status(e.message); });
+    </script>
+</body>
+</html>
+"""
+
+ITEM_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>OCR Grading Report - Item</title>
+    <link rel="stylesheet" href="report.css">
+    <script src="report.js"></script>
+</head>
+<body>
+    <div class="header">
+        <h1 id="title">Item</h1>
+        <p><a href="items.html">All items</a> &middot; <a id="prev" href="#">&larr; previous</a>
+           &middot; <a id="next" href="#">next &rarr;</a></p>
+    </div>
+    <table><tbody id="fields"></tbody></table>
+    <h2>Differences</h2>
+    <p><del>only in OCR output</del> <ins>only in ground truth</ins></p>
+    <pre id="diff"></pre>
+    <div class="texts">
+        <div><h2>OCR output</h2><pre id="ocr"></pre></div>
+        <div><h2>Ground truth</h2><pre id="truth"></pre></div>
+    </div>
+    <script>
+    function field(name, value) {
+        var tr = document.createElement('tr'), th = document.createElement('th'), td = document.createElement('td');
+        th.textContent = name;
+        td.textContent = typeof value === 'object' && value !== null ? JSON.stringify(value) : OCRReport.format(value);
+        tr.appendChild(th);
+        tr.appendChild(td);
+        document.getElementById('fields').appendChild(tr);
+    }
+
+    function show() {
+        var id = Number(location.hash.slice(1)) || 0;
+        OCRReport.loadMeta().then(function (meta) {
+            id = Math.min(Math.max(0, id), meta.count - 1);
+            document.getElementById('prev').href = '#' + Math.max(0, id - 1);
+            document.getElementById('next').href = '#' + Math.min(meta.count - 1, id + 1);
+            return Promise.all([meta, OCRReport.loadRow(id), OCRReport.loadText(id)]);
+        }).then(function (loaded) {
+            var meta = loaded[0], row = loaded[1], text = loaded[2];
+            document.title = meta.title + ' - ' + row[1] + ' ' + row[0];
+            document.getElementById('title').textContent = 'Item ' + row[0] + ' (' + row[1] + ')';
+            document.getElementById('fields').textContent = '';
+            meta.columns.forEach(function (column, c) { field(column, row[c]); });
+            Object.keys(text[2]).forEach(function (key) { field(key, text[2][key]); });
+
+            var ocr = text[0], truth = text[1], diff = document.getElementById('diff');
+            document.getElementById('ocr').textContent = ocr === null ? '(not available)' : ocr;
+            document.getElementById('truth').textContent = truth === null ? '(not available)' : truth;
+            diff.textContent = '';
+            if (ocr === null || truth === null) {
+                diff.textContent = '(texts were not included in this report)';
+                return;
+            }
+            var runs = OCRReport.diff(ocr, truth);
+            if (runs === null) {
+                diff.textContent = '(the texts differ too much to align)';
+                return;
+            }
+            runs.forEach(function (run) {
+                var node = run[0] === '=' ? document.createTextNode(run[1])
+                    : document.createElement(run[0] === '-' ? 'del' : 'ins');
+                if (run[0] !== '=') node.textContent = run[1];
+                diff.appendChild(node);
+            });
+        }, function (e) { document.getElementById('diff').textContent = e.message; });
+    }
+
+    window.onhashchange = show;
+    show();
+    </script>
+</body>
+</html>
+"""
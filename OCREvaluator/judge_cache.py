@@ -0,0 +1,175 @@
+"""
+Persistent SQLite cache of judge responses.
+
+Entries are keyed by a hash of everything that determines a grade: the
+normalized OCR text, the ground truth, the judge model, the prompt version and
+the sampling temperature. Re-running the evaluator then only pays for pairs
+whose inputs changed. Replayed results are marked `cached` and carry no token
+usage or latency, since nothing was spent on them in this run.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Check the cache size every this many writes
+EVICTION_INTERVAL = 100
+# Token usage and latency fields of a judge result
+USAGE = ('prompt_tokens', 'completion_tokens', 'latency')
+
+
+class JudgeCache:
+    """SQLite-backed judge response cache with hit/miss counters and LRU eviction."""
+
+    def __init__(self, path: Path, max_bytes: Optional[int] = None):
+        """
+        Args:
+            path: SQLite database file, created if missing
+            max_bytes: Evict least recently used entries above this total
+                result size (None = unbounded)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        # Judge worker threads share one connection, serialized by the lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS judge_cache (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS judge_cache_accessed ON judge_cache(accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(ocr_text: str, ground_truth: str, model: str, prompt_version: Any,
+                 temperature: float, variant: str = "") -> str:
+        """Content hash identifying one grading request."""
+        digest = hashlib.sha256()
+        for part in (ocr_text, ground_truth, model, str(prompt_version), repr(float(temperature)), variant):
+            encoded = part.encode('utf-8')
+            # Length prefixes keep ("ab", "c") and ("a", "bc") apart
+            digest.update(len(encoded).to_bytes(8, 'little'))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a key, or None."""
+        result = self._lookup(key)
+        if result is not None:
+            self._touch([key])
+        return result
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result for a key, or None, without marking it as used."""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM judge_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def _touch(self, keys: List[str]) -> None:
+        """Mark entries as just used, for LRU eviction, in one transaction."""
+        if not keys:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("UPDATE judge_cache SET accessed = ? WHERE key = ?", [(now, key) for key in keys])
+            self._conn.commit()
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Store a result, evicting old entries if the cache grew too large."""
+        payload = json.dumps(result)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judge_cache (key, result, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self.max_bytes is not None and self._writes % EVICTION_INTERVAL == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the cache fits max_bytes. Caller holds the lock."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM judge_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        removed = 0
+        keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM judge_cache ORDER BY accessed"):
+            keys.append((key,))
+            removed += size
+            if removed >= excess:
+                break
+        self._conn.executemany("DELETE FROM judge_cache WHERE key = ?", keys)
+        self._conn.commit()
+        self.logger.info(f"Evicted {len(keys)} judge cache entries ({removed} bytes)")
+
+    def partition(self, pairs: List[Tuple[str, str, int]], key_fn: Callable[[Tuple[str, str, int]], str]
+                  ) -> Tuple[List[Dict[str, Any]], List[Tuple[str, str, int]], Dict[int, str]]:
+        """
+        Split pairs into cached results and pairs that still need grading.
+
+        Returns:
+            (cached results re-indexed to their pair and marked cached with zero
+            usage, uncached pairs, index -> key for the uncached pairs so their
+            results can be stored later)
+        """
+        cached, remaining, keys, hits = [], [], {}, []
+        for pair in pairs:
+            key = key_fn(pair)
+            result = self._lookup(key)
+            if result is None:
+                remaining.append(pair)
+                keys[pair[2]] = key
+            else:
+                hits.append(key)
+                result['index'] = pair[2]
+                result['cached'] = True
+                for field in USAGE:
+                    result[field] = 0
+                cached.append(result)
+        # One commit for all hits instead of one per hit
+        self._touch(hits)
+        return cached, remaining, keys
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM judge_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': size,
+        }
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
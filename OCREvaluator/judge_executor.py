@@ -0,0 +1,211 @@
+"""
+Concurrent, rate-limit-aware execution of judge calls.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from openai import APIConnectionError
+
+from ocr_common import profiling
+
+# HTTP statuses worth retrying: rate limits, timeouts, conflicts and server errors
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1) -> None:
+        """Block until `amount` tokens are available, then take them."""
+        # A request larger than the bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Requests/min and tokens/min limits plus a shared pause after 429 responses."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every worker for `seconds`, e.g. from a Retry-After header."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def acquire(self, tokens: float) -> None:
+        """Wait until a request of `tokens` tokens may be sent."""
+        while True:
+            with self.lock:
+                wait = self.paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens:
+            self.tokens.acquire(tokens)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the Retry-After (or retry-after-ms) header from an API error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an exception from a judge call is transient."""
+    if isinstance(error, APIConnectionError):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRYABLE_STATUS or status >= 500)
+
+
+class JudgeExecutor:
+    """Runs a judge function over many pairs with a thread pool, rate limits and retries."""
+
+    def __init__(self, judge: Callable[[Tuple], Dict[str, Any]], max_workers: int = 8,
+                 requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 token_estimator: Optional[Callable[[Tuple], float]] = None, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, batched: bool = False,
+                 limiter: Optional[RateLimiter] = None):
+        """
+        Args:
+            judge: Callable grading one (ocr_text, ground_truth, index) pair, or with
+                batched=True a list of pairs, returning a list of results
+            max_workers: Number of concurrent judge calls
+            requests_per_minute: Request rate limit (None = unlimited)
+            tokens_per_minute: Token rate limit (None = unlimited)
+            token_estimator: Callable returning the tokens a work item will use
+            max_retries: Retries per item for transient errors
+            backoff_base: First backoff delay in seconds, doubled per retry
+            backoff_max: Upper bound on a single backoff delay
+            batched: Work items are lists of pairs graded in one call
+            limiter: Existing RateLimiter to share with other executors; overrides
+                requests_per_minute/tokens_per_minute
+        """
+        self.judge = judge
+        self.max_workers = max_workers
+        self.limiter = limiter or RateLimiter(requests_per_minute, tokens_per_minute)
+        self.token_estimator = token_estimator or (lambda pair: 0)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batched = batched
+        self.logger = logging.getLogger(__name__)
+
+    def _call(self, job: List[Tuple]) -> List[Dict[str, Any]]:
+        """Grade one job (list of pairs), retrying transient errors with exponential backoff."""
+        if self.batched:
+            tokens = self.token_estimator(job)
+        else:
+            tokens = self.token_estimator(job[0])
+        label = ",".join(str(pair[2]) for pair in job)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                if self.batched:
+                    return self.judge(job)
+                return [self.judge(job[0])]
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                server_delay = retry_after_seconds(e)
+                if server_delay is not None:
+                    # The server told us how long to back off; hold every worker
+                    delay = server_delay
+                    self.limiter.pause(delay)
+                else:
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                    delay *= random.uniform(0.5, 1.0)
+                self.logger.warning(f"Index {label}: {e.__class__.__name__}, retry {attempt + 1} in {delay:.1f}s")
+                if server_delay is None:
+                    time.sleep(delay)
+
+    def run(self, items: Iterable,
+            on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+            on_error: Optional[Callable[[Tuple, Exception], None]] = None
+            ) -> Tuple[List[Dict[str, Any]], List[Tuple]]:
+        """
+        Grade all pairs concurrently.
+
+        Args:
+            items: Iterable of (ocr_text, ground_truth, index) tuples, or of lists
+                of them when batched
+            on_result: Called in the calling thread for each result as it completes
+            on_error: Called in the calling thread for each pair that failed for good
+
+        Returns:
+            (results sorted by index, failed pairs)
+        """
+        results = []
+        failed = []
+        # Under --profile, the workers' samples count for the caller's section
+        with ThreadPoolExecutor(max_workers=self.max_workers, initializer=profiling.worker_initializer()) as pool:
+            jobs = items if self.batched else ([pair] for pair in items)
+            futures = {pool.submit(self._call, list(job)): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    job_results = future.result()
+                except Exception as e:
+                    self.logger.error(f"Error processing index {','.join(str(p[2]) for p in job)}: {e}")
+                    failed.extend(job)
+                    if on_error:
+                        for pair in job:
+                            on_error(pair, e)
+                    continue
+                results.extend(job_results)
+                if on_result:
+                    for result in job_results:
+                        on_result(result)
+        results.sort(key=lambda r: r.get('index', 0))
+        failed.sort(key=lambda p: p[2])
+        return results, failed
@@ -3,19 +3,64 @@ import json
 import logging
 import os
 import sys
+import time
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 import pandas as pd
 from tqdm import tqdm
 from dotenv import load_dotenv
 
-from file_processor import FileProcessor
+from file_processor import FILE_SUFFIX, FileProcessor
 from results_manager import ResultsManager
-from datasets import load_from_disk
 import LLM as LLM
+import metrics
+import normalization
+from judge_executor import JudgeExecutor, RateLimiter
+from judge_cache import JudgeCache
+from chunking import CHUNK_THRESHOLD, CHUNK_TOKENS, ChunkPlan
+from cascade import MAX_DISAGREEMENT, MIN_CONFIDENCE, CascadeReport, escalation_reason
+import adaptive
+from adaptive import AdaptiveSampler
+from stats import METRICS
+from ground_truth_store import METADATA_COLUMN, GroundTruthStore, export_dataset
+import comparison
+from ocr_common.profiling import MODES as PROFILE_MODES, Profiler
+from ocr_common.telemetry import SNAPSHOT_INTERVAL, Telemetry
 
 OCR_DIR = Path("./input")
 RESULTS_DIR = Path("./results")
+CACHE_DIR = Path("./cache")
+TEST_SOURCE= "qwen"
+
+class GradingMetrics:
+    """Live grading metrics (see ocr_common.telemetry), updated from the result callbacks."""
+    
+    def __init__(self, telemetry: Telemetry):
+        self.results = telemetry.counter("grader_results_total", "Items graded", ["engine", "judge"])
+        self.failures = telemetry.counter("grader_failures_total", "Items that failed grading for good", ["engine"])
+        self.latency = telemetry.histogram("grader_judge_latency_seconds", "Judge latency per item", ["engine"])
+        self.tokens = telemetry.counter("grader_tokens_total", "Judge tokens per item", ["engine", "kind"])
+        self.pending = telemetry.gauge("grader_pending_items", "Items left to grade")
+        self.last_result = telemetry.gauge("grader_last_result_timestamp_seconds",
+                                           "Unix time of the latest result or failure")
+    
+    def result(self, result: Dict) -> None:
+        engine = result.get('source', "")
+        self.results.inc(engine=engine, judge=result.get('judge', ""))
+        # Cache hits made no request, and carry no tokens to count
+        if result.get('latency') is not None and not result.get('cached'):
+            self.latency.observe(result['latency'], engine=engine)
+        for kind in ('prompt', 'completion'):
+            if result.get(f'{kind}_tokens'):
+                self.tokens.inc(result[f'{kind}_tokens'], engine=engine, kind=kind)
+        self.pending.inc(-1)
+        self.last_result.set(time.time())
+    
+    def failure(self, engine: str) -> None:
+        self.failures.inc(engine=engine)
+        self.pending.inc(-1)
+        self.last_result.set(time.time())
+
 
 def validate_directories(ocr_dir: Path, ground_truth_dir: Path) -> None:
     """Validate that input directories exist and contain files."""
@@ -37,64 +82,592 @@ def validate_directories(ocr_dir: Path, ground_truth_dir: Path) -> None:
     logging.info(f"Found {len(ocr_files)} OCR files and {len(gt_files)} ground truth files")
 
 
-TEST_SOURCE= "qwen"
-FILE_SUFFIX= "llamacpp"
+def keep_judge_accuracy(result: Dict) -> Dict:
+    """
+    Copy an LLM result's character accuracy to judge_character_accuracy.
+
+    The cascade compares that field with the local accuracy, so it must hold
+    the judge's own value even after --judge hybrid replaced character_accuracy.
+    Chunked documents get it as the average over their chunks.
+    """
+    if 'refusal' not in result and 'character_accuracy' in result:
+        result.setdefault('judge_character_accuracy', result['character_accuracy'])
+    return result
+
+
+def apply_local_accuracy(result: Dict, pair: Tuple[str, str, int]) -> Dict:
+    """
+    Replace the judge's character/word accuracy with exact local metrics.
+
+    judge_character_accuracy is left alone: keep_judge_accuracy has already
+    stored the judge's value there.
+    """
+    if 'refusal' not in result:
+        local = metrics.judgeLocal(pair)
+        for key in ('character_accuracy', 'word_accuracy', 'cer', 'wer'):
+            if key in local:
+                result[key] = local[key]
+    return result
+
+
+def grade_pair(pair: Tuple[str, str, int], judge: str = "llm", model: Optional[str] = None,
+               prompt_mode: str = "full") -> Dict:
+    """
+    Grade one (ocr_text, ground_truth, index) pair.
+
+    judge:
+        "llm"    - everything from the LLM judge
+        "local"  - edit-distance metrics only, no API calls
+        "hybrid" - LLM overall score, exact local character/word accuracy
+    prompt_mode:
+        "full" sends both texts to the LLM, "diff" only where they differ
+    """
+    if judge == "local":
+        return metrics.judgeLocal(pair)
+    result = keep_judge_accuracy(LLM.judgeLLm(pair, model, prompt_mode))
+    if judge == "hybrid":
+        apply_local_accuracy(result, pair)
+    return result
+
+
+def grade_batch(pairs: List[Tuple[str, str, int]], judge: str = "llm", model: Optional[str] = None,
+                prompt_mode: str = "full") -> List[Dict]:
+    """Grade several pairs in one LLM request; items the model skipped are missing from the result."""
+    results = [keep_judge_accuracy(result) for result in LLM.judgeLLmBatch(pairs, model, prompt_mode)]
+    if judge == "hybrid":
+        by_index = {pair[2]: pair for pair in pairs}
+        for result in results:
+            apply_local_accuracy(result, by_index[result['index']])
+    return results
+
+
+def grade_pairs(pairs: List[Tuple[str, str, int]], args: argparse.Namespace,
+                on_result=None, on_error=None, cache: Optional[JudgeCache] = None,
+                limiter: Optional[RateLimiter] = None) -> Tuple[List[Dict], List[Tuple]]:
+    """
+    Grade all pairs concurrently within the API rate limits.
+
+    With --judge local, every pair is graded in a pool of worker processes.
+    Otherwise pairs found in the judge cache are not sent again. With
+    --batch-size > 1, the rest are first packed into multi-pair requests that
+    fit the context window; whatever the model leaves out, or whatever fails
+    in a batch, is then graded one pair per request. Pairs longer than --chunk-threshold
+    tokens are graded as aligned chunks and reported as one combined result.
+
+    Callers that grade in several calls pass one `limiter` to all of them, so
+    --rpm/--tpm hold across calls instead of each call starting a full bucket.
+
+    Returns:
+        (results sorted by index, failed pairs)
+    """
+    if args.judge == "local":
+        # Nothing to rate limit or cache: the edit distances run in worker processes
+        results = metrics.judgeLocalBatch(pairs, on_result=on_result)
+        results.sort(key=lambda r: r.get('index', 0))
+        return results, []
+
+    limiter = limiter or RateLimiter(args.rpm, args.tpm)
+    results = []
+    plan = None
+    if args.chunk_threshold:
+        plan = ChunkPlan(pairs, args.chunk_tokens, args.chunk_threshold)
+        if plan.parents:
+            logging.info(f"Grading {len(plan.parents)} long pairs as {len(plan.chunk_parent)} chunks")
+        pairs = plan.pairs
+        documents, failed_documents = [], []
+        report_document, report_failure = on_result, on_error
+
+        def on_result(result):
+            result = plan.add_result(result)
+            if result is None:
+                return
+            if args.judge == "hybrid" and result['index'] in plan.parents:
+                apply_local_accuracy(result, plan.parents[result['index']])
+            documents.append(result)
+            if report_document:
+                report_document(result)
+
+        def on_error(pair, error):
+            pair = plan.add_failure(pair)
+            if pair is None:
+                return
+            failed_documents.append(pair)
+            if report_failure:
+                report_failure(pair, error)
+
+    if cache is not None:
+        def cache_key(pair):
+            return JudgeCache.make_key(pair[0], pair[1], args.model, LLM.prompt_version(args.prompt_mode),
+                                       LLM.TEMPERATURE, variant=args.judge)
+        results, pairs, cache_keys = cache.partition(pairs, cache_key)
+        logging.info(f"{len(results)} pairs graded from cache, {len(pairs)} to grade")
+        if on_result:
+            for result in results:
+                on_result(result)
+
+        report_result = on_result
+        def on_result(result):
+            if 'refusal' not in result and result.get('index') in cache_keys:
+                cache.put(cache_keys[result['index']], result)
+            if report_result:
+                report_result(result)
+
+    if args.batch_size > 1:
+        batch_executor = JudgeExecutor(
+            lambda batch: grade_batch(batch, args.judge, args.model, args.prompt_mode),
+            max_workers=args.concurrency,
+            token_estimator=lambda batch: LLM.estimate_batch_tokens(batch, args.prompt_mode),
+            max_retries=args.max_retries,
+            batched=True,
+            limiter=limiter,
+        )
+        batches = LLM.split_batches(pairs, args.batch_size, args.context_tokens, args.prompt_mode)
+        batch_results, _ = batch_executor.run(batches, on_result=on_result)
+        results.extend(batch_results)
+        graded = {result['index'] for result in batch_results}
+        pairs = [pair for pair in pairs if pair[2] not in graded]
+        if pairs:
+            logging.info(f"Grading {len(pairs)} pairs left out of batches one by one")
+
+    executor = JudgeExecutor(
+        lambda pair: grade_pair(pair, args.judge, args.model, args.prompt_mode),
+        max_workers=args.concurrency,
+        token_estimator=lambda pair: LLM.estimate_tokens(pair, args.prompt_mode),
+        max_retries=args.max_retries,
+        limiter=limiter,
+    )
+    single_results, failed = executor.run(pairs, on_result=on_result, on_error=on_error)
+    results.extend(single_results)
+    if plan is not None:
+        # Chunk results were folded into their documents as they arrived
+        results = documents
+        failed = sorted(failed_documents, key=lambda p: p[2])
+    results.sort(key=lambda r: r.get('index', 0))
+    return results, failed
+
+
+def load_ground_truth(store_path: Path) -> Sequence[str]:
+    """Normalized benchmark ground truth, in dataset order."""
+    # The dataset (images included) is only loaded to export the ground truth store once
+    if store_path.exists():
+        store = GroundTruthStore(store_path)
+    else:
+        store = export_dataset(store_path)
+    # Ground truth is normalized once per dataset version
+    return normalization.cached_normalized_ground_truth(
+        lambda: store, store.metadata['fingerprint'], CACHE_DIR)
+
+
+def load_item_metadata(store_path: Path) -> Optional[GroundTruthStore]:
+    """Per-item benchmark metadata (JSON strings) in dataset order, or None if the dataset has none."""
+    if store_path.exists():
+        return GroundTruthStore(store_path)
+    try:
+        return export_dataset(store_path, column=METADATA_COLUMN)
+    except KeyError:
+        logging.warning(f"The dataset has no '{METADATA_COLUMN}' column; exporting without item metadata")
+        return None
+
+
+def load_engine_outputs(engines: Dict[str, str], ocr_dir: Path, ground_truths: Sequence[str]
+                        ) -> Dict[str, List[Tuple[int, str, str]]]:
+    """
+    Pair each engine's OCR results with the dataset ground truth.
+    
+    Returns:
+        Dictionary of engine -> (dataset index, normalized OCR text, ground truth)
+    """
+    outputs = {}
+    for engine, suffix in engines.items():
+        processor = FileProcessor(ocr_dir / engine, suffix=suffix)
+        # One directory scan per engine instead of probing a file name per index
+        index = processor.scan_directory(ocr_dir / engine, suffix)
+        pairs = []
+        for i, ground_truth in enumerate(ground_truths):
+            if str(i) not in index:
+                continue
+            record = processor.load_record(*index[str(i)])
+            pairs.append((i, normalization.normalize(record.content), ground_truth))
+        missing = len(ground_truths) - len(pairs)
+        if missing:
+            logging.warning(f"{engine}: {missing} OCR results missing, skipped")
+        outputs[engine] = pairs
+    return outputs
+
+
+def load_directory_outputs(ocr_dir: Path, ground_truth_dir: Path, suffix: str
+                           ) -> Dict[str, List[Tuple[object, str, str]]]:
+    """
+    Pair OCR files with ground truth files of the same base name.
+    
+    Returns:
+        {ocr_dir name: (base name, normalized OCR text, normalized ground truth)};
+        numeric base names become int indices
+    """
+    validate_directories(ocr_dir, ground_truth_dir)
+    processor = FileProcessor(ocr_dir, ground_truth_dir, suffix=suffix)
+    pairs = []
+    for name, ocr_record, gt_record in processor.load_pairs():
+        index = int(name) if name.isdigit() else name
+        pairs.append((index, normalization.normalize(ocr_record.content),
+                      normalization.normalize(gt_record.content)))
+    return {ocr_dir.name: pairs}
+
+
+def grade_cascade(pairs: List[Tuple[str, str, int]], args: argparse.Namespace,
+                  on_result=None, on_error=None, cache: Optional[JudgeCache] = None
+                  ) -> Tuple[List[Dict], List[Tuple], CascadeReport]:
+    """
+    Grade with --model, then re-grade uncertain items with --cascade-model.
+
+    An item is escalated when the cheap judge's confidence is below
+    --escalate-confidence, or its character accuracy is more than
+    --escalate-disagreement points away from the local one. If the accurate
+    model fails on an item, the cheap result is kept.
+
+    Returns:
+        (results sorted by index, failed pairs, cascade report)
+    """
+    report = CascadeReport(args.model, args.cascade_model)
+    by_index = {pair[2]: pair for pair in pairs}
+    results = []
+    pending = {}
+
+    def finish(result, graded_by):
+        result['graded_by'] = graded_by
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    def on_cheap_result(result):
+        reason = escalation_reason(result, by_index[result['index']],
+                                   args.escalate_confidence, args.escalate_disagreement)
+        if reason is None:
+            report.add_kept(result)
+            finish(result, args.model)
+        else:
+            pending[result['index']] = (result, reason)
+
+    _, failed = grade_pairs(pairs, args, on_result=on_cheap_result, on_error=on_error, cache=cache)
+
+    if pending:
+        logging.info(f"Escalating {len(pending)} of {len(pairs)} pairs to {args.cascade_model}")
+
+    def on_accurate_result(result):
+        cheap, reason = pending.pop(result['index'])
+        report.add_escalated(cheap, result, reason)
+        result['escalation'] = reason
+        result['cheap_overall_score'] = cheap.get('overall_score')
+        finish(result, args.cascade_model)
+
+    def on_accurate_error(pair, error):
+        cheap, _ = pending.pop(pair[2])
+        logging.warning(f"Index {pair[2]}: {args.cascade_model} failed ({error}), keeping the {args.model} grade")
+        report.add_kept(cheap)
+        finish(cheap, args.model)
+
+    accurate_args = argparse.Namespace(**{**vars(args), 'model': args.cascade_model})
+    grade_pairs([by_index[index] for index in sorted(pending)], accurate_args,
+                on_result=on_accurate_result, on_error=on_accurate_error, cache=cache)
+    results.sort(key=lambda r: r.get('index', 0))
+    return results, failed, report
+
+
+def grade_adaptive(sampler: AdaptiveSampler, pairs: List[Tuple[str, str, int]], items: List[Tuple[str, int]],
+                   args: argparse.Namespace, on_result=None, on_error=None, cache: Optional[JudgeCache] = None
+                   ) -> Tuple[List[Tuple], Dict]:
+    """
+    Grade the items the sampler draws, every engine per item, until the scores are settled.
+
+    on_result must pass each result on to sampler.add() so the stopping rules see it.
+
+    Returns:
+        (failed pairs, final sampler status)
+    """
+    by_item = {item: pair for item, pair in zip(items, pairs)}
+    failed = []
+    # One limiter for every round, so the rate limits hold across rounds
+    limiter = RateLimiter(args.rpm, args.tpm)
+
+    def grade_round(indices):
+        # Items graded by a resumed run have no pair left and cost nothing
+        round_pairs = [by_item[(engine, index)] for index in indices for engine in sampler.engines
+                       if (engine, index) in by_item]
+        if round_pairs:
+            _, round_failed = grade_pairs(round_pairs, args, on_result=on_result, on_error=on_error, cache=cache,
+                                          limiter=limiter)
+            failed.extend(round_failed)
+
+    def on_round(status):
+        widths = ", ".join(f"{engine} ±{e['half_width']:.2f}" for engine, e in status['engines'].items()
+                           if e['half_width'] is not None)
+        logging.info(f"Adaptive round {sampler.rounds}: {sampler.items_drawn}/{sampler.items_available} "
+                     f"items, {widths}")
+
+    status = sampler.run(grade_round, on_round)
+    return failed, status
+
+
+def add_judge_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the judge options (model, concurrency, rate limits, batching, chunking, cache) to a parser."""
+    parser.add_argument("--judge", choices=["llm", "local", "hybrid"], default="llm",
+                        help="llm: LLM judge, local: edit-distance metrics only, "
+                             "hybrid: LLM overall score with local character/word accuracy")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent judge calls")
+    parser.add_argument("--rpm", type=float, help="Requests per minute limit of the judge API")
+    parser.add_argument("--tpm", type=float, help="Tokens per minute limit of the judge API")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per item for transient API errors")
+    parser.add_argument("--llm", choices=["openai", "anthropic"], default="openai",
+                        help="Judge provider; non-OpenAI models are reached through an "
+                             "OpenAI-compatible endpoint set in OPENAI_BASE_URL")
+    parser.add_argument("--model", default=LLM.MODEL, help="Judge model")
+    parser.add_argument("--prompt-mode", choices=LLM.PROMPT_MODES, default="full",
+                        help="full: send both texts to the judge, diff: only the regions where they "
+                             "differ plus match statistics (far fewer tokens for good OCR output)")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS,
+                        help="Target tokens (OCR + ground truth) per chunk of a long document")
+    parser.add_argument("--chunk-threshold", type=int, default=CHUNK_THRESHOLD,
+                        help="Documents above this many tokens are graded in aligned chunks; 0 disables chunking")
+    parser.add_argument("--batch-size", type=int, default=1, help="Pairs graded per LLM request")
+    parser.add_argument("--context-tokens", type=int, default=LLM.CONTEXT_TOKENS,
+                        help="Context window of the judge model, limits the size of a batch")
+    parser.add_argument("--cache", type=Path, default=CACHE_DIR / "judge_cache.sqlite",
+                        help="Judge response cache (SQLite)")
+    parser.add_argument("--no-cache", action="store_true", help="Grade everything again, ignoring the cache")
+    parser.add_argument("--cache-max-mb", type=float, help="Evict least recently used cache entries above this size")
+
+
+def add_telemetry_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the live metrics options to a parser."""
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve live metrics in the Prometheus text format on this port")
+    parser.add_argument("--metrics-file", type=Path,
+                        help="Append a JSON snapshot of the metrics to this file every --metrics-interval seconds")
+    parser.add_argument("--metrics-interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="Seconds between metric snapshots")
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add --profile and --profile-dir to a parser."""
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="Profile each stage: sample (stack sampling, all threads, flamegraph-ready "
+                             ".collapsed files) or cprofile (deterministic, .pstats files)")
+    parser.add_argument("--profile-dir", type=Path,
+                        help="Where the profiles and hotspots.txt go (default: <output-dir>/profile)")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Grade OCR outputs against the benchmark ground truth")
+    parser.add_argument("--ocr-dir", type=Path, default=OCR_DIR,
+                        help="Directory with one sub-folder of OCR results per engine")
+    parser.add_argument("--output-dir", type=Path, default=RESULTS_DIR, help="Where to write results")
+    parser.add_argument("--source", default=TEST_SOURCE, help="Engine sub-folder inside --ocr-dir")
+    parser.add_argument("--ground-truth-dir", type=Path,
+                        help="Grade the .txt files in --ocr-dir against ground truth files of the same "
+                             "name in this directory instead of the benchmark dataset")
+    parser.add_argument("--ground-truth-store", type=Path, default=CACHE_DIR / "ground_truth.gts",
+                        help="Ground truth exported from the benchmark dataset; created on first use, "
+                             "refresh with: python ground_truth_store.py export")
+    parser.add_argument("--metadata-store", type=Path, default=CACHE_DIR / "dataset_metadata.gts",
+                        help="Per-item benchmark metadata for --parquet; created on first use")
+    parser.add_argument("--suffix", default=FILE_SUFFIX, help="Suffix of the OCR result files, e.g. 0llamacpp.txt")
+    parser.add_argument("--all-engines", action="store_true",
+                        help="Grade every engine sub-folder of --ocr-dir in one run and write a "
+                             "cross-engine comparison; suffixes are detected per folder")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Also export results, OCR timings and dataset metadata to "
+                             "grading_results.parquet/run=<run id>/engine=<engine>/ (needs pyarrow)")
+    parser.add_argument("--run-id", help="Partition name of this run in the Parquet export (default: the time of the export)")
+    add_judge_arguments(parser)
+    parser.add_argument("--cascade-model",
+                        help="Re-grade items the --model judge is unsure about with this more accurate model")
+    parser.add_argument("--escalate-confidence", type=float, default=MIN_CONFIDENCE,
+                        help="Cascade: escalate items graded with a lower confidence_level")
+    parser.add_argument("--escalate-disagreement", type=float, default=MAX_DISAGREEMENT,
+                        help="Cascade: escalate items whose judged character accuracy is further than "
+                             "this many points from the local one")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip indices already graded for this source and model in --output-dir; "
+                             "failed ones are graded again")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Grade items in stratified random order (by document type) and stop once every "
+                             "engine's confidence interval is narrow enough or the ranking is decided")
+    parser.add_argument("--ci-width", type=float, default=adaptive.CI_WIDTH,
+                        help="Adaptive: target half-width of each engine's confidence interval, in score points")
+    parser.add_argument("--confidence", type=float, default=adaptive.CONFIDENCE,
+                        help="Adaptive: confidence level of the intervals")
+    parser.add_argument("--stop-on", choices=adaptive.STOP_RULES, default="either",
+                        help="Adaptive: stop on the interval width, a decided ranking, or either")
+    parser.add_argument("--adaptive-metric", choices=METRICS, default="overall_score",
+                        help="Adaptive: score the stopping rules look at")
+    parser.add_argument("--adaptive-min", type=int, default=adaptive.MIN_ITEMS,
+                        help="Adaptive: items graded before the stopping rules are checked")
+    parser.add_argument("--adaptive-step", type=int, default=adaptive.STEP, help="Adaptive: items drawn per round")
+    parser.add_argument("--adaptive-seed", type=int, default=0, help="Adaptive: seed of the random order")
+    add_profile_arguments(parser)
+    add_telemetry_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.adaptive and args.cascade_model:
+        parser.error("--adaptive cannot be combined with --cascade-model")
+    return args
+
+
 def main():
     """Main function to orchestrate the OCR grading process."""
     # Load environment variables
     load_dotenv()
     
     # Override config with command line arguments
-    ocr_dir = OCR_DIR
-    output_dir = RESULTS_DIR
+    args = parse_args()
+    if args.llm != "openai" and not os.getenv("OPENAI_BASE_URL"):
+        logging.warning(f"--llm {args.llm} needs OPENAI_BASE_URL pointing at an OpenAI-compatible endpoint")
+    ocr_dir = args.ocr_dir
+    output_dir = args.output_dir
+    # A no-op unless --profile is given
+    profiler = Profiler(args.profile_dir or output_dir / "profile", args.profile)
+    profiler.start()
+    telemetry = Telemetry(args.metrics_port, args.metrics_file, args.metrics_interval)
+    telemetry.start()
+    grading_metrics = GradingMetrics(telemetry)
     
-    dataset = load_dataset("CodeArte/ocr-benchmark")
-
-
     try:
-        tupple_list= []
-        for index, dataset_item in enumerate(dataset["test"]):
-            ground_truth = dataset_item["true_markdown_output"]
-            # Get OCR text from the folder
-            with open(ocr_dir / TEST_SOURCE / f"{str(index)+FILE_SUFFIX}.txt", "r") as f:
-                ocr_text = f.read()
-            tupple= (ocr_text, ground_truth, index)
-            tupple_list.append(tupple)
-
+        with profiler.section("load"):
+            if args.ground_truth_dir:
+                outputs = load_directory_outputs(ocr_dir, args.ground_truth_dir, args.suffix)
+            else:
+                ground_truths = load_ground_truth(args.ground_truth_store)
+                if args.all_engines:
+                    engines = comparison.discover_engines(ocr_dir)
+                    logging.info(f"Found engines: {', '.join(f'{e} ({s})' for e, s in engines.items())}")
+                else:
+                    engines = {args.source: args.suffix}
+                outputs = load_engine_outputs(engines, ocr_dir, ground_truths)
+        
         # Create output directory
         output_dir.mkdir(parents=True, exist_ok=True)
         
         # Initialize components
         results_manager = ResultsManager(output_dir)
         
+        # Results are tagged so a resumed run knows what it already graded
+        judge_model = "local" if args.judge == "local" else args.model
+        cascade = args.cascade_model is not None and args.judge != "local"
+        if cascade:
+            judge_model = f"{args.model}>{args.cascade_model}"
+        previous_results = []
+        
+        # Every engine's pairs share one executor and cache, so each pair gets a
+        # run-wide id in place of the dataset index; items maps it back
+        tupple_list= []
+        items = []
+        for engine, pairs in outputs.items():
+            done = results_manager.latest_results(engine, judge_model) if args.resume else {}
+            previous_results.extend(done[index] for index in sorted(done, key=comparison.index_order))
+            for index, ocr_text, ground_truth in pairs:
+                if index in done:
+                    continue
+                tupple= (ocr_text, ground_truth, len(items))
+                tupple_list.append(tupple)
+                items.append((engine, index))
+            if args.resume:
+                logging.info(f"Resuming {engine}: {len(done)} pairs already graded")
+        
         # Get file pairs to process
         total_files = len(tupple_list)
         
+        sampler = None
+        if args.adaptive:
+            # Only items every engine has can be compared on paired differences
+            common = set.intersection(*({index for index, _, _ in pairs} for pairs in outputs.values()))
+            item_metadata = None if args.ground_truth_dir else load_item_metadata(args.metadata_store)
+            sampler = AdaptiveSampler(list(outputs), adaptive.strata_from_metadata(common, item_metadata),
+                                      metric=args.adaptive_metric, confidence=args.confidence,
+                                      ci_width=args.ci_width, stop_rule=args.stop_on,
+                                      min_items=args.adaptive_min, step=args.adaptive_step, seed=args.adaptive_seed)
+            for result in previous_results:
+                sampler.add(result['source'], result['index'], result)
+            logging.info(f"Adaptive: up to {len(common)} items in strata "
+                         f"{', '.join(f'{s} ({n})' for s, n in sorted(sampler.stratum_sizes.items()))}")
+        
         logging.info(f"Processing {total_files} file pairs")
+        grading_metrics.pending.set(total_files)
         
         
-        # Process files in batches
-        all_results = []
-        failed_files = []
+        cache = None
+        if not args.no_cache:
+            max_bytes = int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None
+            cache = JudgeCache(args.cache, max_bytes=max_bytes)
         
-        with tqdm(total_files, desc="Grading OCR files") as pbar:
-            for i in range(0, len(tupple_list), 1):
-                try:
-                    result = LLM.judgeLLm(tupple_list[i])
-                    all_results.append(result)
-                    
-                    # Save results incrementally
-                    results_manager.save_result(result)
-                    
-                except Exception as e:
-                    logging.error(f"Error processing batch {i//10 + 1}: {e}")
-                    failed_files.extend([fp[0].name for fp in tupple_list[i]])
-                
+        all_results = []
+        with profiler.section("grade"), tqdm(total=total_files, desc="Grading OCR files") as pbar:
+            def on_result(result):
+                # Save results incrementally, under their engine and dataset index
+                engine, index = items[result['index']]
+                result = dict(result, index=index, source=engine, model=judge_model, judge=args.judge)
+                results_manager.save_result(result)
+                all_results.append(result)
+                grading_metrics.result(result)
+                if sampler is not None:
+                    sampler.add(engine, index, result)
+                pbar.update(1)
+            
+            def on_error(pair, error):
+                engine, index = items[pair[2]]
+                results_manager.save_failure(index, str(error), source=engine, model=judge_model, judge=args.judge)
+                grading_metrics.failure(engine)
                 pbar.update(1)
+            
+            if sampler is not None:
+                failed_pairs, adaptive_status = grade_adaptive(
+                    sampler, tupple_list, items, args, on_result=on_result, on_error=on_error, cache=cache)
+                # Items left undrawn are not pending any more
+                pbar.total = pbar.n
+                pbar.refresh()
+                grading_metrics.pending.set(0)
+            elif cascade:
+                _, failed_pairs, cascade_report = grade_cascade(
+                    tupple_list, args, on_result=on_result, on_error=on_error, cache=cache)
+            else:
+                _, failed_pairs = grade_pairs(
+                    tupple_list, args, on_result=on_result, on_error=on_error, cache=cache)
+        all_results = sorted(previous_results + all_results, key=lambda r: (comparison.index_order(r['index']), r['source']))
+        if cache is not None:
+            logging.info(f"Judge cache: {cache.stats()}")
+            cache.close()
+        failed_files = [str(items[pair[2]][1]) if len(outputs) == 1 else "{}/{}".format(*items[pair[2]])
+                        for pair in failed_pairs]
         
         # Generate final report
         logging.info("Generating final report...")
-        results_manager.generate_final_report(all_results, failed_files)
+        with profiler.section("report"):
+            texts = {(engine, index): (ocr_text, ground_truth)
+                     for engine, pairs in outputs.items() for index, ocr_text, ground_truth in pairs}
+            results_manager.generate_final_report(all_results, failed_files,
+                                                  texts=lambda source, index: texts.get((source, index)))
+            # Runner timings sit next to the OCR files
+            timings = {engine: comparison.read_timings(ocr_dir if args.ground_truth_dir else ocr_dir / engine)
+                       for engine in outputs}
+            if args.all_engines:
+                results_manager.generate_comparison_report(comparison.build_comparison(all_results, timings))
+        if cascade:
+            summary = cascade_report.summary()
+            results_manager.save_cascade_report(summary)
+            logging.info(f"Cascade: {summary['escalated']}/{summary['items']} escalated, "
+                         f"cost ${summary['cost_usd'] or 0:.4f} vs ${summary['all_accurate_cost_usd'] or 0:.4f} "
+                         f"with {args.cascade_model} only")
+        if sampler is not None:
+            report = sampler.report(adaptive_status)
+            results_manager.save_adaptive_report(report)
+            logging.info(f"Adaptive: stopped on {report['stop_reason']} after {report['items_needed']}/"
+                         f"{report['items_available']} items, {report['judge_calls_saved']} judge calls saved")
+        if args.parquet:
+            with profiler.section("export"):
+                item_metadata = None if args.ground_truth_dir else load_item_metadata(args.metadata_store)
+                export = results_manager.export_parquet(args.run_id, timings, item_metadata,
+                                                        item_metadata.metadata if item_metadata else None)
+            logging.info(f"Parquet export: {export}")
+        results_manager.close()
         
         logging.info(f"Processing complete! Results saved to {output_dir}")
         logging.info(f"Successfully processed: {len(all_results)} files")
@@ -103,6 +676,9 @@ def main():
     except Exception as e:
         logging.error(f"Fatal error: {e}")
         sys.exit(1)
+    finally:
+        profiler.stop()
+        telemetry.stop()
 
 
 if __name__ == "__main__":
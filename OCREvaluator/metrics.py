@@ -0,0 +1,172 @@
+"""
+Local, deterministic OCR accuracy metrics (CER/WER) based on edit distance.
+"""
+
+from multiprocessing import Pool
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from rapidfuzz.distance import Levenshtein
+except ImportError:
+    Levenshtein = None
+
+
+def edit_distance(a: Sequence[Hashable], b: Sequence[Hashable]) -> int:
+    """
+    Levenshtein distance between two sequences of characters or tokens.
+
+    Uses rapidfuzz's native implementation when it is installed, otherwise
+    Myers' bit-parallel algorithm below.
+    """
+    if Levenshtein is not None:
+        return Levenshtein.distance(a, b)
+    return _bit_parallel_distance(a, b)
+
+
+def _bit_parallel_distance(a: Sequence[Hashable], b: Sequence[Hashable]) -> int:
+    """
+    Myers' bit-parallel Levenshtein distance (Hyyrö's formulation).
+
+    Python's arbitrary-width integers serve as the bit vectors, and the common
+    prefix and suffix are stripped first. Runs in O(len(a) * len(b) / wordsize).
+    """
+    # Common prefix/suffix never contribute to the distance
+    start = 0
+    end_a, end_b = len(a), len(b)
+    while start < end_a and start < end_b and a[start] == b[start]:
+        start += 1
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+
+    # The longer sequence becomes the bit vector, the shorter one is iterated
+    if len(a) < len(b):
+        a, b = b, a
+    m = len(a)
+    if not b:
+        return m
+
+    peq: Dict[Hashable, int] = {}
+    for i, symbol in enumerate(a):
+        peq[symbol] = peq.get(symbol, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for symbol in b:
+        eq = peq.get(symbol, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return score
+
+
+def _accuracy(distance: int, reference_length: int) -> float:
+    """Accuracy percentage from an error count, clamped at 0."""
+    if reference_length == 0:
+        return 100.0 if distance == 0 else 0.0
+    return max(0.0, 1.0 - distance / reference_length) * 100
+
+
+def compute_metrics(ocr_text: str, ground_truth: str) -> Dict[str, float]:
+    """
+    Compute character and word level metrics for one OCR/ground truth pair.
+
+    Whitespace runs are collapsed before comparison so that line wrapping
+    differences do not count as errors.
+
+    Returns:
+        Dictionary with 'cer', 'wer', 'character_accuracy', 'word_accuracy'
+        and 'normalized_accuracy' (1 - distance / longer length, in percent)
+    """
+    ocr_words = ocr_text.split()
+    gt_words = ground_truth.split()
+    ocr_chars = " ".join(ocr_words)
+    gt_chars = " ".join(gt_words)
+
+    char_distance = edit_distance(ocr_chars, gt_chars)
+    word_distance = edit_distance(ocr_words, gt_words)
+    longest = max(len(ocr_chars), len(gt_chars))
+
+    return {
+        'cer': char_distance / len(gt_chars) if gt_chars else float(bool(ocr_chars)),
+        'wer': word_distance / len(gt_words) if gt_words else float(bool(ocr_words)),
+        'character_accuracy': _accuracy(char_distance, len(gt_chars)),
+        'word_accuracy': _accuracy(word_distance, len(gt_words)),
+        'normalized_accuracy': (1 - char_distance / longest) * 100 if longest else 100.0,
+    }
+
+
+def judgeLocal(pair: Tuple[str, str, int]) -> Dict[str, Any]:
+    """
+    Grade one (ocr_text, ground_truth, index) pair without an LLM.
+
+    Returns a result with the same fields as LLM.judgeLLm. The overall score is
+    the normalized character accuracy, and the confidence is always 100 since
+    the numbers are exact.
+    """
+    ocr_text, ground_truth, index = pair
+    if not ocr_text or not ground_truth:
+        return {
+            "overall_score": 0.0,
+            "character_accuracy": 0.0,
+            "word_accuracy": 0.0,
+            "confidence_level": 100,
+            "index": index
+        }
+    metrics = compute_metrics(ocr_text, ground_truth)
+    return {
+        "overall_score": metrics['normalized_accuracy'],
+        "character_accuracy": metrics['character_accuracy'],
+        "word_accuracy": metrics['word_accuracy'],
+        "confidence_level": 100,
+        "cer": metrics['cer'],
+        "wer": metrics['wer'],
+        "index": index
+    }
+
+
+def judgeLocalBatch(pairs: Iterable[Tuple[str, str, int]], workers: Optional[int] = None,
+                    chunksize: int = 64,
+                    on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Grade many pairs locally, spreading them over worker processes.
+
+    Args:
+        pairs: Iterable of (ocr_text, ground_truth, index) tuples
+        workers: Number of processes (None = CPU count, 1 = run in-process)
+        chunksize: Pairs sent to a worker at a time; no more pairs than this
+            are graded in-process, where starting a pool would cost more
+        on_result: Called in the calling process for each result as it arrives
+
+    Returns:
+        Results in input order
+    """
+    pairs = list(pairs)
+    if workers == 1 or len(pairs) <= chunksize:
+        results = map(judgeLocal, pairs)
+        pool = None
+    else:
+        pool = Pool(workers)
+        results = pool.imap(judgeLocal, pairs, chunksize=chunksize)
+    try:
+        graded = []
+        for result in results:
+            graded.append(result)
+            if on_result:
+                on_result(result)
+        return graded
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
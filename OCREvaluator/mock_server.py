@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the LLM services used by the project.
+
+One local server speaks the three APIs the code calls:
+
+    POST /v1/chat/completions   OpenAI and llama-server (judgeLLm, llamacppRunnerQwen)
+    POST /api/chat              Ollama (gemmaRunner, qwenRunner)
+    GET  /health, /v1/models, /api/tags, /api/version
+
+Requests with a JSON schema (OpenAI response_format, Ollama format) get a
+response that follows the schema. Numbers are drawn in their allowed range,
+and arrays of objects with an "index" property get one element per
+"### ITEM N" marker of the prompt, like a batch judge response. Other requests
+get --text back. Image inputs (image_url parts, Ollama images) are accepted
+and counted as prompt tokens. "stream": true is answered with server-sent
+events (OpenAI) or NDJSON (Ollama).
+
+Responses are deterministic for a given --seed and request. The time a
+response takes comes from a latency distribution plus per-token prompt and
+output speeds, and --slots limits how many requests are served at once.
+Requests over the limit wait, like on llama-server's parallel slots. 429 and
+5xx errors can be injected at random or by a requests-per-minute limit, with
+a Retry-After header. Counters are served at /mock/stats and cleared by
+POST /mock/reset.
+
+Usage:
+    python mock_server.py --port 8080 --latency lognormal:0.8,0.4 --output-tps 60 --slots 4 --rate-429 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8080/v1 OPENAI_API_KEY=mock python main.py ...
+    LLM_HOST=http://127.0.0.1:8080 uv run src/main.py        (TestsPart1 LLM runners)
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_TEXT = "Mock OCR output.\nThe quick brown fox jumps over the lazy dog."
+CHARS_PER_TOKEN = 4
+# Prompt tokens counted per input image
+IMAGE_TOKENS = 256
+
+_ITEM_MARKER = re.compile(r'### ITEM (\d+)')
+_TOKEN = re.compile(r'\s*\S+|\s+')
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Latency distribution from a spec, returning a sampler of seconds.
+
+    fixed:S, uniform:MIN,MAX, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or
+    exponential:MEAN. Samples are never negative.
+    """
+    kind, _, params = spec.partition(':')
+    try:
+        values = [float(v) for v in params.split(',')] if params else []
+    except ValueError:
+        raise ValueError(f"Bad latency spec: {spec}")
+    samplers = {
+        'fixed': (1, lambda rng, s: s),
+        'uniform': (2, lambda rng, a, b: rng.uniform(a, b)),
+        'normal': (2, lambda rng, mean, sd: rng.gauss(mean, sd)),
+        'lognormal': (2, lambda rng, median, sigma: median * math.exp(rng.gauss(0, sigma))),
+        'exponential': (1, lambda rng, mean: rng.expovariate(1 / mean) if mean > 0 else 0.0),
+    }
+    if kind not in samplers or len(values) != samplers[kind][0]:
+        raise ValueError(f"Bad latency spec: {spec}")
+    sample = samplers[kind][1]
+    return lambda rng: max(0.0, sample(rng, *values))
+
+
+def _resolve(schema: Dict[str, Any], root: Dict[str, Any]) -> Dict[str, Any]:
+    """Follow local $ref pointers (#/$defs/..., #/definitions/...)."""
+    while isinstance(schema, dict) and '$ref' in schema:
+        node: Any = root
+        for part in schema['$ref'].lstrip('#/').split('/'):
+            node = node.get(part, {})
+        schema = node
+    return schema
+
+
+def generate(schema: Dict[str, Any], root: Dict[str, Any], rng: random.Random,
+             items: List[int], score_range: Tuple[float, float]) -> Any:
+    """
+    A value following a JSON schema.
+
+    Args:
+        schema: (Sub-)schema to follow
+        root: Whole schema, for $ref
+        rng: Source of the values
+        items: Batch item numbers found in the prompt
+        score_range: Range of numbers without minimum/maximum
+    """
+    schema = _resolve(schema, root)
+    for key in ('anyOf', 'oneOf'):
+        if key in schema:
+            options = [option for option in schema[key] if _resolve(option, root).get('type') != 'null']
+            return generate(options[0] if options else schema[key][0], root, rng, items, score_range)
+    if 'allOf' in schema:
+        return generate(schema['allOf'][0], root, rng, items, score_range)
+    if 'const' in schema:
+        return schema['const']
+    if 'enum' in schema:
+        return rng.choice(schema['enum'])
+
+    kind = schema.get('type', 'object' if 'properties' in schema else 'string')
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != 'null'), 'null')
+    if kind == 'object':
+        return {name: generate(sub, root, rng, items, score_range)
+                for name, sub in schema.get('properties', {}).items()}
+    if kind == 'array':
+        item_schema = _resolve(schema.get('items', {}), root)
+        if items and 'index' in item_schema.get('properties', {}):
+            values = []
+            for index in items:
+                value = generate(item_schema, root, rng, items, score_range)
+                value['index'] = index
+                values.append(value)
+            return values
+        count = max(schema.get('minItems', 1), 1)
+        return [generate(item_schema, root, rng, items, score_range) for _ in range(count)]
+    if kind in ('number', 'integer'):
+        low = schema.get('minimum', score_range[0])
+        high = schema.get('maximum', score_range[1])
+        if kind == 'integer':
+            return rng.randint(math.ceil(low), math.floor(high))
+        return round(rng.uniform(low, high), 1)
+    if kind == 'boolean':
+        return rng.random() < 0.5
+    if kind == 'null':
+        return None
+    return "mock"
+
+
+def _prompt(messages: List[Dict[str, Any]]) -> Tuple[str, int]:
+    """Text of all messages and the number of images in them."""
+    texts, images = [], 0
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get('type') == 'text':
+                    texts.append(part.get('text', ''))
+                elif part.get('type') in ('image_url', 'image', 'input_image'):
+                    images += 1
+        images += len(message.get('images') or [])
+    return "\n".join(texts), images
+
+
+def _tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class MockServer(ThreadingHTTPServer):
+    """HTTP server holding the mock's settings, fault generator, slots and counters."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], latency: str = "fixed:0", prompt_tps: float = 0.0,
+                 output_tps: float = 0.0, slots: int = 0, rate_429: float = 0.0, rate_5xx: float = 0.0,
+                 retry_after: float = 1.0, rpm: float = 0.0, seed: int = 0, text: str = DEFAULT_TEXT,
+                 score_range: Tuple[float, float] = (50.0, 100.0)):
+        """
+        Args:
+            address: (host, port); port 0 picks a free one
+            latency: Base latency distribution, see parse_latency
+            prompt_tps: Prompt tokens processed per second (0 = instant)
+            output_tps: Output tokens generated per second (0 = instant)
+            slots: Requests served at once; others wait (0 = unlimited)
+            rate_429: Share of requests answered with 429
+            rate_5xx: Share of requests answered with 500
+            retry_after: Retry-After seconds sent with injected errors
+            rpm: Requests per minute before 429s (0 = unlimited)
+            seed: Seed of response contents, latencies and injected errors
+            text: Response to requests without a JSON schema
+            score_range: Range of schema numbers without minimum/maximum
+        """
+        super().__init__(address, MockHandler)
+        self.latency = parse_latency(latency)
+        self.prompt_tps = prompt_tps
+        self.output_tps = output_tps
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.rpm = rpm
+        self.seed = seed
+        self.text = text
+        self.score_range = score_range
+        self._slots = threading.BoundedSemaphore(slots) if slots else None
+        self._lock = threading.Lock()
+        self._faults = random.Random(seed)
+        self._window: deque = deque()
+        self.reset_stats()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {'requests': 0, 'status': {}, 'injected_429': 0, 'injected_5xx': 0,
+                          'in_flight': 0, 'max_in_flight': 0, 'max_waiting': 0, 'waiting': 0,
+                          'queue_seconds': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def count(self, **changes: Any) -> None:
+        """Add to counters; 'status' counts one response of that code."""
+        with self._lock:
+            status = changes.pop('status', None)
+            if status is not None:
+                key = str(status)
+                self.stats['status'][key] = self.stats['status'].get(key, 0) + 1
+            for key, value in changes.items():
+                self.stats[key] += value
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+            self.stats['max_waiting'] = max(self.stats['max_waiting'], self.stats['waiting'])
+
+    def fault(self) -> Optional[Tuple[int, str, float]]:
+        """(status, message, retry after) of an error to answer a new request with, or None."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rpm:
+                while self._window and now - self._window[0] >= 60:
+                    self._window.popleft()
+                if len(self._window) >= self.rpm:
+                    return 429, "Rate limit reached for requests", 60 - (now - self._window[0])
+                self._window.append(now)
+            draw = self._faults.random()
+        if draw < self.rate_429:
+            return 429, "Rate limit reached (injected)", self.retry_after
+        if draw < self.rate_429 + self.rate_5xx:
+            return 500, "Internal server error (injected)", self.retry_after
+        return None
+
+    def acquire_slot(self) -> None:
+        if self._slots is None:
+            return
+        self.count(waiting=1)
+        start = time.monotonic()
+        self._slots.acquire()
+        self.count(waiting=-1, queue_seconds=time.monotonic() - start)
+
+    def release_slot(self) -> None:
+        if self._slots is not None:
+            self._slots.release()
+
+    def request_rng(self, body: Dict[str, Any]) -> random.Random:
+        """Generator seeded by the request, so the same request gets the same answer."""
+        digest = hashlib.sha256(f"{self.seed}:{json.dumps(body, sort_keys=True)}".encode('utf-8')).digest()
+        return random.Random(int.from_bytes(digest[:8], 'little'))
+
+    def respond(self, body: Dict[str, Any], schema: Optional[Dict[str, Any]],
+                max_tokens: Optional[int]) -> Dict[str, Any]:
+        """
+        Content, token counts and timing of the answer to a chat request.
+
+        Returns:
+            content, finish_reason, prompt_tokens, completion_tokens,
+            first_token_seconds (latency before output) and token_seconds
+        """
+        rng = self.request_rng(body)
+        prompt, images = _prompt(body.get('messages') or [])
+        if schema is not None:
+            items = [int(n) for n in _ITEM_MARKER.findall(prompt)]
+            content = json.dumps(generate(schema, schema, rng, items, self.score_range))
+        else:
+            content = self.text
+        finish_reason = "stop"
+        if max_tokens and _tokens(content) > max_tokens:
+            content = content[:max_tokens * CHARS_PER_TOKEN]
+            finish_reason = "length"
+        prompt_tokens = _tokens(prompt) + images * IMAGE_TOKENS
+        completion_tokens = _tokens(content)
+        first_token = self.latency(rng) + (prompt_tokens / self.prompt_tps if self.prompt_tps else 0.0)
+        return {
+            'content': content,
+            'finish_reason': finish_reason,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'first_token_seconds': first_token,
+            'token_seconds': 1 / self.output_tps if self.output_tps else 0.0,
+        }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Routes requests to the OpenAI and Ollama emulations."""
+
+    protocol_version = "HTTP/1.1"
+    server: MockServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logging.getLogger(__name__).debug(format % args)
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.count(status=status)
+
+    def _start_stream(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        self.server.count(status=200)
+
+    def do_GET(self) -> None:
+        path = self.path.split('?')[0]
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+        elif path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "mock", "model": "mock"}]})
+        elif path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-mock"})
+        elif path == "/mock/stats":
+            with self.server._lock:
+                stats = json.loads(json.dumps(self.server.stats))
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {path}", "type": "not_found"}})
+
+    def do_POST(self) -> None:
+        path = self.path.split('?')[0]
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+        if path == "/mock/reset":
+            self.server.reset_stats()
+            self._send_json(200, {"status": "ok"})
+            return
+        if path not in ("/v1/chat/completions", "/chat/completions", "/api/chat"):
+            self._send_json(404, {"error": {"message": f"Unknown path {path}", "type": "not_found"}})
+            return
+
+        self.server.count(requests=1)
+        fault = self.server.fault()
+        if fault:
+            status, message, retry_after = fault
+            self.server.count(**{'injected_429' if status == 429 else 'injected_5xx': 1})
+            kind = "rate_limit_error" if status == 429 else "server_error"
+            self._send_json(status, {"error": {"message": message, "type": kind, "code": kind}},
+                            {"Retry-After": f"{max(retry_after, 0.0):g}"})
+            return
+
+        self.server.acquire_slot()
+        self.server.count(in_flight=1)
+        try:
+            if path == "/api/chat":
+                self._ollama_chat(body)
+            else:
+                self._openai_chat(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timeout or cancelled stream)
+            self.close_connection = True
+        finally:
+            self.server.count(in_flight=-1)
+            self.server.release_slot()
+
+    def _openai_chat(self, body: Dict[str, Any]) -> None:
+        response_format = body.get('response_format') or {}
+        schema = None
+        if response_format.get('type') == 'json_schema':
+            schema = response_format.get('json_schema', {}).get('schema', {})
+        elif response_format.get('type') == 'json_object':
+            schema = {"type": "object", "properties": {"text": {"type": "string"}}}
+        answer = self.server.respond(body, schema, body.get('max_completion_tokens') or body.get('max_tokens'))
+        self.server.count(prompt_tokens=answer['prompt_tokens'], completion_tokens=answer['completion_tokens'])
+        model = body.get('model', 'mock')
+        completion_id = f"chatcmpl-mock-{self.server.request_rng(body).getrandbits(48):x}"
+        created = int(time.time())
+        usage = {"prompt_tokens": answer['prompt_tokens'], "completion_tokens": answer['completion_tokens'],
+                 "total_tokens": answer['prompt_tokens'] + answer['completion_tokens']}
+
+        if not body.get('stream'):
+            time.sleep(answer['first_token_seconds'] + answer['token_seconds'] * answer['completion_tokens'])
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": answer['finish_reason'], "logprobs": None,
+                             "message": {"role": "assistant", "content": answer['content'], "refusal": None}}],
+                "usage": usage,
+            })
+            return
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> None:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason, "logprobs": None}]}
+            chunk.update(extra)
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        self._start_stream("text/event-stream")
+        time.sleep(answer['first_token_seconds'])
+        event({"role": "assistant", "content": ""})
+        for piece in _TOKEN.findall(answer['content']):
+            time.sleep(answer['token_seconds'])
+            event({"content": piece})
+        event({}, answer['finish_reason'])
+        if (body.get('stream_options') or {}).get('include_usage'):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _ollama_chat(self, body: Dict[str, Any]) -> None:
+        schema = body.get('format')
+        if schema == "json":
+            schema = {"type": "object", "properties": {"text": {"type": "string"}}}
+        elif not isinstance(schema, dict):
+            schema = None
+        answer = self.server.respond(body, schema, (body.get('options') or {}).get('num_predict'))
+        self.server.count(prompt_tokens=answer['prompt_tokens'], completion_tokens=answer['completion_tokens'])
+        model = body.get('model', 'mock')
+        start = time.perf_counter()
+
+        def final(content: str) -> Dict[str, Any]:
+            total = int((time.perf_counter() - start) * 1e9)
+            prompt_ns = int(answer['first_token_seconds'] * 1e9)
+            return {"model": model, "created_at": datetime.now(timezone.utc).isoformat(),
+                    "message": {"role": "assistant", "content": content}, "done": True,
+                    "done_reason": answer['finish_reason'], "total_duration": total, "load_duration": 0,
+                    "prompt_eval_count": answer['prompt_tokens'], "prompt_eval_duration": prompt_ns,
+                    "eval_count": answer['completion_tokens'], "eval_duration": max(total - prompt_ns, 0)}
+
+        # Ollama streams unless told otherwise
+        if body.get('stream') is False:
+            time.sleep(answer['first_token_seconds'] + answer['token_seconds'] * answer['completion_tokens'])
+            self._send_json(200, final(answer['content']))
+            return
+
+        self._start_stream("application/x-ndjson")
+        time.sleep(answer['first_token_seconds'])
+        for piece in _TOKEN.findall(answer['content']):
+            time.sleep(answer['token_seconds'])
+            chunk = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(),
+                     "message": {"role": "assistant", "content": piece}, "done": False}
+            self.wfile.write((json.dumps(chunk) + "\n").encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write((json.dumps(final("")) + "\n").encode('utf-8'))
+        self.wfile.flush()
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, **options: Any) -> MockServer:
+    """Start a mock server in a background thread; stop it with shutdown()."""
+    server = MockServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server
+
+
+def main(argv: Optional[list] = None) -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Offline mock of the OpenAI, Ollama and llama-server chat APIs")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Base latency: fixed:S, uniform:MIN,MAX, normal:MEAN,SD, "
+                             "lognormal:MEDIAN,SIGMA or exponential:MEAN (seconds)")
+    parser.add_argument("--prompt-tps", type=float, default=0.0, help="Prompt tokens per second (0 = instant)")
+    parser.add_argument("--output-tps", type=float, default=0.0, help="Output tokens per second (0 = instant)")
+    parser.add_argument("--slots", type=int, default=0,
+                        help="Requests served in parallel, the rest wait (0 = unlimited)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Share of requests answered with 500")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of injected errors, seconds")
+    parser.add_argument("--rpm", type=float, default=0.0, help="Requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of contents, latencies and injected errors")
+    parser.add_argument("--text", default=DEFAULT_TEXT, help="Answer to requests without a JSON schema")
+    parser.add_argument("--text-file", help="Read the answer to requests without a JSON schema from a file")
+    parser.add_argument("--score-range", default="50,100",
+                        help="MIN,MAX of schema numbers without bounds, e.g. judge scores")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    text = args.text
+    if args.text_file:
+        with open(args.text_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+    low, high = (float(v) for v in args.score_range.split(','))
+    server = MockServer((args.host, args.port), latency=args.latency, prompt_tps=args.prompt_tps,
+                        output_tps=args.output_tps, slots=args.slots, rate_429=args.rate_429,
+                        rate_5xx=args.rate_5xx, retry_after=args.retry_after, rpm=args.rpm, seed=args.seed,
+                        text=text, score_range=(low, high))
+    logging.getLogger(__name__).info(f"Mock LLM server on {server.url} (OpenAI: {server.url}/v1, Ollama: {server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Text normalization shared by the LLM judge and the local metrics.
+
+Ground truth comes as markdown and OCR engines return plain text (or markdown,
+for the VLMs), so both sides are reduced to the same compact plain text before
+they are compared.
+"""
+
+import logging
+import re
+import unicodedata
+from pathlib import Path
+from typing import Callable, Iterable, Sequence
+
+from ground_truth_store import GroundTruthStore, write_store
+
+# Bump when the normalization output changes, so cached ground truth is rebuilt
+NORMALIZER_VERSION = 1
+
+_CODE_FENCE = re.compile(r'^\s*(```|~~~).*$', re.MULTILINE)
+_TABLE_SEPARATOR = re.compile(r'^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$', re.MULTILINE)
+_HORIZONTAL_RULE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$', re.MULTILINE)
+_HEADING = re.compile(r'^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$', re.MULTILINE)
+_BLOCKQUOTE = re.compile(r'^\s*(>\s*)+', re.MULTILINE)
+_LIST_MARKER = re.compile(r'^(\s*)([-*+]|\d{1,3}[.)])\s+(\[[ xX]\]\s+)?', re.MULTILINE)
+_IMAGE = re.compile(r'!\[([^\]]*)\]\([^)]*\)')
+_LINK = re.compile(r'\[([^\]]+)\]\([^)]*\)')
+_REFERENCE_LINK = re.compile(r'\[([^\]]+)\]\[[^\]]*\]')
+_HTML_BREAK = re.compile(r'<br\s*/?>', re.IGNORECASE)
+_HTML_TAG = re.compile(r'</?[a-zA-Z][^>]*>')
+_BOLD = re.compile(r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1')
+_ITALIC = re.compile(r'(?<![\w*])([*_])(?=\S)(.+?)(?<=\S)\1(?![\w*])')
+_STRIKE = re.compile(r'~~(.+?)~~')
+_INLINE_CODE = re.compile(r'`+([^`]*)`+')
+_ESCAPE = re.compile(r'\\([\\`*_{}\[\]()#+\-.!|>~])')
+
+# Characters NFKC leaves alone but OCR engines produce inconsistently
+_CHARACTER_MAP = str.maketrans({
+    '\u2018': "'", '\u2019': "'", '\u201a': "'", '\u201b': "'",
+    '\u201c': '"', '\u201d': '"', '\u201e': '"', '\u201f': '"',
+    '\u2010': '-', '\u2011': '-', '\u2012': '-', '\u2013': '-', '\u2014': '-', '\u2212': '-',
+    '\u00a0': ' ', '\u00ad': None, '\u200b': None, '\u200c': None, '\u200d': None, '\ufeff': None,
+})
+
+
+def markdown_to_text(text: str) -> str:
+    """
+    Strip markdown syntax, keeping only the visible text.
+
+    Handles tables (cells become space separated), headings, emphasis, links,
+    images, code, block quotes, list markers and inline HTML.
+    """
+    text = _CODE_FENCE.sub('', text)
+    text = _TABLE_SEPARATOR.sub('', text)
+    text = _HORIZONTAL_RULE.sub('', text)
+    text = _HEADING.sub(r'\1', text)
+    text = _BLOCKQUOTE.sub('', text)
+    text = _LIST_MARKER.sub(r'\1', text)
+    text = _IMAGE.sub(r'\1', text)
+    text = _LINK.sub(r'\1', text)
+    text = _REFERENCE_LINK.sub(r'\1', text)
+    text = _HTML_BREAK.sub('\n', text)
+    text = _HTML_TAG.sub(' ', text)
+    text = _INLINE_CODE.sub(r'\1', text)
+    text = _BOLD.sub(r'\2', text)
+    text = _ITALIC.sub(r'\2', text)
+    text = _STRIKE.sub(r'\1', text)
+
+    # Table rows: drop the outer pipes, cells become space separated
+    lines = []
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if stripped.count('|') >= 2 or (stripped.startswith('|') and stripped.endswith('|')):
+            line = ' '.join(cell.strip() for cell in stripped.strip('|').split('|'))
+        lines.append(line)
+    text = '\n'.join(lines)
+
+    return _ESCAPE.sub(r'\1', text)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize Unicode and whitespace.
+
+    Applies NFKC, maps typographic quotes/dashes to ASCII, removes invisible
+    characters, collapses runs of spaces and drops empty lines.
+    """
+    text = unicodedata.normalize('NFKC', text).translate(_CHARACTER_MAP)
+    lines = (' '.join(line.split()) for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def normalize(text: str) -> str:
+    """Full normalization applied to both ground truth and OCR output."""
+    if not text:
+        return ""
+    return normalize_text(markdown_to_text(text))
+
+
+def cached_normalized_ground_truth(load_texts: Callable[[], Iterable[str]], dataset_version: str,
+                                   cache_dir: Path) -> Sequence[str]:
+    """
+    Return normalized ground truth, normalizing it only once per dataset version.
+
+    Args:
+        load_texts: Called on a cache miss to get the raw markdown ground truth,
+            so the dataset column is only read when needed
+        dataset_version: Identifies the dataset contents (e.g. its fingerprint)
+        cache_dir: Directory for the cache files
+
+    Returns:
+        Memory-mapped sequence of normalized ground truth texts, in dataset order
+    """
+    logger = logging.getLogger(__name__)
+    cache_dir = Path(cache_dir)
+    safe_version = re.sub(r'[^\w.-]', '_', dataset_version)
+    cache_file = cache_dir / f"ground_truth_{safe_version}_v{NORMALIZER_VERSION}.gts"
+
+    if cache_file.exists():
+        try:
+            return GroundTruthStore(cache_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable ground truth cache {cache_file}: {e}")
+
+    metadata = {'dataset_version': dataset_version, 'normalizer_version': NORMALIZER_VERSION}
+    write_store(cache_file, (normalize(text) for text in load_texts()), metadata)
+    logger.info(f"Cached normalized ground truth: {cache_file}")
+    return GroundTruthStore(cache_file)
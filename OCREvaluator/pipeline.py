@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline: grade OCR results while the runners are still producing them.
+
+    OCR runners --(bounded queue)--> normalize + pair --> judge --> result log
+
+The TestsPart1 runners run in a producer thread. Each page's text is saved to
+<ocr-dir>/<engine>/ like TestsPart1's main.py does, then queued as
+(engine, index, text). The grader takes up to --grade-batch queued pages at
+a time, pairs them with the benchmark ground truth and grades them with the
+usual judge options (local metrics, LLM judge, batching, chunking, cache).
+When grading falls behind, the queue fills up and the runners wait, so at
+most --queue-size pages are held in memory. The total time then approaches
+the slower of OCR and grading instead of their sum.
+
+The runners need the TestsPart1 environment, for example:
+    uv run --project ../TestsPart1 --with pandas --with tqdm pipeline.py --engines llamacpp
+"""
+
+import argparse
+import importlib.util
+import logging
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from dotenv import load_dotenv
+from tqdm import tqdm
+
+import comparison
+import main
+import normalization
+from ground_truth_store import DEFAULT_DATASET
+from judge_cache import JudgeCache
+from judge_executor import RateLimiter
+from ocr_common.profiling import Profiler
+from ocr_common.telemetry import Gauge, Telemetry
+from results_manager import ResultsManager
+
+TESTS_PART1_SRC = Path(__file__).resolve().parent.parent / "TestsPart1" / "src"
+# Pages waiting between the runners and the grader
+QUEUE_SIZE = 32
+# Most pages handed to the judge at once
+GRADE_BATCH = 16
+# Marks the end of the runners' output
+_DONE = None
+
+
+def load_runners(src_dir: Optional[Path] = None):
+    """TestsPart1's main module (TEST_RUNNERS, ocr_item, save_item), loaded under its own name."""
+    src_dir = src_dir or TESTS_PART1_SRC
+    sys.path.insert(0, str(src_dir))
+    spec = importlib.util.spec_from_file_location("ocr_runners", src_dir / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class PipelineStats:
+    """Where the time of a pipeline run went, to see how well OCR and grading overlapped."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.started = time.monotonic()
+        self.pages = 0
+        self.ocr_failures = 0
+        self.ocr_seconds = 0.0
+        self.runner_blocked_seconds = 0.0
+        self.grade_seconds = 0.0
+        self.grader_idle_seconds = 0.0
+        self.peak_queue = 0
+
+    def summary(self) -> Dict[str, Any]:
+        wall = time.monotonic() - self.started
+        busy = self.ocr_seconds + self.grade_seconds
+        return {
+            'pages': self.pages,
+            'ocr_failures': self.ocr_failures,
+            'wall_seconds': round(wall, 3),
+            'ocr_seconds': round(self.ocr_seconds, 3),
+            'grade_seconds': round(self.grade_seconds, 3),
+            'sequential_seconds': round(busy, 3),
+            # 1 = no overlap (OCR then grading), 2 = perfect overlap of equal stages
+            'overlap': round(busy / wall, 3) if wall > 0 else None,
+            'runner_blocked_seconds': round(self.runner_blocked_seconds, 3),
+            'grader_idle_seconds': round(self.grader_idle_seconds, 3),
+            'queue_size': self.queue_size,
+            'peak_queue': self.peak_queue,
+        }
+
+
+def produce(runners, engines: Sequence[str], dataset, indices: Sequence[int], ocr_dir: Path,
+            pages: queue.Queue, skip: Dict[str, Set[int]], reuse: bool, stats: PipelineStats,
+            stop: threading.Event, profiler: Profiler, metrics, pending: Gauge) -> None:
+    """
+    Run each engine over the dataset and queue its pages, blocking while the queue is full.
+
+    Args:
+        runners: TestsPart1's main module
+        engines: Engines to run, one after the other
+        dataset: Benchmark split with the page images
+        indices: Dataset indices to run
+        ocr_dir: Where the OCR texts and timings are saved, one sub-folder per engine
+        pages: Queue of (engine, index, text), ended with None
+        skip: Engine -> indices already graded
+        reuse: Read existing OCR files instead of running the engine again
+        stats: Runner-side counters
+        stop: Set by the grader when it gives up
+        profiler: Profiles each engine call under the engine's name
+        metrics: TestsPart1's RunnerMetrics
+        pending: Items left to grade, lowered for pages that never reach the grader
+    """
+    def put(item):
+        start = time.monotonic()
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        stats.runner_blocked_seconds += time.monotonic() - start
+        stats.peak_queue = max(stats.peak_queue, pages.qsize())
+
+    try:
+        for engine in engines:
+            engine_dir = ocr_dir / engine
+            engine_dir.mkdir(parents=True, exist_ok=True)
+            for index in indices:
+                if stop.is_set():
+                    return
+                if index in skip.get(engine, ()):
+                    continue
+                metrics.index.set(index, engine=engine)
+                text_file = engine_dir / f"{index}{engine}.txt"
+                if reuse and text_file.exists():
+                    put((engine, index, text_file.read_text(encoding="utf-8")))
+                    continue
+                image = dataset[index]["image"]
+                if not hasattr(image, "size"):
+                    logging.warning(f"{engine}: item {index} is not an image, skipped")
+                    metrics.skipped.inc(engine=engine)
+                    pending.inc(-1)
+                    continue
+                try:
+                    with profiler.section(engine):
+                        text, elapsed = runners.ocr_item(engine, runners.TEST_RUNNERS[engine], image)
+                except Exception as e:
+                    logging.error(f"{engine}: OCR of item {index} failed: {e}")
+                    stats.ocr_failures += 1
+                    metrics.errors.inc(engine=engine)
+                    pending.inc(-1)
+                    continue
+                runners.save_item(str(engine_dir), engine, index, text, elapsed)
+                metrics.page(engine, elapsed)
+                stats.ocr_seconds += elapsed
+                put((engine, index, text))
+    finally:
+        put(_DONE)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Run the OCR engines and grade their output as it is produced")
+    parser.add_argument("--engines", default="llamacpp",
+                        help="Comma-separated TestsPart1 engines (keys of TEST_RUNNERS), run one after the other")
+    parser.add_argument("--start", type=int, default=0, help="First dataset index")
+    parser.add_argument("--limit", type=int, help="Number of dataset items (default: all)")
+    parser.add_argument("--ocr-dir", type=Path, default=main.OCR_DIR,
+                        help="Where the OCR texts are saved, one sub-folder per engine")
+    parser.add_argument("--output-dir", type=Path, default=main.RESULTS_DIR, help="Where to write results")
+    parser.add_argument("--ground-truth-store", type=Path, default=main.CACHE_DIR / "ground_truth.gts",
+                        help="Ground truth exported from the benchmark dataset; created on first use")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="Pages waiting to be graded before the runners pause")
+    parser.add_argument("--grade-batch", type=int, default=GRADE_BATCH,
+                        help="Most queued pages handed to the judge at once")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip items already graded for an engine and judge model, and reuse "
+                             "existing OCR files instead of running the engine again")
+    main.add_judge_arguments(parser)
+    main.add_profile_arguments(parser)
+    main.add_telemetry_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.profile == "cprofile":
+        # Engine calls and grading run in different threads at the same time, and
+        # from Python 3.12 cProfile can only profile one of them
+        parser.error("--profile cprofile cannot profile the concurrent stages of the pipeline, use --profile sample")
+    return args
+
+
+def run_pipeline(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run the engines and grade their pages as they come.
+
+    Returns:
+        PipelineStats.summary() of the run
+    """
+    from datasets import load_dataset
+
+    engines = [engine for engine in args.engines.split(",") if engine]
+    runners = load_runners()
+    unknown = [engine for engine in engines if engine not in runners.TEST_RUNNERS]
+    if unknown:
+        raise ValueError(f"Unknown engines: {', '.join(unknown)} (known: {', '.join(runners.TEST_RUNNERS)})")
+
+    ground_truths = main.load_ground_truth(args.ground_truth_store)
+    dataset = load_dataset(DEFAULT_DATASET)["test"]
+    end = len(dataset) if args.limit is None else min(len(dataset), args.start + args.limit)
+    indices = range(args.start, end)
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    results_manager = ResultsManager(args.output_dir)
+    judge_model = "local" if args.judge == "local" else args.model
+    skip = {}
+    previous_results = []
+    if args.resume:
+        for engine in engines:
+            done = {index: result for index, result in results_manager.latest_results(engine, judge_model).items()
+                    if index in indices}
+            skip[engine] = set(done)
+            previous_results.extend(done[index] for index in sorted(done))
+            logging.info(f"Resuming {engine}: {len(done)} items already graded")
+
+    cache = None
+    if not args.no_cache:
+        max_bytes = int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None
+        cache = JudgeCache(args.cache, max_bytes=max_bytes)
+    # Every queue group is graded in its own grade_pairs call; one limiter keeps
+    # --rpm/--tpm across them
+    limiter = RateLimiter(args.rpm, args.tpm)
+
+    profiler = Profiler(args.profile_dir or args.output_dir / "profile", args.profile)
+    profiler.start()
+    stats = PipelineStats(args.queue_size)
+    pages = queue.Queue(maxsize=args.queue_size)
+    telemetry = Telemetry(args.metrics_port, args.metrics_file, args.metrics_interval)
+    queue_depth = telemetry.gauge("pipeline_queue_depth", "Pages waiting between the runners and the grader")
+    telemetry.add_collector(lambda: queue_depth.set(pages.qsize()))
+    grading_metrics = main.GradingMetrics(telemetry)
+    total = sum(len(indices) - len(skip.get(engine, ())) for engine in engines)
+    grading_metrics.pending.set(total)
+    telemetry.start()
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=produce, name="ocr-runners",
+        args=(runners, engines, dataset, indices, args.ocr_dir, pages, skip, args.resume, stats, stop, profiler,
+              runners.RunnerMetrics(telemetry), grading_metrics.pending))
+    producer.start()
+
+    all_results, failed_files = [], []
+    try:
+        with tqdm(total=total, desc="OCR + grading") as pbar:
+            finished = False
+            while not finished:
+                start = time.monotonic()
+                group = [pages.get()]
+                stats.grader_idle_seconds += time.monotonic() - start
+                # Whatever else is already waiting joins this round, up to --grade-batch
+                while len(group) < args.grade_batch:
+                    try:
+                        group.append(pages.get_nowait())
+                    except queue.Empty:
+                        break
+                if _DONE in group:
+                    finished = True
+                    group = [page for page in group if page is not _DONE]
+                if not group:
+                    continue
+
+                # Pairs are numbered within the group; items maps them back
+                items = [(engine, index) for engine, index, _ in group]
+                pairs = [(normalization.normalize(text), ground_truths[index], i)
+                         for i, (engine, index, text) in enumerate(group)]
+
+                def on_result(result):
+                    engine, index = items[result['index']]
+                    result = dict(result, index=index, source=engine, model=judge_model, judge=args.judge)
+                    results_manager.save_result(result)
+                    all_results.append(result)
+                    grading_metrics.result(result)
+                    pbar.update(1)
+
+                def on_error(pair, error):
+                    engine, index = items[pair[2]]
+                    results_manager.save_failure(index, str(error), source=engine, model=judge_model,
+                                                 judge=args.judge)
+                    failed_files.append(f"{engine}/{index}")
+                    grading_metrics.failure(engine)
+                    pbar.update(1)
+
+                start = time.monotonic()
+                with profiler.section("grade"):
+                    main.grade_pairs(pairs, args, on_result=on_result, on_error=on_error, cache=cache,
+                                     limiter=limiter)
+                stats.grade_seconds += time.monotonic() - start
+                stats.pages += len(group)
+    finally:
+        stop.set()
+        producer.join()
+        if cache is not None:
+            cache.close()
+        profiler.stop()
+        telemetry.stop()
+
+    all_results = sorted(previous_results + all_results, key=lambda r: (r['index'], r['source']))
+
+    def texts(source, index):
+        # Read back from disk, so the report does not keep every page in memory
+        text_file = args.ocr_dir / source / f"{index}{source}.txt"
+        if not text_file.exists():
+            return None
+        return normalization.normalize(text_file.read_text(encoding="utf-8")), ground_truths[index]
+
+    results_manager.generate_final_report(all_results, failed_files, texts=texts)
+    if len(engines) > 1:
+        timings = {engine: comparison.read_timings(args.ocr_dir / engine) for engine in engines}
+        results_manager.generate_comparison_report(comparison.build_comparison(all_results, timings))
+    summary = stats.summary()
+    results_manager.save_pipeline_report(summary)
+    results_manager.close()
+    return summary
+
+
+def main_pipeline(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point."""
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_args(argv)
+    try:
+        summary = run_pipeline(args)
+    except Exception as e:
+        logging.error(f"Fatal error: {e}")
+        return 1
+    logging.info(f"Pipeline: {summary['pages']} pages in {summary['wall_seconds']:.1f}s "
+                 f"(OCR {summary['ocr_seconds']:.1f}s, grading {summary['grade_seconds']:.1f}s, "
+                 f"overlap {summary['overlap']}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_pipeline())
@@ -0,0 +1,70 @@
+"""
+Judge model prices and typical speeds, for cost reports and estimates.
+"""
+
+from typing import Dict, Optional, Tuple
+
+# USD per million (input, output) tokens. Dated model names such as
+# gpt-4o-mini-2024-07-18 match their family by the longest prefix.
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "claude-3-haiku": (0.25, 1.25),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-sonnet": (3.00, 15.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-opus": (15.00, 75.00),
+}
+
+# Typical request speed: (seconds of fixed latency, prompt tokens per second,
+# output tokens per second). Measured runs can rescale these, see
+# cost_estimator.measured_speed_factor.
+THROUGHPUT: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.5, 20000.0, 80.0),
+    "gpt-4o": (0.6, 10000.0, 60.0),
+    "gpt-4.1-nano": (0.4, 25000.0, 100.0),
+    "gpt-4.1-mini": (0.5, 20000.0, 80.0),
+    "gpt-4.1": (0.6, 10000.0, 60.0),
+    "claude-3-haiku": (0.5, 20000.0, 120.0),
+    "claude-3-5-haiku": (0.6, 15000.0, 60.0),
+    "claude-3-sonnet": (1.0, 8000.0, 50.0),
+    "claude-3-5-sonnet": (1.0, 8000.0, 60.0),
+    "claude-3-opus": (2.0, 4000.0, 25.0),
+}
+DEFAULT_THROUGHPUT = (1.0, 8000.0, 50.0)
+
+
+def model_family(model: str) -> str:
+    """Longest known family name that prefixes model, or model itself."""
+    matches = [name for name in PRICES if model.startswith(name)]
+    return max(matches, key=len) if matches else model
+
+
+def _lookup(table: Dict[str, Tuple], model: str) -> Optional[Tuple]:
+    """Entry of the longest model family name that prefixes model."""
+    matches = [name for name in table if model.startswith(name)]
+    if not matches:
+        return None
+    return table[max(matches, key=len)]
+
+
+def model_price(model: str) -> Optional[Tuple[float, float]]:
+    """(input, output) USD per million tokens of a model, or None if unknown."""
+    return _lookup(PRICES, model)
+
+
+def request_seconds(model: str, prompt_tokens: float, completion_tokens: float) -> float:
+    """Expected latency of one request."""
+    base, prompt_speed, output_speed = _lookup(THROUGHPUT, model) or DEFAULT_THROUGHPUT
+    return base + prompt_tokens / prompt_speed + completion_tokens / output_speed
+
+
+def cost(model: str, prompt_tokens: float, completion_tokens: float) -> Optional[float]:
+    """USD cost of a request, or None for a model without a known price."""
+    price = model_price(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
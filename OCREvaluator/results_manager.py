@@ -4,138 +4,266 @@ Results management module for storing and reporting OCR grading results.
 
 import json
 import logging
+import os
+import time
 import pandas as pd
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 from datetime import datetime
 import csv
 
+import arrow_export
+import comparison
+from html_report import TextLookup, write_item_report
+from stats import SummaryAggregator
+
+CSV_FIELDS = ['index', 'source', 'model', 'judge', 'overall_score', 'character_accuracy', 'word_accuracy', 'confidence_level', 'error']
+
 
 class ResultsManager:
     """Manages storage and reporting of OCR grading results."""
     
-    def __init__(self, output_dir: Path):
+    def __init__(self, output_dir: Path, fsync_every: int = 50, fsync_interval: float = 5.0):
+        """
+        Args:
+            output_dir: Directory for results and reports
+            fsync_every: Force the result log to disk after this many results
+            fsync_interval: ...or after this many seconds, whichever comes first
+        """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.logger = logging.getLogger(__name__)
         
         # File paths
+        self.log_file = self.output_dir / "grading_results.jsonl"
         self.results_file = self.output_dir / "grading_results.json"
         self.csv_file = self.output_dir / "grading_results.csv"
         self.summary_file = self.output_dir / "summary_report.json"
         self.detailed_report = self.output_dir / "detailed_report.html"
+        self.report_dir = self.output_dir / "report"
         self.progress_file = self.output_dir / "progress.json"
+        self.comparison_file = self.output_dir / "engine_comparison.json"
+        self.comparison_csv = self.output_dir / "engine_comparison.csv"
+        self.cascade_file = self.output_dir / "cascade_report.json"
+        self.pipeline_file = self.output_dir / "pipeline_report.json"
+        self.adaptive_file = self.output_dir / "adaptive_report.json"
+        self.parquet_dir = self.output_dir / "grading_results.parquet"
+        
+        # Append-only result log; JSON/CSV are materialized from it by compact()
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._log = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        # Live statistics of this run only, updated by save_result; the log may
+        # also hold earlier runs, other engines and other judge models
+        self.run_started = datetime.now().isoformat()
+        self.total_processed = 0
+        self.total_failed = 0
+        self.aggregator = SummaryAggregator()
     
     def save_result(self, result: Dict[str, Any]) -> None:
         """
-        Save a batch of results incrementally.
+        Append one result to the result log.
+        
+        Each line is flushed to the OS immediately, so a killed process loses
+        nothing; fsync is batched to keep disk syncs off the hot path.
         
         Args:
-            batch_results: List of grading result dictionaries
+            result: Grading result dictionary
         """
         try:
-            # Load existing results
-            existing_results = []
-            if self.results_file.exists():
-                with open(self.results_file, 'r') as f:
-                    existing_results = json.load(f)
-            
-            # Append new results
-            existing_results.append(result)
-            
-            # Save updated results
-            with open(self.results_file, 'w') as f:
-                json.dump(existing_results, f, indent=2)
+            if self._log is None:
+                self._log = open(self.log_file, 'a', encoding='utf-8')
+            self._log.write(json.dumps(result) + "\n")
+            self._log.flush()
+            self._unsynced += 1
+            self.total_processed += 1
+            self.total_failed += bool(result.get('error'))
+            self.aggregator.add(result)
             
-            # Also save as CSV for easy analysis
-            self._save_to_csv(existing_results)
-            
-            # Update progress
-            self._update_progress(len(existing_results))
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
             
         except Exception as e:
-            self.logger.error(f"Error saving batch results: {e}")
+            self.logger.error(f"Error saving result: {e}")
             raise
     
-    def _save_to_csv(self, results: List[Dict[str, Any]]) -> None:
-        """Save results to CSV format for easy analysis."""
-        try:
-            # Flatten the results for CSV
-            flattened_results = []
-            
-            for result in results:
-                if 'refusal' in result:
-                    # Handle error cases
-                    flattened_results.append({
-                        'index': result.get('index'),
-                        'overall_score': None,
-                        'character_accuracy': None,
-                        'word_accuracy': None,
-                        'confidence_level': None,
-                        'error': result.get('refusal', ''),
-                    })
-                else:
-                    # Handle successful grading
-                    flattened_results.append({
-                        'index': result.get('index'),
-                        'overall_score': result.get('overall_score'),
-                        'character_accuracy': result.get('character_accuracy'),
-                        'word_accuracy': result.get('word_accuracy'),
-                        'confidence_level': result.get('confidence_level'),
-                        'error': '',
-                    })
+    def _sync(self) -> None:
+        """Force buffered results to disk and update progress."""
+        if self._log is not None and self._unsynced:
+            os.fsync(self._log.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._update_progress(self.total_processed, self.total_failed)
+    
+    def close(self) -> None:
+        """Sync and close the result log."""
+        if self._log is not None:
+            self._sync()
+            self._log.close()
+            self._log = None
+    
+    def iter_results(self) -> Iterator[Dict[str, Any]]:
+        """Stream results from the log without loading them all."""
+        if not self.log_file.exists():
+            return
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    self.logger.warning(f"Skipping unreadable line in {self.log_file}")
+    
+    def iter_latest(self) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the latest record of every (source, model, index), in index order.
+        
+        A later failure does not replace an earlier success. Only the byte
+        offset of each item's record is held in memory; records are read back
+        one at a time.
+        """
+        if self._log is not None:
+            self._sync()
+        if not self.log_file.exists():
+            return
+        latest: Dict[Tuple, Tuple[int, bool]] = {}
+        with open(self.log_file, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                order = comparison.index_order(result.get('index'))
+                key = (order, str(result.get('source', '')), str(result.get('model', '')))
+                ok = not result.get('error') and 'refusal' not in result
+                if ok or not latest.get(key, (0, False))[1]:
+                    latest[key] = (offset, ok)
+                offset += len(line)
             
-            # Write to CSV
-            if flattened_results:
-                df = pd.DataFrame(flattened_results)
-                df.to_csv(self.csv_file, index=False)
-                
-        except Exception as e:
-            self.logger.error(f"Error saving to CSV: {e}")
+            for key in sorted(latest):
+                f.seek(latest[key][0])
+                yield json.loads(f.readline())
+    
+    def compact(self) -> None:
+        """
+        Materialize the JSON and CSV result files from the log, streaming.
+        
+        Only the latest record of every (source, model, index) is written, so
+        failures retried later and reruns do not show up twice.
+        """
+        if self._log is not None:
+            self._sync()
+        with open(self.results_file, 'w', encoding='utf-8') as json_out, \
+                open(self.csv_file, 'w', newline='', encoding='utf-8') as csv_out:
+            writer = csv.DictWriter(csv_out, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            json_out.write("[")
+            for i, result in enumerate(self.iter_latest()):
+                json_out.write(("," if i else "") + "\n  " + json.dumps(result))
+                writer.writerow(self._flatten_result(result))
+            json_out.write("\n]\n")
     
-    def _update_progress(self, total_processed: int) -> None:
-        """Update progress tracking."""
+    def _flatten_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten one result into a CSV row."""
+        identity = {key: result.get(key) for key in ('index', 'source', 'model', 'judge')}
+        if 'refusal' in result or result.get('error'):
+            # Handle error cases
+            return {
+                **identity,
+                'overall_score': None,
+                'character_accuracy': None,
+                'word_accuracy': None,
+                'confidence_level': None,
+                'error': result.get('refusal') or result.get('error', ''),
+            }
+        # Handle successful grading
+        return {
+            **identity,
+            'overall_score': result.get('overall_score'),
+            'character_accuracy': result.get('character_accuracy'),
+            'word_accuracy': result.get('word_accuracy'),
+            'confidence_level': result.get('confidence_level'),
+            'error': '',
+        }
+    
+    def _update_progress(self, total_processed: int, total_failed: int = 0) -> None:
+        """
+        Update progress tracking.
+        
+        The result log itself is the resume point; this file only tells a
+        monitoring process how far the current run got.
+        """
         progress = {
+            'run_started': self.run_started,
             'total_processed': total_processed,
-            'last_updated': datetime.now().isoformat()
+            'failed': total_failed,
+            'result_log': self.log_file.name,
+            'last_updated': datetime.now().isoformat(),
+            'summary': self.aggregator.snapshot(),
+            # Mergeable statistics state, see SummaryAggregator.from_dict
+            'aggregator_state': self.aggregator.to_dict()
         }
         
         with open(self.progress_file, 'w') as f:
             json.dump(progress, f, indent=2)
     
-    def get_processed_files(self) -> set:
-        """Get set of already processed filenames for resume functionality."""
+    def save_failure(self, index: int, error: str, **fields: Any) -> None:
+        """
+        Record a pair that could not be graded, so it is retried on resume.
+        
+        Args:
+            index: Dataset index of the pair
+            error: Error message
+            fields: Extra identifying fields (source, model, ...)
+        """
+        self.save_result({'index': index, **fields, 'error': error})
+    
+    def latest_results(self, source: Optional[str] = None, model: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Latest successful result per dataset index, read from the result log.
+        
+        Args:
+            source: Only results of this engine/source (None = any)
+            model: Only results of this judge model (None = any)
+        """
+        latest = {}
+        for result in self.iter_results():
+            if source is not None and result.get('source') != source:
+                continue
+            if model is not None and result.get('model') != model:
+                continue
+            if result.get('error') or 'refusal' in result:
+                continue
+            latest[result['index']] = result
+        return latest
+    
+    def get_processed_indices(self, source: Optional[str] = None, model: Optional[str] = None) -> set:
+        """Get set of already graded dataset indices for resume functionality."""
         try:
-            if not self.results_file.exists():
-                return set()
-            
-            with open(self.results_file, 'r') as f:
-                results = json.load(f)
-            
-            processed = set()
-            for result in results:
-                if 'filename' in result:
-                    # Remove .txt extension for matching
-                    filename = result['filename']
-                    if filename.endswith('.txt'):
-                        filename = filename[:-4]
-                    processed.add(filename)
-            
-            return processed
-            
+            return set(self.latest_results(source, model))
         except Exception as e:
-            self.logger.error(f"Error getting processed files: {e}")
+            self.logger.error(f"Error getting processed indices: {e}")
             return set()
     
-    def generate_final_report(self, all_results: List[Dict[str, Any]], failed_files: List[str]) -> None:
+    def generate_final_report(self, all_results: List[Dict[str, Any]], failed_files: List[str],
+                              texts: Optional[TextLookup] = None) -> None:
         """
         Generate comprehensive final report.
         
         Args:
             all_results: All grading results
             failed_files: List of files that failed processing
+            texts: (ocr_text, ground_truth) of a (source, index), for the per-item diff pages
         """
         try:
+            # Materialize JSON/CSV from the result log
+            self.compact()
+            
             # Calculate summary statistics
             summary = self._calculate_summary_stats(all_results, failed_files)
             
@@ -143,7 +271,8 @@ class ResultsManager:
             with open(self.summary_file, 'w') as f:
                 json.dump(summary, f, indent=2)
             
-            # Generate HTML report
+            # Generate HTML reports
+            self.generate_item_report(texts)
             self._generate_html_report(summary, all_results)
             
             self.logger.info(f"Final report generated: {self.summary_file}")
@@ -152,67 +281,95 @@ class ResultsManager:
             self.logger.error(f"Error generating final report: {e}")
             raise
     
+    def generate_item_report(self, texts: Optional[TextLookup] = None) -> int:
+        """
+        Write the paginated per-item report (report/items.html) from the result log.
+        
+        Args:
+            texts: (ocr_text, ground_truth) of a (source, index), or None to leave out the diffs
+            
+        Returns:
+            Number of items in the report
+        """
+        return write_item_report(self.iter_latest(), self.report_dir, texts)
+    
+    def generate_comparison_report(self, comparison: Dict[str, Any]) -> None:
+        """
+        Save a cross-engine comparison built by comparison.build_comparison.
+        
+        Args:
+            comparison: Per-engine statistics and the per-item score matrix
+        """
+        with open(self.comparison_file, 'w') as f:
+            json.dump(comparison, f, indent=2)
+        
+        engines = comparison['engines']
+        fields = ['index'] + engines + [f'{engine}_latency' for engine in engines] + ['winner']
+        with open(self.comparison_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(comparison['items'])
+        
+        self.logger.info(f"Engine comparison generated: {self.comparison_file}")
+    
+    def save_cascade_report(self, summary: Dict[str, Any]) -> None:
+        """
+        Save the cost and latency summary of a judge cascade.
+        
+        Args:
+            summary: CascadeReport.summary() of the run
+        """
+        with open(self.cascade_file, 'w') as f:
+            json.dump(summary, f, indent=2)
+        
+        self.logger.info(f"Cascade report generated: {self.cascade_file}")
+    
+    def save_pipeline_report(self, summary: Dict[str, Any]) -> None:
+        """
+        Save how the time of a pipelined OCR + grading run was spent.
+        
+        Args:
+            summary: PipelineStats.summary() of the run
+        """
+        with open(self.pipeline_file, 'w') as f:
+            json.dump(summary, f, indent=2)
+        
+        self.logger.info(f"Pipeline report generated: {self.pipeline_file}")
+    
+    def save_adaptive_report(self, report: Dict[str, Any]) -> None:
+        """
+        Save how many items an adaptive run needed and the intervals it stopped at.
+        
+        Args:
+            report: AdaptiveSampler.report() of the run
+        """
+        with open(self.adaptive_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        
+        self.logger.info(f"Adaptive report generated: {self.adaptive_file}")
+    
     def _calculate_summary_stats(self, results: List[Dict[str, Any]], failed_files: List[str]) -> Dict:
-        """Calculate summary statistics from results."""
-        successful_results = [r for r in results if 'error' not in r or not r['error']]
+        """Calculate summary statistics from results in one streaming pass."""
+        aggregator = SummaryAggregator().add_all(results)
+        total_files = aggregator.successful + aggregator.failed + len(failed_files)
         
-        if not successful_results:
+        if not aggregator.successful:
             return {
-                'total_files': len(results) + len(failed_files),
+                'total_files': total_files,
                 'successful': 0,
-                'failed': len(results) + len(failed_files),
+                'failed': total_files,
                 'error': 'No successful results to analyze'
             }
         
-        # Extract scores
-        overall_scores = [r.get('overall_score', 0) for r in successful_results if r.get('overall_score') is not None]
-        char_accuracies = [r.get('character_accuracy', 0) for r in successful_results if r.get('character_accuracy') is not None]
-        word_accuracies = [r.get('word_accuracy', 0) for r in successful_results if r.get('word_accuracy') is not None]
-        
-        # Calculate statistics
         summary = {
-            'total_files': len(results) + len(failed_files),
-            'successful': len(successful_results),
-            'failed': len(results) - len(successful_results) + len(failed_files),
+            'total_files': total_files,
+            'successful': aggregator.successful,
+            'failed': aggregator.failed + len(failed_files),
             'processing_date': datetime.now().isoformat(),
-            
-            'overall_score_stats': {
-                'mean': sum(overall_scores) / len(overall_scores) if overall_scores else 0,
-                'min': min(overall_scores) if overall_scores else 0,
-                'max': max(overall_scores) if overall_scores else 0,
-                'count': len(overall_scores)
-            },
-            
-            'character_accuracy_stats': {
-                'mean': sum(char_accuracies) / len(char_accuracies) if char_accuracies else 0,
-                'min': min(char_accuracies) if char_accuracies else 0,
-                'max': max(char_accuracies) if char_accuracies else 0,
-                'count': len(char_accuracies)
-            },
-            
-            'word_accuracy_stats': {
-                'mean': sum(word_accuracies) / len(word_accuracies) if word_accuracies else 0,
-                'min': min(word_accuracies) if word_accuracies else 0,
-                'max': max(word_accuracies) if word_accuracies else 0,
-                'count': len(word_accuracies)
-            }
         }
-        
-        # Score distribution
-        score_ranges = {'0-20': 0, '21-40': 0, '41-60': 0, '61-80': 0, '81-100': 0}
-        for score in overall_scores:
-            if score <= 20:
-                score_ranges['0-20'] += 1
-            elif score <= 40:
-                score_ranges['21-40'] += 1
-            elif score <= 60:
-                score_ranges['41-60'] += 1
-            elif score <= 80:
-                score_ranges['61-80'] += 1
-            else:
-                score_ranges['81-100'] += 1
-        
-        summary['score_distribution'] = score_ranges
+        snapshot = aggregator.snapshot()
+        del snapshot['successful'], snapshot['failed']
+        summary.update(snapshot)
         
         return summary
     
@@ -242,6 +399,7 @@ class ResultsManager:
             <div class="header">
                 <h1>OCR Accuracy Grading Report</h1>
                 <p>Generated on: {summary.get('processing_date', 'Unknown')}</p>
+                <p><a href="report/items.html">Per-item results</a></p>
             </div>
             
             <div class="summary">
@@ -288,16 +446,41 @@ class ResultsManager:
         with open(self.detailed_report, 'w') as f:
             f.write(html_content)
     
+    def export_parquet(self, run_id: Optional[str] = None,
+                       timings: Optional[Dict[str, Dict[int, float]]] = None,
+                       item_metadata: Optional[Any] = None,
+                       dataset: Optional[Dict[str, Any]] = None) -> Path:
+        """
+        Export the latest result of every item to the Parquet dataset, streaming.
+        
+        Args:
+            run_id: Partition name of this run (default: current time)
+            timings: Engine -> index -> OCR seconds
+            item_metadata: Per-index dataset metadata (JSON strings)
+            dataset: Dataset-level metadata (dataset, split, fingerprint)
+            
+        Returns:
+            Path to the run's partition
+        """
+        run_id = run_id or datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+        arrow_export.export_results(self.iter_latest(), self.parquet_dir, run_id,
+                                    timings, item_metadata, dataset)
+        return self.parquet_dir / f"run={run_id}"
+    
     def export_for_analysis(self, format: str = "csv") -> Path:
         """
         Export results in specified format for further analysis.
         
         Args:
-            format: Export format ("csv", "json", "excel")
+            format: Export format ("csv", "json", "excel", "parquet")
             
         Returns:
             Path to exported file
         """
+        if format == "parquet":
+            return self.export_parquet()
+        if not self.csv_file.exists():
+            self.compact()
         if format == "csv":
             return self.csv_file
         elif format == "json":
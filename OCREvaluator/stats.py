@@ -0,0 +1,257 @@
+"""
+Streaming, mergeable summary statistics for grading results.
+
+Everything here runs in constant memory per metric: Welford's algorithm for
+mean/variance and a logarithmic-bucket quantile sketch (as in DDSketch) for
+percentiles. Aggregators from separate shards or runs can be merged and
+serialized, so summaries never need the full result list.
+"""
+
+import math
+from typing import Any, Dict, Iterable, Optional
+
+METRICS = ('overall_score', 'character_accuracy', 'word_accuracy')
+PERCENTILES = (10, 50, 90)
+SCORE_RANGES = (('0-20', 20), ('21-40', 40), ('41-60', 60), ('61-80', 80), ('81-100', float('inf')))
+
+
+class QuantileSketch:
+    """
+    Quantile sketch with a fixed relative accuracy.
+
+    Values are counted in buckets whose bounds grow geometrically, so any
+    quantile is returned within `relative_accuracy` of the true value and the
+    number of buckets only depends on the range of the data.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        # Midpoint of the bucket (gamma^(key-1), gamma^key]
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float) -> None:
+        """Count one value."""
+        if value > 0:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < 0:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zero += 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Add the counts of another sketch with the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile (0 <= q <= 1), or None if empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'positive': {str(k): v for k, v in self.positive.items()},
+            'negative': {str(k): v for k, v in self.negative.items()},
+            'zero': self.zero,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data['relative_accuracy'])
+        sketch.positive = {int(k): v for k, v in data['positive'].items()}
+        sketch.negative = {int(k): v for k, v in data['negative'].items()}
+        sketch.zero = data['zero']
+        sketch.count = sketch.zero + sum(sketch.positive.values()) + sum(sketch.negative.values())
+        return sketch
+
+
+class RunningStats:
+    """Count, mean, variance, min, max (Welford) plus percentiles of one metric."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other: "RunningStats") -> None:
+        """Combine with stats of a disjoint set of values (Chan et al.)."""
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Report in the shape of summary_report.json's *_stats entries."""
+        summary = {
+            'mean': self.mean,
+            'min': self.min if self.count else 0,
+            'max': self.max if self.count else 0,
+            'count': self.count,
+            'std': math.sqrt(self.variance),
+        }
+        for p in PERCENTILES:
+            # Bucket midpoints can fall just outside the observed range
+            value = self.sketch.quantile(p / 100)
+            summary[f'p{p}'] = min(max(value, self.min), self.max) if self.count else 0
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None,
+                'sketch': self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunningStats":
+        stats = cls()
+        stats.count, stats.mean, stats.m2 = data['count'], data['mean'], data['m2']
+        if stats.count:
+            stats.min, stats.max = data['min'], data['max']
+        stats.sketch = QuantileSketch.from_dict(data['sketch'])
+        return stats
+
+
+class SummaryAggregator:
+    """Incremental per-metric, per-engine statistics over grading results."""
+
+    def __init__(self):
+        self.successful = 0
+        self.failed = 0
+        self.metrics: Dict[str, RunningStats] = {m: RunningStats() for m in METRICS}
+        self.engines: Dict[str, Dict[str, RunningStats]] = {}
+        self.distribution: Dict[str, int] = {name: 0 for name, _ in SCORE_RANGES}
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """Count one result from the judge (or an error record)."""
+        if result.get('error') or 'refusal' in result:
+            self.failed += 1
+            return
+        self.successful += 1
+        engine = result.get('source')
+        per_engine = None
+        if engine is not None:
+            per_engine = self.engines.setdefault(engine, {m: RunningStats() for m in METRICS})
+        for metric in METRICS:
+            value = result.get(metric)
+            if value is None:
+                continue
+            self.metrics[metric].add(value)
+            if per_engine is not None:
+                per_engine[metric].add(value)
+        score = result.get('overall_score')
+        if score is not None:
+            for name, upper in SCORE_RANGES:
+                if score <= upper:
+                    self.distribution[name] += 1
+                    break
+
+    def add_all(self, results: Iterable[Dict[str, Any]]) -> "SummaryAggregator":
+        for result in results:
+            self.add(result)
+        return self
+
+    def merge(self, other: "SummaryAggregator") -> None:
+        """Fold in an aggregator built over a disjoint shard of results."""
+        self.successful += other.successful
+        self.failed += other.failed
+        for metric in METRICS:
+            self.metrics[metric].merge(other.metrics[metric])
+        for engine, stats in other.engines.items():
+            mine = self.engines.setdefault(engine, {m: RunningStats() for m in METRICS})
+            for metric in METRICS:
+                mine[metric].merge(stats[metric])
+        for name in self.distribution:
+            self.distribution[name] += other.distribution.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Human-readable statistics, keyed like summary_report.json."""
+        snapshot = {
+            'successful': self.successful,
+            'failed': self.failed,
+        }
+        for metric in METRICS:
+            snapshot[f'{metric}_stats'] = self.metrics[metric].summary()
+        snapshot['score_distribution'] = dict(self.distribution)
+        if self.engines:
+            snapshot['per_engine'] = {
+                engine: {f'{metric}_stats': stats[metric].summary() for metric in METRICS}
+                for engine, stats in sorted(self.engines.items())
+            }
+        return snapshot
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable state, for merging shards later."""
+        return {
+            'successful': self.successful,
+            'failed': self.failed,
+            'metrics': {m: s.to_dict() for m, s in self.metrics.items()},
+            'engines': {e: {m: s.to_dict() for m, s in stats.items()} for e, stats in self.engines.items()},
+            'distribution': self.distribution,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SummaryAggregator":
+        aggregator = cls()
+        aggregator.successful = data['successful']
+        aggregator.failed = data['failed']
+        aggregator.metrics = {m: RunningStats.from_dict(s) for m, s in data['metrics'].items()}
+        aggregator.engines = {e: {m: RunningStats.from_dict(s) for m, s in stats.items()}
+                              for e, stats in data['engines'].items()}
+        aggregator.distribution = dict(data['distribution'])
+        return aggregator
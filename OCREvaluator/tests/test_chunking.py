@@ -0,0 +1,64 @@
+"""
+Chunked grading with --judge hybrid.
+
+The judge is replaced by a stub that always reports the same character
+accuracy, so the document result must carry exactly that value as
+judge_character_accuracy and the exact local accuracy as character_accuracy.
+"""
+
+import pytest
+
+import LLM
+import main
+import metrics
+from cascade import escalation_reason
+
+JUDGE_ACCURACY = 99.0
+
+
+def _stub_judge(pair, model=None, prompt_mode="full"):
+    return {'overall_score': 95.0, 'character_accuracy': JUDGE_ACCURACY, 'word_accuracy': 98.0,
+            'confidence_level': 90.0, 'index': pair[2]}
+
+
+@pytest.fixture
+def long_pair():
+    paragraphs = [" ".join(f"word{p}x{w}" for w in range(40)) for p in range(6)]
+    ground_truth = "\n".join(paragraphs)
+    # Every other word garbled, far from what the judge claims
+    ocr_text = "\n".join(" ".join("#@%&!*?" if w % 2 == 0 else f"word{p}x{w}" for w in range(40))
+                         for p in range(6))
+    return ocr_text, ground_truth, 0
+
+
+@pytest.fixture(autouse=True)
+def stub_judge(monkeypatch):
+    monkeypatch.setattr(LLM, "judgeLLm", _stub_judge)
+
+
+def _grade(pair, *options):
+    args = main.parse_args(["--judge", "hybrid", "--no-cache", *options])
+    results, failed = main.grade_pairs([pair], args)
+    assert failed == []
+    return results[0]
+
+
+def test_chunked_hybrid_keeps_judge_accuracy(long_pair):
+    chunked = _grade(long_pair, "--chunk-threshold", "50", "--chunk-tokens", "100")
+    whole = _grade(long_pair, "--chunk-threshold", "0")
+
+    assert chunked['chunks'] > 1
+    assert chunked['judge_character_accuracy'] == pytest.approx(JUDGE_ACCURACY)
+    assert whole['judge_character_accuracy'] == pytest.approx(JUDGE_ACCURACY)
+    local = metrics.judgeLocal(long_pair)['character_accuracy']
+    assert chunked['character_accuracy'] == pytest.approx(local)
+    assert local < JUDGE_ACCURACY - 15
+
+
+def test_chunked_hybrid_escalates_on_disagreement(long_pair):
+    chunked = _grade(long_pair, "--chunk-threshold", "50", "--chunk-tokens", "100")
+
+    assert escalation_reason(chunked, long_pair) == 'disagreement'
+    # Without a judge value there is nothing to disagree with
+    without_judge = {key: value for key, value in chunked.items() if key != 'judge_character_accuracy'}
+    assert escalation_reason(without_judge, long_pair) is None
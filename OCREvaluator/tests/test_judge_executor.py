@@ -0,0 +1,148 @@
+"""
+JudgeExecutor and RateLimiter against the mock server.
+
+The judge is a plain OpenAI client pointed at an in-process mock_server, so
+429 responses and their Retry-After headers reach the executor exactly as
+the real API's do.
+"""
+
+import threading
+import time
+
+import pytest
+from openai import OpenAI
+
+from judge_executor import JudgeExecutor, RateLimiter
+from mock_server import start_server
+
+RETRY_AFTER = 0.2
+# Slack for timer and scheduling jitter, in seconds
+TOLERANCE = 0.02
+
+
+class RecordingJudge:
+    """Sends one chat request per pair and records every attempt."""
+
+    def __init__(self, server):
+        self.client = OpenAI(base_url=f"{server.url}/v1", api_key="mock", max_retries=0)
+        self.attempts = []
+        self.lock = threading.Lock()
+
+    def __call__(self, pair):
+        index = pair[2]
+        start = time.monotonic()
+        status = 200
+        try:
+            self.client.chat.completions.create(
+                model="mock", messages=[{"role": "user", "content": f"{pair[0]}\n{pair[1]}"}])
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            raise
+        finally:
+            with self.lock:
+                self.attempts.append((index, start, time.monotonic(), status))
+        return {'index': index, 'overall_score': 100.0}
+
+    def of(self, index):
+        return sorted((a for a in self.attempts if a[0] == index), key=lambda a: a[1])
+
+
+def _pairs(count):
+    return [(f"ocr {i}", f"truth {i}", i) for i in range(count)]
+
+
+def _drain(limiter):
+    """Empty the request bucket, so requests go out at the steady rate instead of a first burst."""
+    limiter.requests.tokens = 0
+    limiter.requests.updated = time.monotonic()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**options):
+        server = start_server(seed=7, **options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_retries_429_after_retry_after(serve):
+    server = serve(rate_429=0.3, retry_after=RETRY_AFTER)
+    judge = RecordingJudge(server)
+    # Backoff without a Retry-After would be far shorter than RETRY_AFTER
+    executor = JudgeExecutor(judge, max_workers=4, max_retries=10, backoff_base=0.01)
+
+    results, failed = executor.run(_pairs(12))
+
+    assert failed == []
+    assert sorted(r['index'] for r in results) == list(range(12))
+    rejected = [a for a in judge.attempts if a[3] == 429]
+    assert rejected, "the seed should inject some 429s"
+    # One retry per 429, and nothing else was retried
+    assert len(judge.attempts) == 12 + len(rejected)
+    assert server.stats['injected_429'] == len(rejected)
+    for index in range(12):
+        attempts = judge.of(index)
+        assert [a[3] for a in attempts[:-1]] == [429] * (len(attempts) - 1)
+        assert attempts[-1][3] == 200
+        # Each retry waits out the Retry-After of the 429 before it
+        for previous, retry in zip(attempts, attempts[1:]):
+            assert retry[1] - previous[2] >= RETRY_AFTER - TOLERANCE
+
+
+def test_gives_up_after_max_retries(serve):
+    server = serve(rate_429=1.0, retry_after=0.05)
+    judge = RecordingJudge(server)
+    errors = []
+    executor = JudgeExecutor(judge, max_workers=2, max_retries=2, backoff_base=0.01)
+
+    results, failed = executor.run(_pairs(3), on_error=lambda pair, e: errors.append(pair[2]))
+
+    assert results == []
+    assert [pair[2] for pair in failed] == [0, 1, 2]
+    assert sorted(errors) == [0, 1, 2]
+    assert server.stats['injected_429'] == 3 * (2 + 1)
+
+
+def test_keeps_to_requests_per_minute(serve):
+    rpm = 300
+    server = serve()
+    judge = RecordingJudge(server)
+    limiter = RateLimiter(rpm)
+    _drain(limiter)
+    executor = JudgeExecutor(judge, max_workers=8, limiter=limiter)
+
+    start = time.monotonic()
+    results, failed = executor.run(_pairs(10))
+
+    assert failed == [] and len(results) == 10
+    interval = 60 / rpm
+    starts = sorted(a[1] for a in judge.attempts)
+    # The k-th request needs k tokens of an empty bucket
+    for k, sent in enumerate(starts, 1):
+        assert sent - start >= k * interval - TOLERANCE
+    assert server.stats['status'] == {'200': 10}
+
+
+def test_shared_limiter_spans_calls(serve):
+    rpm = 300
+    server = serve()
+    judge = RecordingJudge(server)
+    limiter = RateLimiter(rpm)
+    _drain(limiter)
+
+    start = time.monotonic()
+    # Like grade_pairs called once per engine or per adaptive round with one limiter
+    for first in (0, 5):
+        executor = JudgeExecutor(judge, max_workers=4, limiter=limiter)
+        _, failed = executor.run(_pairs(10)[first:first + 5])
+        assert failed == []
+
+    assert time.monotonic() - start >= 10 * 60 / rpm - TOLERANCE
+    assert server.stats['requests'] == 10
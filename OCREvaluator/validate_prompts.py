@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Check that diff prompts grade like full prompts on a sample of pairs.
+
+Grades a random sample of one engine's outputs with both prompt modes and
+reports how far the scores differ and how many prompt tokens the diff mode
+saves. The judge cache is not used, so both modes are really graded.
+
+Usage:
+    python validate_prompts.py --source qwen --suffix llamacpp --sample 30
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import LLM
+from judge_executor import JudgeExecutor, RateLimiter
+from main import CACHE_DIR, FILE_SUFFIX, OCR_DIR, TEST_SOURCE, load_engine_outputs, load_ground_truth
+
+SCORES = ('overall_score', 'character_accuracy', 'word_accuracy')
+
+
+def grade_sample(pairs: List[Tuple[str, str, int]], prompt_mode: str, args: argparse.Namespace,
+                 limiter: RateLimiter) -> Dict[int, Dict]:
+    """Grade the pairs with one prompt mode; returns index -> result."""
+    executor = JudgeExecutor(
+        lambda pair: LLM.judgeLLm(pair, args.model, prompt_mode),
+        max_workers=args.concurrency,
+        token_estimator=lambda pair: LLM.estimate_tokens(pair, prompt_mode),
+        limiter=limiter,
+    )
+    results, failed = executor.run(pairs)
+    if failed:
+        logging.warning(f"{prompt_mode}: {len(failed)} pairs failed")
+    return {result['index']: result for result in results}
+
+
+def correlation(xs: List[float], ys: List[float]) -> Optional[float]:
+    """Pearson correlation, or None if either side is constant."""
+    n = len(xs)
+    if n < 2:
+        return None
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    var_y = sum((y - mean_y) ** 2 for y in ys)
+    if var_x == 0 or var_y == 0:
+        return None
+    return cov / math.sqrt(var_x * var_y)
+
+
+def compare(pairs: List[Tuple[str, str, int]], full: Dict[int, Dict], diff: Dict[int, Dict]) -> Dict:
+    """Score agreement and token savings of the diff prompt."""
+    indices = sorted(full.keys() & diff.keys())
+    report = {'pairs': len(pairs), 'graded_by_both': len(indices)}
+    for score in SCORES:
+        xs = [full[i][score] for i in indices]
+        ys = [diff[i][score] for i in indices]
+        deltas = [abs(x - y) for x, y in zip(xs, ys)]
+        report[score] = {
+            'mean_full': sum(xs) / len(xs) if xs else None,
+            'mean_diff': sum(ys) / len(ys) if ys else None,
+            'mean_abs_difference': sum(deltas) / len(deltas) if deltas else None,
+            'max_abs_difference': max(deltas) if deltas else None,
+            'correlation': correlation(xs, ys),
+        }
+    full_tokens = sum(LLM.estimate_tokens(pair, "full") for pair in pairs)
+    diff_tokens = sum(LLM.estimate_tokens(pair, "diff") for pair in pairs)
+    report['estimated_tokens'] = {
+        'full': round(full_tokens),
+        'diff': round(diff_tokens),
+        'reduction': full_tokens / diff_tokens if diff_tokens else None,
+    }
+    report['items'] = [
+        {'index': i, **{f'{score}_full': full[i][score] for score in SCORES},
+         **{f'{score}_diff': diff[i][score] for score in SCORES}}
+        for i in indices
+    ]
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point."""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compare diff-prompt and full-prompt judge scores")
+    parser.add_argument("--ocr-dir", type=Path, default=OCR_DIR, help="Directory with engine sub-folders")
+    parser.add_argument("--source", default=TEST_SOURCE, help="Engine sub-folder inside --ocr-dir")
+    parser.add_argument("--suffix", default=FILE_SUFFIX, help="Suffix of the OCR result files")
+    parser.add_argument("--ground-truth-store", type=Path, default=CACHE_DIR / "ground_truth.gts",
+                        help="Ground truth store, as in main.py")
+    parser.add_argument("--sample", type=int, default=30, help="Number of pairs to grade")
+    parser.add_argument("--seed", type=int, default=0, help="Sampling seed")
+    parser.add_argument("--model", default=LLM.MODEL, help="Judge model")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent judge calls")
+    parser.add_argument("--rpm", type=float, help="Requests per minute limit of the judge API")
+    parser.add_argument("--tpm", type=float, help="Tokens per minute limit of the judge API")
+    parser.add_argument("--output", type=Path, default=Path("./results/prompt_validation.json"),
+                        help="Where to write the comparison")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    ground_truths = load_ground_truth(args.ground_truth_store)
+    outputs = load_engine_outputs({args.source: args.suffix}, args.ocr_dir, ground_truths)
+    pairs = [(ocr_text, ground_truth, index) for index, ocr_text, ground_truth in outputs[args.source]
+             if ocr_text and ground_truth]
+    pairs = sorted(random.Random(args.seed).sample(pairs, min(args.sample, len(pairs))), key=lambda p: p[2])
+
+    limiter = RateLimiter(args.rpm, args.tpm)
+    full = grade_sample(pairs, "full", args, limiter)
+    diff = grade_sample(pairs, "diff", args, limiter)
+    report = compare(pairs, full, diff)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    overall = report['overall_score']
+    tokens = report['estimated_tokens']
+    print(f"Pairs graded by both modes: {report['graded_by_both']}/{report['pairs']}")
+    if overall['mean_abs_difference'] is not None:
+        print(f"Overall score: full {overall['mean_full']:.1f}, diff {overall['mean_diff']:.1f}, "
+              f"mean |difference| {overall['mean_abs_difference']:.2f}, max {overall['max_abs_difference']:.1f}")
+    if tokens['reduction']:
+        print(f"Estimated prompt tokens: full {tokens['full']}, diff {tokens['diff']} "
+              f"({tokens['reduction']:.1f}x fewer)")
+    print(f"Details: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
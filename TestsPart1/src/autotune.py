@@ -0,0 +1,17 @@
+"""
+Tune processes x threads for the CPU engines of this project.
+
+    uv run src/autotune.py paddleocr --sample 16 --processes 1,2,4 --threads 1,2,4,8
+
+See ocr_common.cpu_tuning for the options.
+"""
+
+from ocr_common.cpu_tuning import main_autotune
+
+# Engine -> (runner, preprocessing), as "module:function"; the runner returns (text, seconds)
+ENGINES = {
+    "paddleocr": ("ocrMethods.paddleocrRunner:paddleOCRRunner", "ocrMethods.orientation:auto_orient"),
+}
+
+if __name__ == "__main__":
+    main_autotune(ENGINES)
@@ -1,9 +1,14 @@
-from datasets import load_from_disk
+from datasets import load_dataset, load_from_disk
 from PIL import Image
 import ocrMethods.paddleocrRunner as paddleocrRunner
 import ocrMethods.tesseractRunner as tesseractRunner
 import ocrMethods.llmRunner as llmRunner
 import ocrMethods.llamacppRunner as qwenRunner
+import ocrMethods.orientation as orientation
+from ocr_common import cpu_tuning
+from ocr_common.profiling import MODES as PROFILE_MODES, Profiler
+from ocr_common.telemetry import SNAPSHOT_INTERVAL, Telemetry
+import argparse
 import os
 import time
 
@@ -18,7 +23,47 @@ TEST_RUNNERS = {
 
 }
 
-def perform_experiment():
+# Runners whose pages go through the shared orientation stage first.
+# Tesseract orients pages itself so it can fall back to OSD when unsure.
+AUTO_ORIENT = {"paddleocr", "llamacpp", "gemma3", "qwen"}
+
+class RunnerMetrics:
+    """Live metrics of the OCR runners, see ocr_common.telemetry."""
+
+    def __init__(self, telemetry):
+        self.pages = telemetry.counter("ocr_pages_total", "Pages processed", ["engine"])
+        self.skipped = telemetry.counter("ocr_skipped_total", "Dataset items without an image", ["engine"])
+        self.errors = telemetry.counter("ocr_errors_total", "Engine calls that raised", ["engine"])
+        self.seconds = telemetry.histogram("ocr_page_seconds", "OCR time per page, orientation included", ["engine"])
+        self.index = telemetry.gauge("ocr_current_index", "Dataset index being processed", ["engine"])
+        self.last_page = telemetry.gauge("ocr_last_page_timestamp_seconds", "Unix time the latest page finished")
+
+    def page(self, engine, elapsed):
+        self.pages.inc(engine=engine)
+        self.seconds.observe(elapsed, engine=engine)
+        self.last_page.set(time.time())
+
+def ocr_item(test_name, test_runner, image):
+    """Run one engine on one page, oriented first for AUTO_ORIENT engines.
+    Returns the OCR text and the seconds it took, orientation included."""
+    preprocess_elapsed = 0
+    if test_name in AUTO_ORIENT:
+        start = time.time()
+        image = orientation.auto_orient(image)
+        preprocess_elapsed = time.time() - start
+    # Run the OCR method
+    run_result, elapsed = test_runner(image)
+    return str(run_result).strip(), elapsed + preprocess_elapsed
+
+def save_item(test_output_dir, test_name, index, run_result, elapsed):
+    """Write a page's OCR text to {index}{test_name}.txt and its time to {test_name}_time.txt."""
+    with open(os.path.join(test_output_dir, str(index)+test_name+".txt"), "w") as f:
+        f.write(run_result)
+    
+    with open(os.path.join(test_output_dir, f"{test_name}_time.txt"), "a") as f:
+        f.write(f"Index {index} took {elapsed:.4f} seconds \n")
+
+def perform_experiment(profile=None, telemetry=None):
     # Dataset includes image, id, metadata, true_markdown_output, json_schema, true_json_output
     # Image is a PIL Image object
     os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -26,36 +71,86 @@ def perform_experiment():
     dataset = load_dataset("CodeArte/ocr-benchmark")
     run_dir = os.path.join(OUTPUT_DIR, str(int(time.time())))
     os.makedirs(run_dir, exist_ok=True)
+    # One profile per engine in run_dir/profile; a no-op without --profile
+    profiler = Profiler(os.path.join(run_dir, "profile"), profile)
+    profiler.start()
+    telemetry = telemetry or Telemetry()
+    telemetry.start()
+    try:
+        run_engines(dataset, run_dir, profiler, RunnerMetrics(telemetry))
+    finally:
+        profiler.stop()
+        telemetry.stop()
+    return True
+
+def dataset_pages(dataset, test_name, metrics):
+    """Yield (index, image) of the dataset items to run, skipping items without an image."""
+    for index, dataset_item in enumerate(dataset["test"]):
+        if index <365:
+            continue
+        if isinstance(dataset_item["image"], Image.Image):
+            yield index, dataset_item["image"]
+        else: 
+            print(f"Item {index} is not an image, skipping...")
+            metrics.skipped.inc(engine=test_name)
+
+def run_engines(dataset, run_dir, profiler, metrics):
     for test_name, test_runner in TEST_RUNNERS.items():  
         print(f"Running {test_name} OCR...")
         test_output_dir = os.path.join(run_dir, test_name)
         os.makedirs(test_output_dir, exist_ok=True)
         overall_elapsed = 0
-        
-        for index, dataset_item in enumerate(dataset["test"]):
-            if index <365:
-                continue
-            print("current Index:", index)
-            if isinstance(dataset_item["image"], Image.Image):
-                image = dataset_item["image"]
-            else: 
-                print(f"Item {index} is not an image, skipping...")
-                continue
-            # Run the OCR method
-            run_result, elapsed = test_runner(image)
-            # Save the result to a file
-            with open(os.path.join(test_output_dir, str(index)+test_name+".txt"), "w") as f:
-                f.write(str(run_result).strip())
-            
-            with open(os.path.join(test_output_dir, f"{test_name}_time.txt"), "a") as f:
-                f.write(f"Index {index} took {elapsed:.4f} seconds \n")
-            overall_elapsed += elapsed
+        pages = dataset_pages(dataset, test_name, metrics)
+        # Spread pages over processes when the autotuner found that faster on this host
+        config = cpu_tuning.load_config(test_name)
+        if config and config["processes"] > 1:
+            print(f"Using {config['processes']} processes x {config['threads']} threads (tuned)")
+            if profiler.enabled:
+                print(f"Warning: {test_name} runs in worker processes, its profile only covers "
+                      "dispatching pages and saving results in this process")
+            preprocess = orientation.auto_orient if test_name in AUTO_ORIENT else None
+            with profiler.section(test_name):
+                results = cpu_tuning.run_parallel(test_runner, pages, config["processes"], config["threads"], preprocess)
+                for index, run_result, elapsed, _, _, error in results:
+                    print("current Index:", index)
+                    metrics.index.set(index, engine=test_name)
+                    if error:
+                        metrics.errors.inc(engine=test_name)
+                        raise RuntimeError(f"{test_name} failed on index {index}: {error}")
+                    save_item(test_output_dir, test_name, index, run_result, elapsed)
+                    metrics.page(test_name, elapsed)
+                    overall_elapsed += elapsed
+        else:
+            for index, image in pages:
+                print("current Index:", index)
+                metrics.index.set(index, engine=test_name)
+                try:
+                    with profiler.section(test_name):
+                        run_result, elapsed = ocr_item(test_name, test_runner, image)
+                except Exception:
+                    metrics.errors.inc(engine=test_name)
+                    raise
+                save_item(test_output_dir, test_name, index, run_result, elapsed)
+                metrics.page(test_name, elapsed)
+                overall_elapsed += elapsed
         num_tests = len(dataset["test"])
         with open(os.path.join(test_output_dir, f"{test_name}_time.txt"), "a") as f:
             f.write(f"{overall_elapsed:.4f} seconds, with average of  {overall_elapsed/num_tests:.4f} \n")
-    return True
+
 def main():
-    perform_experiment()
+    parser = argparse.ArgumentParser(description="Run the OCR engines over the benchmark dataset")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="Profile each engine call: sample (stack sampling, flamegraph-ready "
+                             ".collapsed files) or cprofile (deterministic, .pstats files), "
+                             "written to output/<run>/profile")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve live metrics in the Prometheus text format on this port")
+    parser.add_argument("--metrics-file",
+                        help="Append a JSON snapshot of the metrics to this file every --metrics-interval seconds")
+    parser.add_argument("--metrics-interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="Seconds between metric snapshots")
+    args = parser.parse_args()
+    perform_experiment(args.profile, Telemetry(args.metrics_port, args.metrics_file, args.metrics_interval))
 
 
 if __name__ == "__main__":
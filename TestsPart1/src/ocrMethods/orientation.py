@@ -0,0 +1,191 @@
+"""
+Lightweight page orientation and skew estimation shared by the OCR runners.
+
+The estimator works on a downscaled binary copy of the page:
+- text lines show up as many sharp, evenly spaced peaks in the projection
+  profile taken across them, which tells horizontal (0/180) pages apart from
+  vertical (90/270) ones; the column gutters of tables and forms give the other
+  profile a few sharp edges too, so the page is left to the fallback unless one
+  axis clearly wins
+- Latin text has more ink above the x-height band (ascenders, capitals) than
+  below it (descenders), which tells upright lines apart from upside-down ones
+- sweeping a few small angles for the sharpest profile gives the skew
+
+Rotations follow the Tesseract OSD convention: degrees to rotate the page
+clockwise to make it upright.
+"""
+import cv2
+import numpy as np
+from PIL import Image
+
+ANALYSIS_SIZE = 1000
+CONFIDENCE_THRESHOLD = 0.5
+MIN_INK_RATIO = 0.002
+MIN_TEXT_LINES = 3
+MAX_SKEW = 5.0
+# One axis must score this many times higher than the other to be trusted
+AXIS_MARGIN = 1.5
+SKEW_STEP = 0.5
+
+
+def _to_binary(image):
+    """Return a downscaled uint8 array with ink pixels set to 1."""
+    if isinstance(image, Image.Image):
+        gray = np.array(image.convert("L"))
+    else:
+        gray = np.asarray(image)
+        if gray.ndim == 3:
+            code = cv2.COLOR_RGBA2GRAY if gray.shape[-1] == 4 else cv2.COLOR_RGB2GRAY
+            gray = cv2.cvtColor(gray, code)
+    h, w = gray.shape
+    scale = ANALYSIS_SIZE / float(max(h, w))
+    if scale < 1:
+        gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    _, binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return binary
+
+
+def _profile_sharpness(binary, axis):
+    """Sum of squared differences of the projection profile along an axis."""
+    profile = binary.sum(axis=axis, dtype=np.float64)
+    return float(np.square(np.diff(profile)).sum())
+
+
+def _axis_score(binary, axis):
+    """
+    How much the projection profile along an axis looks like text lines.
+
+    The sharpness is divided by the profile's energy so page size and ink
+    density cancel out, and weighted by the number of separate runs: text
+    lines give dozens, the column gutters of a table or form only a few.
+    """
+    profile = binary.sum(axis=axis, dtype=np.float64)
+    energy = float(np.square(profile).sum())
+    if not energy:
+        return 0.0
+    sharpness = float(np.square(np.diff(profile)).sum()) / energy
+    return sharpness * len(_text_lines(profile))
+
+
+def _text_lines(profile):
+    """Split a row profile into (start, end) runs that contain text."""
+    active = profile > 0.1 * profile.max()
+    edges = np.flatnonzero(np.diff(active.astype(np.int8)))
+    bounds = np.concatenate(([0], edges + 1, [len(profile)]))
+    return [(s, e) for s, e in zip(bounds[:-1], bounds[1:]) if active[s] and e - s > 2]
+
+
+def _upright_score(binary):
+    """
+    Compare ink above and below the x-height band of every text line.
+
+    Returns a value in [-1, 1] (positive means upright) and the number of lines used.
+    """
+    profile = binary.sum(axis=1, dtype=np.float64)
+    if not profile.any():
+        return 0.0, 0
+    above = below = 0.0
+    lines = _text_lines(profile)
+    for start, end in lines:
+        line = profile[start:end]
+        core = np.flatnonzero(line >= 0.5 * line.max())
+        above += line[:core[0]].sum()
+        below += line[core[-1] + 1:].sum()
+    if above + below == 0:
+        return 0.0, len(lines)
+    return (above - below) / (above + below), len(lines)
+
+
+def _rotate_array(binary, angle):
+    """Rotate a binary array clockwise by a small angle around its centre."""
+    h, w = binary.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), -angle, 1.0)
+    return cv2.warpAffine(binary, matrix, (w, h), flags=cv2.INTER_NEAREST, borderValue=0)
+
+
+def _sweep(binary, max_angle, step):
+    """
+    Find the small clockwise angle that sharpens the row and the column profiles most.
+
+    Returns ((row_score, row_angle), (col_score, col_angle)), scored by _axis_score.
+    """
+    best_rows = best_cols = (-1.0, 0.0)
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rotated = _rotate_array(binary, angle) if angle else binary
+        best_rows = max(best_rows, (_profile_sharpness(rotated, axis=1), float(angle)))
+        best_cols = max(best_cols, (_profile_sharpness(rotated, axis=0), float(angle)))
+    rows = _axis_score(_rotate_array(binary, best_rows[1]) if best_rows[1] else binary, axis=1)
+    cols = _axis_score(_rotate_array(binary, best_cols[1]) if best_cols[1] else binary, axis=0)
+    return (rows, best_rows[1]), (cols, best_cols[1])
+
+
+def estimate_orientation(image, deskew=True):
+    """
+    Estimate page orientation without running OCR.
+
+    Args:
+        image: PIL Image or numpy array
+        deskew: Also estimate the residual skew angle
+
+    Returns:
+        Dictionary with 'rotate' (0/90/180/270, clockwise), 'skew' (degrees,
+        clockwise) and 'confidence' (0-1)
+    """
+    binary = _to_binary(image)
+    if binary.mean() < MIN_INK_RATIO:
+        return {"rotate": 0, "skew": 0.0, "confidence": 0.0}
+
+    # Text lines across rows -> horizontal page, across columns -> vertical page
+    max_angle = MAX_SKEW if deskew else 0.0
+    (rows, row_skew), (cols, col_skew) = _sweep(binary, max_angle, SKEW_STEP)
+    if max(rows, cols) <= 0:
+        return {"rotate": 0, "skew": 0.0, "confidence": 0.0}
+    axis_confidence = 1 - min(rows, cols) / max(rows, cols)
+    if max(rows, cols) < AXIS_MARGIN * min(rows, cols):
+        # Too close to call (e.g. a table whose columns line up): let the fallback decide
+        axis_confidence = 0.0
+    skew = col_skew if cols > rows else row_skew
+    if skew:
+        binary = _rotate_array(binary, skew)
+    if cols > rows:
+        upright, line_count = _upright_score(np.rot90(binary, k=-1))
+        rotate = 90 if upright >= 0 else 270
+    else:
+        upright, line_count = _upright_score(binary)
+        rotate = 0 if upright >= 0 else 180
+
+    # An ascender/descender imbalance of 0.3 is typical for upright Latin text
+    confidence = min(axis_confidence * 2, abs(upright) / 0.3, 1.0)
+    if line_count < MIN_TEXT_LINES:
+        confidence = 0.0
+    return {"rotate": rotate, "skew": skew, "confidence": round(float(confidence), 3)}
+
+
+def auto_orient(image, fallback=None, threshold=CONFIDENCE_THRESHOLD, deskew=True):
+    """
+    Rotate a page upright using the local estimator.
+
+    Args:
+        image: PIL Image
+        fallback: Optional callable(image) -> clockwise rotation, used only when
+            the estimator is unsure. It may return None to keep the page as-is.
+        threshold: Minimum estimator confidence to trust its result
+        deskew: Also correct small skew angles
+
+    Returns:
+        Rotated PIL Image (the original object if no rotation is needed)
+    """
+    estimate = estimate_orientation(image, deskew=deskew)
+    rotate, skew = estimate["rotate"], estimate["skew"]
+    if estimate["confidence"] < threshold:
+        rotate, skew = 0, 0.0
+        if fallback is not None:
+            rotate = fallback(image) or 0
+
+    angle = rotate + skew
+    if angle % 360 == 0:
+        return image
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGB")
+    # PIL rotates counter-clockwise
+    return image.rotate(-angle, expand=True, fillcolor="white")
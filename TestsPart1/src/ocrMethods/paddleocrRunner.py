@@ -1,15 +1,34 @@
-from paddleocr import PaddleOCR
 import numpy as np
 from typing import Dict
 import cv2
 import time
+from ocr_common import cpu_tuning
 
+_ocr = None
+
+def get_ocr():
+    """
+    The PaddleOCR pipeline, created on first use.
+
+    When main.py spreads pages over worker processes, only the workers run
+    pages, so the parent never imports Paddle or loads the models.
+    """
+    global _ocr
+    if _ocr is None:
+        from paddleocr import PaddleOCR
+        # Intra-op threads of this worker, else tuned for this host by autotune.py; None keeps Paddle's default
+        cpu_threads = cpu_tuning.threads_for("paddleocr")
+        cpu_tuning.apply_threads(cpu_threads)
+        _ocr = PaddleOCR(
+                text_detection_model_name="PP-OCRv5_server_det",
+                text_recognition_model_name="PP-OCRv5_server_rec",
+                lang="en",
+                # Pages arrive upright from the shared orientation stage in main.py
+                use_doc_orientation_classify=False,
+                **({"cpu_threads": cpu_threads} if cpu_threads else {}),
+            )
+    return _ocr
 
-ocr = PaddleOCR(
-        text_detection_model_name="PP-OCRv5_server_det",
-        text_recognition_model_name="PP-OCRv5_server_rec",
-        lang="en",
-    )
 def paddleOCRRunner(image):
     ndarray_image = np.array(image)
     if len(ndarray_image.shape) == 2:
@@ -18,6 +37,7 @@ def paddleOCRRunner(image):
     elif ndarray_image.shape[-1] == 4:
         # Convert RGBA to BGR
         ndarray_image = cv2.cvtColor(ndarray_image, cv2.COLOR_RGBA2BGR)
+    ocr = get_ocr()
     start = time.time()
     result = ocr.predict(input=ndarray_image)
     elapsed = time.time() - start
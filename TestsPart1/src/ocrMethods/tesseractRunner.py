@@ -1,6 +1,18 @@
 import pytesseract
 from PIL import Image
 import time
+import ocrMethods.orientation as orientation
+
+
+def osd_rotation(image):
+    """Clockwise rotation suggested by Tesseract OSD, or None if OSD fails."""
+    try:
+        osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+    except pytesseract.TesseractError as e:
+        print("Tesseract OSD failed:", e)
+        return None
+    return osd['rotate']
+
 
 def tesseractRunner(image):
     # convert image to PIL Image if not already
@@ -8,9 +20,8 @@ def tesseractRunner(image):
         image = Image.fromarray(image)
     start = time.time()
     try:
-        orientation = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
-        if orientation['rotate'] != 0:
-            image = image.rotate(orientation['rotate'], expand=True)
+        # Local estimator first, the full OSD pass only when it is unsure
+        image = orientation.auto_orient(image, fallback=osd_rotation)
         # Perform OCR
         text = pytesseract.image_to_string(image)
     except pytesseract.TesseractError as e:
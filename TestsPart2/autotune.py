@@ -0,0 +1,17 @@
+"""
+Tune processes x Torch threads for EasyOCR.
+
+    uv run autotune.py easyocr
+
+See ocr_common.cpu_tuning for the options.
+"""
+
+from ocr_common.cpu_tuning import main_autotune
+
+# Engine -> (runner, preprocessing), as "module:function"; the runner returns (text, seconds)
+ENGINES = {
+    "easyocr": ("main:easyOCRrunner", None),
+}
+
+if __name__ == "__main__":
+    main_autotune(ENGINES)
@@ -1,22 +1,49 @@
-from datasets import load_from_disk
+from datasets import load_dataset, load_from_disk
 from PIL import Image
 import os
 import time
-import easyocr
 import numpy as np
+from ocr_common import cpu_tuning
 
 OUTPUT_DIR = "output"
 
-reader = easyocr.Reader(['en'])
+_reader = None
+
+def get_reader():
+    """
+    The EasyOCR reader, created on first use.
+
+    When the pages are spread over worker processes, only the workers run
+    pages, so the parent never imports Torch or loads the models.
+    """
+    global _reader
+    if _reader is None:
+        import easyocr
+        # Torch intra-op threads of this worker, else tuned for this host by autotune.py
+        cpu_tuning.apply_threads(cpu_tuning.threads_for("easyocr"))
+        _reader = easyocr.Reader(['en'])
+    return _reader
+
 def easyOCRrunner(image):
     # Convert PIL Image to numpy array
     image_array = np.array(image)
+    reader = get_reader()
     start= time.time()
     result = reader.readtext(image_array, detail = 0)
     elapsed = time.time() - start
     result = " ".join(result)
     return result, elapsed
 
+def dataset_pages(dataset):
+    """Yield (index, image) of the dataset items to run, skipping items without an image."""
+    for index, dataset_item in enumerate(dataset["test"]):
+        if index < 636:  
+            continue
+        if isinstance(dataset_item["image"], Image.Image):
+            yield index, dataset_item["image"]
+        else: 
+            print(f"Item {index} is not an image, skipping...")
+
 def perform_experiment():
     # Dataset includes image, id, metadata, true_markdown_output, json_schema, true_json_output
     # Image is a PIL Image object
@@ -30,17 +57,19 @@ def perform_experiment():
     os.makedirs(test_output_dir, exist_ok=True)
     overall_elapsed = 0
     
-    for index, dataset_item in enumerate(dataset["test"]):
-        if index < 636:  
-            continue
+    # Spread pages over processes when autotune.py found that faster on this host
+    config = cpu_tuning.load_config("easyocr")
+    if config and config["processes"] > 1:
+        print(f"Using {config['processes']} processes x {config['threads']} threads (tuned)")
+        results = cpu_tuning.run_parallel(easyOCRrunner, dataset_pages(dataset), config["processes"], config["threads"])
+    else:
+        # Same shape as run_parallel's results: (index, text, seconds, start, end, error)
+        results = ((index, *easyOCRrunner(image), None, None, None) for index, image in dataset_pages(dataset))
+    
+    for index, run_result, elapsed, _, _, error in results:
         print("current Index:", index)
-        if isinstance(dataset_item["image"], Image.Image):
-            image = dataset_item["image"]
-        else: 
-            print(f"Item {index} is not an image, skipping...")
-            continue
-        # Run the OCR method
-        run_result, elapsed = easyOCRrunner(image)
+        if error:
+            raise RuntimeError(f"easyOCR failed on index {index}: {error}")
         # Save the result to a file
         with open(os.path.join(test_output_dir, str(index)+"easyOCR"+".txt"), "w") as f:
             f.write(str(run_result).strip())
@@ -0,0 +1 @@
+"""Profiling, live metrics and CPU tuning shared by the OCR runners and the evaluator."""
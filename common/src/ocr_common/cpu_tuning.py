@@ -0,0 +1,343 @@
+"""
+CPU thread/process allocation for the local OCR engines, and an autotuner for it.
+
+PaddleOCR and Torch (EasyOCR) each start an intra-op thread pool as wide as
+the machine, so several processes oversubscribe the cores. The autotuner runs
+an engine over a sample of the dataset under a grid of (processes x threads
+per process) configurations, measures pages per second and the p95 page
+latency, and saves the best configuration per engine and host:
+
+    uv run src/autotune.py paddleocr --sample 16 --processes 1,2,4 --threads 1,2,4,8   (TestsPart1)
+    uv run autotune.py easyocr                                                         (TestsPart2)
+
+Each project's autotune.py passes its own engines to main_autotune.
+
+The runners pick the saved configuration up automatically: the engine is
+created with the tuned thread count, and when more than one process is best
+the pages are spread over a process pool (run_parallel).
+
+Saved configurations live in TUNING_FILE, keyed by host name:
+
+    {"host": {"cpu_count": 16, "engines": {"paddleocr": {"processes": 4, "threads": 4, ...}}}}
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+TUNING_FILE = Path(os.environ.get("OCR_TUNING_FILE", Path.home() / ".cache" / "ocranalysis" / "cpu_tuning.json"))
+# Set in worker processes so the engine is created with the thread count being run
+THREADS_ENV = "OCR_CPU_THREADS"
+# Thread pools that read their size from the environment when they start
+LIBRARY_ENVS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+DATASET = "CodeArte/ocr-benchmark"
+# Pages run per configuration
+SAMPLE = 16
+
+Runner = Union[str, Callable]
+# Engine -> (runner, preprocessing or None), the runner returning (text, seconds)
+Engines = Dict[str, Tuple[Runner, Optional[Runner]]]
+
+
+def cpu_count() -> int:
+    """Cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def host() -> str:
+    return platform.node() or "localhost"
+
+
+def _load(path: Path) -> Dict[str, Any]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_config(engine: str, path: Path = TUNING_FILE) -> Optional[Dict[str, Any]]:
+    """The configuration saved for `engine` on this host, or None if it was never tuned here."""
+    return _load(path).get(host(), {}).get("engines", {}).get(engine)
+
+
+def save_config(engine: str, config: Dict[str, Any], path: Path = TUNING_FILE) -> None:
+    """Save the configuration of `engine` on this host, keeping every other entry."""
+    tuning = _load(path)
+    entry = tuning.setdefault(host(), {"engines": {}})
+    entry["cpu_count"] = cpu_count()
+    entry.setdefault("engines", {})[engine] = config
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(tuning, f, indent=2)
+
+
+def threads_for(engine: str) -> Optional[int]:
+    """
+    Intra-op threads `engine` should be created with.
+
+    Returns:
+        The count a worker process was started with, else the tuned count
+        for this host, else None (keep the library default)
+    """
+    if os.environ.get(THREADS_ENV):
+        return int(os.environ[THREADS_ENV])
+    config = load_config(engine)
+    return config["threads"] if config else None
+
+
+def apply_threads(threads: Optional[int]) -> None:
+    """Size the thread pools of the libraries already imported (torch, OpenCV) and of those started later."""
+    if not threads:
+        return
+    for name in LIBRARY_ENVS:
+        os.environ[name] = str(threads)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    if "cv2" in sys.modules:
+        sys.modules["cv2"].setNumThreads(threads)
+
+
+@contextlib.contextmanager
+def thread_environment(threads: int):
+    """Environment inherited by processes started inside the block."""
+    names = (THREADS_ENV,) + LIBRARY_ENVS
+    saved = {name: os.environ.get(name) for name in names}
+    os.environ.update({name: str(threads) for name in names})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _resolve(runner: Optional[Runner]) -> Optional[Callable]:
+    if runner is None or callable(runner):
+        return runner
+    module, function = runner.split(":")
+    return getattr(importlib.import_module(module), function)
+
+
+# Per worker process: the resolved runner and preprocessing
+_worker: Dict[str, Optional[Callable]] = {}
+
+
+def _init_worker(runner: Runner, preprocess: Optional[Runner], threads: int, warmup=None) -> None:
+    apply_threads(threads)
+    try:
+        _worker["runner"] = _resolve(runner)
+        _worker["preprocess"] = _resolve(preprocess)
+    except Exception as e:
+        # A raising initializer makes the pool restart the worker forever; fail its pages instead
+        _worker["error"] = f"{type(e).__name__}: {e}"
+        return
+    if warmup is not None:
+        # Model loading and first-call allocations stay out of the measurements
+        _run_page((None, warmup))
+
+
+def _run_page(page) -> Tuple[Any, Optional[str], Optional[float], float, float, Optional[str]]:
+    index, image = page
+    start = time.time()
+    if "error" in _worker:
+        return index, None, None, start, start, _worker["error"]
+    try:
+        preprocess_seconds = 0.0
+        if _worker["preprocess"] is not None:
+            image = _worker["preprocess"](image)
+            preprocess_seconds = time.time() - start
+        # Timed like the serial runners: the engine's own seconds plus preprocessing
+        text, seconds = _worker["runner"](image)
+        text, seconds, error = str(text).strip(), seconds + preprocess_seconds, None
+    except Exception as e:
+        text, seconds, error = None, None, f"{type(e).__name__}: {e}"
+    return index, text, seconds, start, time.time(), error
+
+
+def run_parallel(runner: Runner, pages: Iterable[Tuple[Any, Any]], processes: int, threads: int,
+                 preprocess: Optional[Runner] = None, warmup=None) -> Iterator[Tuple]:
+    """
+    Run an engine over pages in a pool of `processes` processes with `threads` threads each.
+
+    Args:
+        runner: The engine, a picklable function or "module:function", taking a
+            PIL image and returning (text, seconds)
+        pages: (index, PIL image) pairs
+        processes: Worker processes
+        threads: Intra-op threads per worker
+        preprocess: Applied to each image before the runner (e.g. orientation), timed with it
+        warmup: Image every worker runs once before taking pages
+
+    Yields:
+        (index, text, seconds, start, end, error) in the order of `pages`. seconds
+        is the runner's own time plus preprocessing, as the serial runners record
+        it; start and end are the wall clock around the whole page. text and
+        seconds are None and error is set when the engine raised
+    """
+    # Workers are spawned, not forked, so they create their own engine with the
+    # thread count in their environment instead of inheriting the parent's pools
+    context = multiprocessing.get_context("spawn")
+    with thread_environment(threads):
+        pool = context.Pool(processes, initializer=_init_worker, initargs=(runner, preprocess, threads, warmup))
+    with pool:
+        yield from pool.imap(_run_page, pages)
+
+
+def p95(values: List[float]) -> Optional[float]:
+    """Nearest-rank 95th percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+def measure(runner: Runner, pages: List[Tuple[Any, Any]], processes: int, threads: int,
+            preprocess: Optional[Runner] = None) -> Dict[str, Any]:
+    """Pages per second and latency of one configuration on a sample of pages."""
+    results = list(run_parallel(runner, pages, processes, threads, preprocess, warmup=pages[0][1]))
+    # Wall clock per page, image conversions included, since that is what a worker spends
+    seconds = [r[4] - r[3] for r in results if r[5] is None]
+    errors = [r[5] for r in results if r[5] is not None]
+    # From the first page started to the last one finished, worker start-up excluded
+    wall = max(r[4] for r in results) - min(r[3] for r in results)
+    return {
+        "processes": processes,
+        "threads": threads,
+        "pages": len(seconds),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_seconds": round(wall, 3),
+        "pages_per_second": round(len(seconds) / wall, 4) if seconds and wall > 0 else 0.0,
+        "mean_seconds": round(sum(seconds) / len(seconds), 4) if seconds else None,
+        "p95_seconds": round(p95(seconds), 4) if seconds else None,
+    }
+
+
+def grid(processes: List[int], threads: List[int], cores: int, oversubscribe: bool = False) -> List[Tuple[int, int]]:
+    """Configurations to try, leaving out those that need more threads than cores."""
+    return [(p, t) for p in processes for t in threads if oversubscribe or p * t <= cores]
+
+
+def best(results: List[Dict[str, Any]], max_p95: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Highest throughput without errors (and within max_p95); ties go to the lower p95."""
+    candidates = [r for r in results if not r["errors"] and r["pages"]
+                  and (max_p95 is None or r["p95_seconds"] <= max_p95)]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda r: (r["pages_per_second"], -r["p95_seconds"]))
+
+
+def sample_pages(dataset_name: str, sample: int, start: int = 0) -> List[Tuple[int, Any]]:
+    """`sample` pages spread evenly over the test split, from index `start` on."""
+    from datasets import load_dataset
+    from PIL import Image
+
+    split = load_dataset(dataset_name)["test"]
+    indices = range(start, len(split))
+    step = max(1, len(indices) // sample)
+    pages = []
+    for index in indices[::step]:
+        image = split[index]["image"]
+        if isinstance(image, Image.Image):
+            pages.append((index, image))
+        if len(pages) == sample:
+            break
+    return pages
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def _powers_of_two(limit: int) -> List[int]:
+    values = [1]
+    while values[-1] * 2 <= limit:
+        values.append(values[-1] * 2)
+    return values
+
+
+def main_autotune(engines: Engines, argv: Optional[List[str]] = None) -> None:
+    """
+    Command line of the autotuner.
+
+    Args:
+        engines: The engines a project can tune, with runners as "module:function"
+            so worker processes import them themselves
+        argv: Arguments (default: sys.argv)
+    """
+    cores = cpu_count()
+    default_grid = ",".join(map(str, _powers_of_two(cores)))
+    parser = argparse.ArgumentParser(description="Find the fastest processes x threads allocation of a CPU OCR engine")
+    parser.add_argument("engine", help=f"Engine to tune: {', '.join(engines)}, or any name with --runner")
+    parser.add_argument("--runner", help="Engine function as module:function (default: the engine's own)")
+    parser.add_argument("--preprocess", help="Function applied to each page first, as module:function")
+    parser.add_argument("--processes", type=_int_list, default=default_grid,
+                        help=f"Process counts to try (default: {default_grid})")
+    parser.add_argument("--threads", type=_int_list, default=default_grid,
+                        help=f"Intra-op threads per process to try (default: {default_grid})")
+    parser.add_argument("--oversubscribe", action="store_true",
+                        help=f"Also try configurations with more threads in total than the {cores} cores")
+    parser.add_argument("--sample", type=int, default=SAMPLE, help="Pages run per configuration")
+    parser.add_argument("--start", type=int, default=0, help="First dataset index of the sample")
+    parser.add_argument("--dataset", default=DATASET, help="Dataset the sample is drawn from")
+    parser.add_argument("--max-p95", type=float, help="Only pick configurations with a p95 page latency below this")
+    parser.add_argument("--tuning-file", type=Path, default=TUNING_FILE, help="Where tuned configurations are saved")
+    parser.add_argument("--dry-run", action="store_true", help="Measure and print, but do not save")
+    args = parser.parse_args(argv)
+
+    if args.runner is None and args.engine not in engines:
+        parser.error(f"Unknown engine {args.engine!r}; give its function with --runner")
+    runner, preprocess = engines.get(args.engine, (None, None))
+    runner = args.runner or runner
+    preprocess = args.preprocess or (None if args.runner else preprocess)
+
+    configurations = grid(args.processes, args.threads, cores, args.oversubscribe)
+    if not configurations:
+        parser.error(f"No configuration fits in {cores} cores; lower the grid or pass --oversubscribe")
+    pages = sample_pages(args.dataset, args.sample, args.start)
+    if not pages:
+        parser.error("The sample has no images")
+    print(f"Tuning {args.engine} on {host()} ({cores} cores): {len(configurations)} configurations, "
+          f"{len(pages)} pages each")
+
+    results = []
+    for processes, threads in configurations:
+        result = measure(runner, pages, processes, threads, preprocess)
+        results.append(result)
+        p95_text = f"{result['p95_seconds']:.2f}s" if result["p95_seconds"] is not None else "-"
+        print(f"  {processes:>3} processes x {threads:>3} threads: {result['pages_per_second']:>7.3f} pages/s, "
+              f"p95 {p95_text}" + (f", {result['errors']} errors ({result['first_error']})" if result["errors"] else ""))
+
+    chosen = best(results, args.max_p95)
+    if chosen is None:
+        print("No configuration ran without errors" + (" within --max-p95" if args.max_p95 is not None else ""))
+        sys.exit(1)
+    print(f"Best: {chosen['processes']} processes x {chosen['threads']} threads, "
+          f"{chosen['pages_per_second']:.3f} pages/s, p95 {chosen['p95_seconds']:.2f}s")
+    if args.dry_run:
+        return
+    save_config(args.engine, {
+        "processes": chosen["processes"],
+        "threads": chosen["threads"],
+        "pages_per_second": chosen["pages_per_second"],
+        "p95_seconds": chosen["p95_seconds"],
+        "runner": runner if isinstance(runner, str) else None,
+        "sample": [index for index, _ in pages],
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "grid": results,
+    }, args.tuning_file)
+    print(f"Saved to {args.tuning_file}")
@@ -0,0 +1,266 @@
+"""
+Opt-in profiling of engine calls and pipeline stages (--profile).
+
+Code marks what it is doing with sections:
+
+    profiler = Profiler(output_dir, mode)
+    profiler.start()
+    with profiler.section("llamacpp"):
+        run_engine()
+    profiler.stop()
+
+Modes:
+    sample   - a background thread samples every thread's Python stack every
+               INTERVAL seconds (wall clock, so waits on HTTP or locks show up).
+               Samples are attributed to the thread's innermost section. Worker
+               threads count for the section they were started in when their pool
+               is created with worker_initializer(); samples of other threads
+               (metrics server, progress bars, ...) are dropped.
+               Writes <section>.collapsed files, one "frame;frame;frame count" line
+               per stack, ready for flamegraph.pl or speedscope.
+    cprofile - deterministic cProfile of a thread's outermost section. Up to
+               Python 3.11 it covers only the thread that entered the section.
+               From 3.12 cProfile runs on sys.monitoring: it records every thread
+               while enabled, and only one profile can run at a time in the
+               process. A section entered while another one is being profiled
+               runs unprofiled, with a warning. Use sample mode when sections
+               run in several threads at once.
+               Writes <section>.pstats files (snakeviz, gprof2dot, pstats).
+
+Both write hotspots.txt, the top functions of every section. With the mode
+off (None), section() returns a shared no-op context manager and nothing runs
+in the background.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from itertools import count
+from pathlib import Path
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+
+MODES = ("sample", "cprofile")
+# Seconds between stack samples
+INTERVAL = 0.005
+# Functions listed per section in hotspots.txt
+TOP = 25
+
+_NULL = nullcontext()
+# The started profiler, for worker_initializer()
+_current: Optional["Profiler"] = None
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _file_name(section: str) -> str:
+    return re.sub(r'[^\w.-]', '_', section) or "section"
+
+
+def worker_initializer() -> Optional[Callable[[], None]]:
+    """
+    Thread-pool initializer that attributes the pool's threads to the calling
+    thread's current section; None when profiling is off or outside a section.
+
+        ThreadPoolExecutor(max_workers=8, initializer=profiling.worker_initializer())
+    """
+    profiler = _current
+    return profiler.worker_initializer() if profiler is not None else None
+
+
+class Profiler:
+    """Collects profiles per section; a Profiler with mode None does nothing."""
+
+    def __init__(self, output_dir: Path, mode: Optional[str] = None, interval: float = INTERVAL, top: int = TOP):
+        """
+        Args:
+            output_dir: Where the profiles and hotspots.txt are written
+            mode: "sample", "cprofile" or None to disable profiling
+            interval: Seconds between stack samples (sample mode)
+            top: Functions listed per section in hotspots.txt
+        """
+        if mode not in (None,) + MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}, use one of {', '.join(MODES)}")
+        self.output_dir = Path(output_dir)
+        self.mode = mode
+        self.interval = interval
+        self.top = top
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # Thread id -> stack of the sections it is in, as (name, entry) pairs
+        self._sections: Dict[int, List[Tuple[str, int]]] = {}
+        # Worker thread id -> the section entry whose thread started its pool
+        self._adopted: Dict[int, Tuple[str, int]] = {}
+        self._entries = count()
+        self._stacks: Dict[str, Counter] = defaultdict(Counter)
+        self._profiles: Dict[str, List[cProfile.Profile]] = defaultdict(list)
+        # Sections already warned about running unprofiled
+        self._unprofiled = set()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None
+
+    def start(self) -> None:
+        """Start profiling (the sampler thread in sample mode)."""
+        if not self.enabled:
+            return
+        self._started = time.perf_counter()
+        global _current
+        _current = self
+        if self.mode == "sample":
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+            self._sampler.start()
+
+    def section(self, name: str) -> ContextManager:
+        """Context manager attributing the code it wraps to section `name`."""
+        if not self.enabled:
+            return _NULL
+        return self._section(name)
+
+    def worker_initializer(self) -> Optional[Callable[[], None]]:
+        """Initializer tagging pool threads with the calling thread's current section (None outside one)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            stack = self._sections.get(threading.get_ident())
+            entry = stack[-1] if stack else None
+        return partial(self._adopt, entry) if entry else None
+
+    def _adopt(self, entry: Tuple[str, int]) -> None:
+        with self._lock:
+            self._adopted[threading.get_ident()] = entry
+
+    @contextmanager
+    def _section(self, name: str):
+        ident = threading.get_ident()
+        entry = (name, next(self._entries))
+        with self._lock:
+            stack = self._sections.setdefault(ident, [])
+            stack.append(entry)
+        # cProfile runs per thread and cannot nest, so only a thread's outer section profiles
+        profile = None
+        if self.mode == "cprofile" and len(stack) == 1:
+            profile = self._enable_cprofile(name)
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self._lock:
+                stack.pop()
+                if not stack:
+                    del self._sections[ident]
+                # Pool threads started in this section are done with it
+                for worker in [w for w, adopted in self._adopted.items() if adopted == entry]:
+                    del self._adopted[worker]
+
+    def _enable_cprofile(self, name: str) -> Optional[cProfile.Profile]:
+        """Start a cProfile for a section; None if another profiler is already active (Python 3.12+)."""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            with self._lock:
+                warn = name not in self._unprofiled
+                self._unprofiled.add(name)
+            if warn:
+                self.logger.warning(f"Section {name} runs unprofiled while another section is profiled: {e}")
+            return None
+        with self._lock:
+            self._profiles[name].append(profile)
+        return profile
+
+    def _sample_loop(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                sections = {ident: name for ident, (name, _) in self._adopted.items()}
+                sections.update((ident, stack[-1][0]) for ident, stack in self._sections.items())
+            for ident, frame in frames.items():
+                section = sections.get(ident)
+                if ident == me or section is None:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                self._stacks[section][";".join(reversed(labels))] += 1
+
+    def stop(self) -> Optional[Path]:
+        """
+        Stop profiling and write the profiles.
+
+        Returns:
+            Path to hotspots.txt, or None when profiling is off
+        """
+        if not self.enabled:
+            return None
+        global _current
+        if _current is self:
+            _current = None
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        elapsed = time.perf_counter() - self._started
+        lines = [f"Profile mode: {self.mode}, {elapsed:.1f}s profiled", ""]
+        if self.mode == "sample":
+            lines.extend(self._write_samples())
+        else:
+            lines.extend(self._write_cprofile())
+        hotspots = self.output_dir / "hotspots.txt"
+        hotspots.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        self.logger.info(f"Profiles written to {self.output_dir}")
+        return hotspots
+
+    def _write_samples(self) -> List[str]:
+        lines = []
+        for section, stacks in sorted(self._stacks.items()):
+            with open(self.output_dir / f"{_file_name(section)}.collapsed", 'w', encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            total = sum(stacks.values())
+            own, inclusive = Counter(), Counter()
+            for stack, count in stacks.items():
+                frames = stack.split(";")
+                own[frames[-1]] += count
+                for frame in set(frames):
+                    inclusive[frame] += count
+            lines.append(f"== {section}: {total} samples (~{total * self.interval:.1f} thread-seconds)")
+            lines.append(f"{'self %':>7} {'total %':>8}  function")
+            for frame, count in own.most_common(self.top):
+                lines.append(f"{100 * count / total:>7.1f} {100 * inclusive[frame] / total:>8.1f}  {frame}")
+            lines.append("")
+        return lines
+
+    def _write_cprofile(self) -> List[str]:
+        lines = []
+        for section, profiles in sorted(self._profiles.items()):
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(str(self.output_dir / f"{_file_name(section)}.pstats"))
+            report = io.StringIO()
+            stats.stream = report
+            stats.sort_stats("tottime").print_stats(self.top)
+            lines.append(f"== {section}")
+            lines.append(report.getvalue().strip())
+            lines.append("")
+        return lines
@@ -0,0 +1,310 @@
+"""
+Live metrics of long-running OCR and grading jobs.
+
+Counters, gauges and histograms live in a Telemetry object. They can be
+scraped in the Prometheus text format from http://127.0.0.1:<port>/metrics,
+and every `interval` seconds they are appended as a JSON line to a snapshot
+file, together with the per-second rate of every counter since the previous
+snapshot. A stall or a throughput drop shows up there without reading logs:
+
+    {"time": 1700000000.0, "uptime_seconds": 120.0, "metrics": {...}, "rates": {...}}
+
+Only the standard library is used. Recording a value is a dictionary update
+under a lock; nothing runs in the background unless a port or file is given.
+
+    telemetry = Telemetry(port=9100, snapshot_file=Path("metrics.jsonl"))
+    telemetry.start()
+    pages = telemetry.counter("ocr_pages_total", "Pages processed", ["engine"])
+    pages.inc(engine="qwen")
+    telemetry.stop()
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds between snapshots appended to the snapshot file
+SNAPSHOT_INTERVAL = 30.0
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric with one value per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _label_dict(self, key: Tuple[str, ...]) -> str:
+        return ",".join(f"{name}={value}" for name, value in zip(self.label_names, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.label_names, key)} {_number(value)}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {self._label_dict(key): value for key, value in sorted(self._values.items())}
+
+
+class Counter(Metric):
+    """A value that only goes up, e.g. pages processed."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down, e.g. queue depth."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """Distribution of observed values (e.g. latencies) in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['count'] += 1
+            state['sum'] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['counts']):
+                    cumulative += count
+                    labels = _labels_text(self.label_names, key, f'le="{_number(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _labels_text(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_number(state['sum'])}")
+                lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {self._label_dict(key): {'count': state['count'], 'sum': round(state['sum'], 6),
+                                            'mean': round(state['sum'] / state['count'], 6),
+                                            'p95': self._quantile(state, 0.95)}
+                    for key, state in sorted(self._values.items())}
+
+    def _quantile(self, state: Dict[str, Any], q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if it is the +Inf bucket)."""
+        target, cumulative = q * state['count'], 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            if cumulative >= target:
+                return None if bound == float("inf") else bound
+        return None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.telemetry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Telemetry:
+    """Metric registry with an optional Prometheus endpoint and snapshot file."""
+
+    def __init__(self, port: Optional[int] = None, snapshot_file: Optional[Path] = None,
+                 interval: float = SNAPSHOT_INTERVAL, host: str = "127.0.0.1"):
+        """
+        Args:
+            port: Serve /metrics on this port (None = no endpoint, 0 = any free port)
+            snapshot_file: Append a JSON snapshot to this file every `interval` seconds
+            interval: Seconds between snapshots
+            host: Address of the endpoint
+        """
+        self.port = port
+        self.host = host
+        self.snapshot_file = Path(snapshot_file) if snapshot_file else None
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._writer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_counters: Dict[str, Dict[str, float]] = {}
+        self._last_snapshot = self._started
+
+    def _register(self, metric_class, name: str, help: str, labels: Sequence[str], **options) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, help, labels, **options)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        """The counter called `name`, created on first use."""
+        return self._register(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        """The gauge called `name`, created on first use."""
+        return self._register(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = BUCKETS) -> Histogram:
+        """The histogram called `name`, created on first use."""
+        return self._register(Histogram, name, help, labels, buckets=buckets)
+
+    def add_collector(self, collect: Callable[[], None]) -> None:
+        """Call `collect` before every scrape and snapshot, e.g. to set a queue depth gauge."""
+        self._collectors.append(collect)
+
+    def _collect(self) -> List[Metric]:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                self.logger.debug(f"Metrics collector failed: {e}")
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = ["# HELP process_uptime_seconds Seconds since the job started",
+                 "# TYPE process_uptime_seconds gauge",
+                 f"process_uptime_seconds {time.time() - self._started:.3f}"]
+        for metric in self._collect():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values, plus the per-second rate of every counter since the previous snapshot."""
+        now = time.time()
+        metrics = {metric.name: metric.snapshot() for metric in self._collect()}
+        elapsed = now - self._last_snapshot
+        rates = {}
+        for metric in self._metrics.values():
+            if isinstance(metric, Counter):
+                previous = self._last_counters.get(metric.name, {})
+                current = metrics[metric.name]
+                rates[metric.name] = {labels: round((value - previous.get(labels, 0)) / elapsed, 4)
+                                      for labels, value in current.items()} if elapsed > 0 else {}
+                self._last_counters[metric.name] = current
+        self._last_snapshot = now
+        return {'time': round(now, 3), 'uptime_seconds': round(now - self._started, 3), 'pid': os.getpid(),
+                'metrics': metrics, 'rates': rates}
+
+    def write_snapshot(self) -> None:
+        """Append one snapshot to the snapshot file."""
+        if self.snapshot_file is None:
+            return
+        line = json.dumps(self.snapshot())
+        with open(self.snapshot_file, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+    def _snapshot_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                self.logger.warning(f"Could not write metrics snapshot: {e}")
+
+    def start(self) -> None:
+        """Start the endpoint and the snapshot thread, if configured."""
+        if self.port is not None:
+            self._server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+            self._server.daemon_threads = True
+            self._server.telemetry = self
+            threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+            self.port = self._server.server_address[1]
+            self.logger.info(f"Metrics at http://{self.host}:{self.port}/metrics")
+        if self.snapshot_file is not None:
+            self.snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+            self._stop.clear()
+            self._writer = threading.Thread(target=self._snapshot_loop, name="metrics-snapshots", daemon=True)
+            self._writer.start()
+
+    def stop(self) -> None:
+        """Write a final snapshot and shut the endpoint down."""
+        if self._writer is not None:
+            self._stop.set()
+            self._writer.join()
+            self._writer = None
+            self.write_snapshot()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None